@@ -47,8 +47,13 @@ function ThreatsPage() {
   
     const wsHost = "dp-production-f7cf.up.railway.app";
     const wsProtocol = "wss";
-    const wsUrl = `${wsProtocol}://${wsHost}/ws/threats?token=${token}`;    
+    const wsUrl = `${wsProtocol}://${wsHost}/ws/threats?token=${token}&protocol=delta`;
     const ws = new WebSocket(wsUrl);
+
+    // delta-протокол: снапшот, затем только изменения с seq; при пропуске seq просим снапшот заново
+    let seq = 0;
+    let rows: Record<string, AnalyzedLog> = {};
+    const publish = () => setLogs(Object.values(rows).sort((a, b) => b.id - a.id));
   
     ws.onopen = () => {
       console.log("WS OPEN");
@@ -63,8 +68,24 @@ function ThreatsPage() {
       console.log("WS MESSAGE:", event.data);
       try {
         const msg = JSON.parse(event.data);
-        if (msg.type === "threats_update") {
-          if (msg.threats) setLogs(msg.threats);
+        if (msg.type === "threats_snapshot") {
+          seq = msg.seq;
+          rows = msg.data.threats;
+          publish();
+        } else if (msg.type === "threats_delta") {
+          if (msg.seq <= seq) return;
+          if (msg.seq !== seq + 1) {
+            ws.send(JSON.stringify({ type: "resync" }));
+            return;
+          }
+          seq = msg.seq;
+          const next = { ...rows };
+          for (const [id, change] of Object.entries(msg.changes.threats ?? {})) {
+            if (change === null) delete next[id];
+            else next[id] = { ...next[id], ...(change as Partial<AnalyzedLog>) };
+          }
+          rows = next;
+          publish();
         }
       } catch(err)  {
         console.log("WS PARSE ERROR", err)
@@ -97,7 +118,9 @@ function ThreatsPage() {
 
   useEffect(() => {
     setIsLoading(true)
-    API.get("/logs/analyzed")
+    API.get("/logs/analyzed", {
+      params: { fields: "id,attack_type,probability,status,ip,timestamp" },
+    })
       .then((res) => setLogs(res.data))
       .finally(() => setIsLoading(false))
   }, [])
@@ -0,0 +1,28 @@
+"""add analysis_status to log_analysis
+
+Revision ID: 3f7c2a91d0b4
+Revises: a462962864b2
+Create Date: 2026-10-18 10:12:41.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7c2a91d0b4'
+down_revision: Union[str, None] = 'a462962864b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('log_analysis', sa.Column('analysis_status', sa.String(), server_default='done', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('log_analysis', 'analysis_status')
@@ -0,0 +1,28 @@
+"""add analysis_claimed_at to log_analysis
+
+Revision ID: 7d3b9e1c4a60
+Revises: e2f9a6c41b58
+Create Date: 2026-10-19 10:41:07.215530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3b9e1c4a60'
+down_revision: Union[str, None] = 'e2f9a6c41b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('log_analysis', sa.Column('analysis_claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('log_analysis', 'analysis_claimed_at')
@@ -0,0 +1,90 @@
+"""add log_rollups
+
+Revision ID: 8b1d4e6f2a73
+Revises: 3f7c2a91d0b4
+Create Date: 2026-10-18 14:03:27.540912
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1d4e6f2a73'
+down_revision: Union[str, None] = '3f7c2a91d0b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'log_rollups',
+        sa.Column('company_id', sa.String(), nullable=False),
+        sa.Column('granularity', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('attack_type', sa.String(), server_default='', nullable=False),
+        sa.Column('mitre_id', sa.String(), server_default='', nullable=False),
+        sa.Column('severity_windows', sa.String(), server_default='', nullable=False),
+        sa.Column('severity_syslog', sa.String(), server_default='', nullable=False),
+        sa.Column('country', sa.String(), server_default='', nullable=False),
+        sa.Column('risk_level', sa.String(), server_default='low', nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('high_risk', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint(
+            'company_id', 'granularity', 'bucket_start', 'attack_type', 'mitre_id',
+            'severity_windows', 'severity_syslog', 'country', 'risk_level'
+        )
+    )
+    # Роллапы по уже существующим логам. SQL здесь свой, а не rebuild_rollups из приложения: миграция
+    # не должна зависеть от кода, который поменяется вместе с моделями. date_trunc — только PostgreSQL;
+    # в остальных случаях (или для починки): python -m backend.scripts.backfill_rollups
+    if op.get_bind().dialect.name == "postgresql":
+        for granularity, retention_days in BACKFILL_RETENTION_DAYS.items():
+            op.execute(sa.text(BACKFILL_SQL.format(
+                granularity=granularity,
+                cutoff=(
+                    f"AND timestamp >= date_trunc('day', (now() AT TIME ZONE 'utc') - interval '{retention_days} days')"
+                    if retention_days else ""
+                )
+            )))
+
+
+# Мелкие корзины старше срока хранения не заполняем — компактор всё равно их удалит (см. ROLLUP_*_RETENTION_DAYS)
+BACKFILL_RETENTION_DAYS = {
+    "minute": int(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", "14")),
+    "hour": int(os.getenv("ROLLUP_HOUR_RETENTION_DAYS", "180")),
+    "day": None,
+}
+
+# Уровни риска: high >= 70, medium >= 30, остальное low — как в aggregate_utils на момент миграции
+BACKFILL_SQL = """
+INSERT INTO log_rollups (
+    company_id, granularity, bucket_start, attack_type, mitre_id,
+    severity_windows, severity_syslog, country, risk_level, count, high_risk
+)
+SELECT company_id, '{granularity}', bucket_start, attack_type, mitre_id,
+       severity_windows, severity_syslog, country, risk_level, count(*), sum(is_high)
+FROM (
+    SELECT company_id,
+           date_trunc('{granularity}', timestamp) AS bucket_start,
+           coalesce(attack_type, '') AS attack_type,
+           coalesce(mitre_id, '') AS mitre_id,
+           coalesce(severity_windows, '') AS severity_windows,
+           coalesce(severity_syslog, '') AS severity_syslog,
+           coalesce(country, '') AS country,
+           CASE WHEN probability >= 70 THEN 'high' WHEN probability >= 30 THEN 'medium' ELSE 'low' END AS risk_level,
+           CASE WHEN probability >= 70 THEN 1 ELSE 0 END AS is_high
+    FROM log_analysis
+    WHERE timestamp IS NOT NULL AND company_id IS NOT NULL {cutoff}
+) AS logs
+GROUP BY company_id, bucket_start, attack_type, mitre_id, severity_windows, severity_syslog, country, risk_level
+"""
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('log_rollups')
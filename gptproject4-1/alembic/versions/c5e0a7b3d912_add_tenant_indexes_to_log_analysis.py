@@ -0,0 +1,45 @@
+"""add tenant indexes to log_analysis
+
+Revision ID: c5e0a7b3d912
+Revises: 8b1d4e6f2a73
+Create Date: 2026-10-18 15:21:09.307415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e0a7b3d912'
+down_revision: Union[str, None] = '8b1d4e6f2a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицу на время построения, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_log_analysis_company_timestamp', 'log_analysis', ['company_id', 'timestamp'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_log_analysis_company_id_id', 'log_analysis', ['company_id', 'id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_log_analysis_company_attack_type', 'log_analysis', ['company_id', 'attack_type'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_log_analysis_company_high_risk', 'log_analysis', ['company_id', 'timestamp'],
+                        unique=False, postgresql_where=sa.text('probability >= 70'),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in (
+            'ix_log_analysis_company_high_risk',
+            'ix_log_analysis_company_attack_type',
+            'ix_log_analysis_company_id_id',
+            'ix_log_analysis_company_timestamp',
+        ):
+            op.drop_index(name, table_name='log_analysis', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,52 @@
+"""add upload_jobs
+
+Revision ID: e2f9a6c41b58
+Revises: c5e0a7b3d912
+Create Date: 2026-10-18 20:12:44.918203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f9a6c41b58'
+down_revision: Union[str, None] = 'c5e0a7b3d912'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'upload_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('company_id', sa.String(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('spool_path', sa.String(), nullable=True),
+        sa.Column('columns', sa.Text(), nullable=True),
+        sa.Column('enrich', sa.Boolean(), nullable=False),
+        sa.Column('status', sa.String(), server_default='queued', nullable=False),
+        sa.Column('cancel_requested', sa.Boolean(), server_default='false', nullable=False),
+        sa.Column('rows_processed', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rows_failed', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('bytes_read', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('bytes_total', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_upload_jobs_company_id'), 'upload_jobs', ['company_id'], unique=False)
+    op.create_index('ix_upload_jobs_status_created_at', 'upload_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_upload_jobs_status_created_at', table_name='upload_jobs')
+    op.drop_index(op.f('ix_upload_jobs_company_id'), table_name='upload_jobs')
+    op.drop_table('upload_jobs')
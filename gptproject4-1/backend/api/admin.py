@@ -7,7 +7,8 @@ from backend.database import get_db
 from backend.models import User, Company, UserRole, LogAnalysis
 from backend.schemas import UserResponse
 from backend.core.security import get_current_user, check_role
-from backend.utils.ws_manager import notify_dashboard_update
+from backend.core.principals import invalidate_user
+from backend.utils.ws_manager import schedule_company_update
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -55,7 +56,7 @@ def create_user(
     db.commit()
     db.refresh(new_user)
 
-    background_tasks.add_task(notify_dashboard_update, db, user.company_id)
+    background_tasks.add_task(schedule_company_update, user.company_id, ("dashboard",))
 
 
     return new_user
@@ -92,4 +93,6 @@ def delete_user(
 
     db.delete(target)
     db.commit()
+    # Иначе уже выданный токен удалённого пользователя работал бы до истечения TTL кэша
+    invalidate_user(target.username)
     return {"message": "Пользователь удалён"}
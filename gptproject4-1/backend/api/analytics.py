@@ -2,83 +2,75 @@ import re
 from collections import Counter
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import extract, func, cast, Date
-import geoip2.database
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Literal, Optional
 from backend.database import get_db
 from backend.models import LogAnalysis, User
 from backend.core.security import get_current_user, check_role
+from backend.utils.geo_utils import lookup_ip
+from backend.utils.dashboard_utils import get_period_aggregates
+from backend.utils.rollup_utils import get_timeseries
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 
 @router.get("/severity")
-def get_severity_analytics(user = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_severity_analytics(
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
 
-    logs = db.query(LogAnalysis).filter_by(company_id=user.company_id).all()
-
-    windows_counter = Counter()
-    syslog_counter = Counter()
-
-    for log in logs:
-        if log.severity_windows:
-            windows_counter[log.severity_windows] += 1
-        if log.severity_syslog:
-            syslog_counter[log.severity_syslog] += 1
-
-    return {
-        "windows": windows_counter,
-        "syslog": syslog_counter
-    }
+    return get_period_aggregates(db, user.company_id, from_date, to_date)["severity"]
 
 
 @router.get("/hourly-activity")
-def get_hourly_activity(user = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_hourly_activity(
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
 
-    hourly_counts = db.query(
-        extract('hour', LogAnalysis.timestamp).label("hour"),
-        func.count().label("count")
-    ).filter(
-        LogAnalysis.company_id == user.company_id
-    ).group_by("hour").order_by("hour").all()
-
-    result = [0] * 24
-    for hour, count in hourly_counts:
-        result[int(hour)] = count
-
-    return {"hourly_activity": result}
+    return {"hourly_activity": get_period_aggregates(db, user.company_id, from_date, to_date)["hourly"]}
 
 
 @router.get("/summary")
 def get_summary(
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
 
-    logs = db.query(LogAnalysis).filter_by(company_id=user.company_id).all()
+    aggregates = get_period_aggregates(db, user.company_id, from_date, to_date)
+    top_mitre = dict(Counter(aggregates["mitre"]).most_common(5))
 
-    types = Counter([log.attack_type for log in logs])
-    risks = {"low": 0, "medium": 0, "high": 0}
-    mitre = Counter([log.mitre_id for log in logs if log.mitre_id])
+    return {
+        "attack_types": aggregates["attack_types"],
+        "risk_levels": aggregates["risk_levels"],
+        "top_mitre": top_mitre
+    }
 
-    for log in logs:
-        p = log.probability
-        if p < 30:
-            risks["low"] += 1
-        elif p < 70:
-            risks["medium"] += 1
-        else:
-            risks["high"] += 1
 
-    top_mitre = dict(mitre.most_common(5))
+@router.get("/timeseries")
+def get_timeseries_analytics(
+    from_date: datetime,
+    to_date: Optional[datetime] = None,
+    granularity: Literal["minute", "hour", "day"] = "hour",
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
 
+    to_date = to_date or datetime.utcnow()
     return {
-        "attack_types": dict(types),
-        "risk_levels": risks,
-        "top_mitre": top_mitre
+        "granularity": granularity,
+        "points": get_timeseries(db, user.company_id, from_date, to_date, granularity)
     }
 
 
@@ -94,39 +86,19 @@ def get_geo_stats(
 
     result = []
 
-    city_reader = geoip2.database.Reader("backend/data/GeoLite2-City.mmdb")
-    asn_reader = geoip2.database.Reader("backend/data/GeoLite2-ASN.mmdb")
-
     for log in logs:
         text = f"{log.ip or ''} {log.log_text or ''}"
         ips = set(ip_regex.findall(text))
         for ip in ips:
-            try:
-                city_info = city_reader.city(ip)
-                asn_info = asn_reader.asn(ip)
-
-                country = city_info.country.name or "Unknown"
-                city = city_info.city.name or "—"
-                lat = city_info.location.latitude
-                lon = city_info.location.longitude
-                asn = asn_info.autonomous_system_number
-                org = asn_info.autonomous_system_organization
-
-            except:
-                country, city, lat, lon = "Unknown", "—", None, None
-                asn, org = None, None
-
+            geo = lookup_ip(ip)
             result.append({
                 "ip": ip,
-                "country": country,
-                "city": city,
-                "lat": lat,
-                "lon": lon,
-                "asn": asn,
-                "organization": org
+                "country": geo["country"] or "Unknown",
+                "city": geo["city"] or "—",
+                "lat": geo["lat"],
+                "lon": geo["lon"],
+                "asn": geo["asn"],
+                "organization": geo["organization"]
             })
 
-    city_reader.close()
-    asn_reader.close()
-
     return {"geodata": result}
@@ -7,7 +7,7 @@ from backend.core.security import get_current_user, check_role
 import uuid
 from backend.models import LoginHistory
 from fastapi import Request
-import geoip2.database
+from backend.utils.geo_utils import lookup_ip
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -15,15 +15,9 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 def login(user_data: schemas.UserCreate, request: Request, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter_by(username=user_data.username).first()
     ip = request.client.host
-    country = "—"
-    city = "—"
-    try:
-        with geoip2.database.Reader("backend/data/GeoLite2-City.mmdb") as reader:
-            response = reader.city(ip)
-            country = response.country.name or "—"
-            city = response.city.name or "—"
-    except Exception as e:
-        print(f"GeoIP lookup failed for {ip}: {e}")
+    geo = lookup_ip(ip)
+    country = geo["country"] or "—"
+    city = geo["city"] or "—"
 
     if not db_user or not auth.verify_password(user_data.password, db_user.password_hash):
         db.add(models.LoginHistory(
@@ -39,6 +33,7 @@ def login(user_data: schemas.UserCreate, request: Request, db: Session = Depends
     token = auth.create_access_token({
         "sub": db_user.username,
         "username": db_user.username,
+        "uid": db_user.id,
         "role": db_user.role,
         "company_id": db_user.company_id
     })
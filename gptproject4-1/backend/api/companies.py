@@ -6,11 +6,13 @@ from typing import List
 
 from backend import schemas, auth
 from backend.database import get_db
-from backend.models import Company, User
+from backend.models import Company, User, LogRollup, UploadJob
 from backend.schemas import CompanyCreate, CompanyOut
 from backend.core.security import get_current_user, check_role
+from backend.core.principals import invalidate_company
 from backend.models import UserRole
 from backend.utils.companies_utils import get_user_count_for_company
+from backend.utils.aggregate_utils import drop_company
 
 router = APIRouter(prefix="/companies", tags=["Companies"])
 
@@ -70,8 +72,13 @@ def delete_company(
     if not company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
 
+    # У роллапов и задач загрузки нет внешнего ключа на companies — чистим их явно
+    db.query(LogRollup).filter_by(company_id=company_id).delete(synchronize_session=False)
+    db.query(UploadJob).filter_by(company_id=company_id).delete(synchronize_session=False)
     db.delete(company)
     db.commit()
+    drop_company(company_id)
+    invalidate_company(company_id)
     return
 
 
@@ -114,6 +121,7 @@ def register_company(
     token = auth.create_access_token({
         "sub": admin.username,
         "username": admin.username,
+        "uid": admin.id,
         "role": admin.role,
         "company_id": admin.company_id
     })
@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import Optional
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from backend.database import get_db
@@ -10,9 +12,11 @@ router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
 @router.get("/stats", response_model=StatsResponse)
 def get_stats(
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
-    stats = get_dashboard_stats(db, user.company_id)
+    stats = get_dashboard_stats(db, user.company_id, from_date, to_date)
     return stats
\ No newline at end of file
@@ -1,5 +1,4 @@
 import io
-import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
@@ -8,9 +7,91 @@ import re
 from backend.database import get_db
 from backend.models import LogAnalysis, Report
 from backend.core.security import get_current_user, check_role
+from backend.utils.export_utils import csv_response, xlsx_response, parquet_response, arrow_stream_response, pa
 
 router = APIRouter(prefix="/export", tags=["Export"])
 
+# (заголовок, колонка) — выбираются только нужные поля, без загрузки ORM-объектов
+LOG_COLUMNS_EN = [
+    ("Log ID", LogAnalysis.id),
+    ("IP", LogAnalysis.ip),
+    ("Attack", LogAnalysis.attack_type),
+    ("MITRE", LogAnalysis.mitre_id),
+    ("Probability", LogAnalysis.probability),
+    ("Recommendation", LogAnalysis.recommendation),
+    ("Country", LogAnalysis.country),
+    ("City", LogAnalysis.city),
+    ("Timestamp", LogAnalysis.timestamp),
+    ("Status", LogAnalysis.status),
+    ("Resolved By", LogAnalysis.resolved_by),
+    ("Resolved At", LogAnalysis.resolved_at),
+]
+
+ANALYZED_COLUMNS = [
+    ("ID", LogAnalysis.id),
+    ("IP", LogAnalysis.ip),
+    ("Тип атаки", LogAnalysis.attack_type),
+    ("MITRE", LogAnalysis.mitre_id),
+    ("Вероятность", LogAnalysis.probability),
+    ("Рекомендация", LogAnalysis.recommendation),
+    ("Страна", LogAnalysis.country),
+    ("Город", LogAnalysis.city),
+    ("Время", LogAnalysis.timestamp),
+    ("Статус", LogAnalysis.status),
+    ("Устранено кем", LogAnalysis.resolved_by),
+    ("Когда устранено", LogAnalysis.resolved_at),
+]
+
+LOG_COLUMNS_RU = [("Лог ID", LogAnalysis.id)] + ANALYZED_COLUMNS[1:]
+
+RAW_COLUMNS = [
+    ("ID", LogAnalysis.id),
+    ("Источник", LogAnalysis.source),
+    ("Текст", LogAnalysis.log_text),
+    ("Время", LogAnalysis.timestamp),
+]
+
+# Колоночный экспорт для аналитиков: типизированные колонки, повторяющиеся строки — словарём
+ARROW_COLUMNS = [
+    ("id", LogAnalysis.id),
+    ("timestamp", LogAnalysis.timestamp),
+    ("ip", LogAnalysis.ip),
+    ("source", LogAnalysis.source),
+    ("attack_type", LogAnalysis.attack_type),
+    ("mitre_id", LogAnalysis.mitre_id),
+    ("probability", LogAnalysis.probability),
+    ("recommendation", LogAnalysis.recommendation),
+    ("country", LogAnalysis.country),
+    ("city", LogAnalysis.city),
+    ("severity_windows", LogAnalysis.severity_windows),
+    ("severity_syslog", LogAnalysis.severity_syslog),
+    ("status", LogAnalysis.status),
+    ("resolved_by", LogAnalysis.resolved_by),
+    ("resolved_at", LogAnalysis.resolved_at),
+]
+
+
+def analyzed_arrow_schema():
+    if pa is None:
+        raise HTTPException(501, detail="Экспорт в Parquet/Arrow недоступен: не установлен pyarrow")
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("ip", pa.string()),
+        ("source", category),
+        ("attack_type", category),
+        ("mitre_id", category),
+        ("probability", pa.float64()),
+        ("recommendation", pa.string()),
+        ("country", category),
+        ("city", category),
+        ("severity_windows", category),
+        ("severity_syslog", category),
+        ("status", category),
+        ("resolved_by", pa.string()),
+        ("resolved_at", pa.timestamp("us")),
+    ])
 
 
 def extract_date_range_from_title(title: str) -> tuple[datetime, datetime]:
@@ -22,6 +103,35 @@ def extract_date_range_from_title(title: str) -> tuple[datetime, datetime]:
     to_date = datetime.strptime(match.group(2), "%Y-%m-%d")
     return from_date, to_date
 
+
+def company_log_criteria(db: Session, company_id: str) -> list:
+    criteria = [LogAnalysis.company_id == company_id]
+    if db.query(LogAnalysis.id).filter(*criteria).first() is None:
+        raise HTTPException(404, detail="Нет логов для экспорта")
+    return criteria
+
+
+def report_period_criteria(db: Session, report_id: str, company_id: str) -> list:
+    report = db.query(Report).filter_by(id=report_id, company_id=company_id).first()
+    if not report:
+        raise HTTPException(404, detail="Отчёт не найден")
+
+    # ВАЖНО: использовать диапазон из заголовка отчёта!
+    try:
+        from_date, to_date = extract_date_range_from_title(report.title)
+        # Последний день включаем полностью
+        to_date = to_date + timedelta(days=1)
+    except Exception as e:
+        raise HTTPException(400, detail=str(e))
+
+    print(f"FROM: {from_date}, TO: {to_date}, COMPANY: {company_id}")
+    return [
+        LogAnalysis.company_id == company_id,
+        LogAnalysis.timestamp >= from_date,
+        LogAnalysis.timestamp < to_date
+    ]
+
+
 @router.get("/csv")
 def export_csv(
     id: str = Query(..., description="Report ID"),
@@ -30,34 +140,8 @@ def export_csv(
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    logs = db.query(LogAnalysis).filter_by(company_id=user.company_id).all()
-    if not logs:
-        raise HTTPException(404, detail="Нет логов для экспорта")
-
-    df = pd.DataFrame([{
-        "Log ID": l.id,
-        "IP": l.ip,
-        "Attack": l.attack_type,
-        "MITRE": l.mitre_id,
-        "Probability": l.probability,
-        "Recommendation": l.recommendation,
-        "Country": l.country,
-        "City": l.city,
-        "Timestamp": l.timestamp,
-        "Status": l.status,
-        "Resolved By": l.resolved_by,
-        "Resolved At": l.resolved_at
-    } for l in logs])
-
-    buffer = io.StringIO()
-    df.to_csv(buffer, index=False, encoding="utf-8-sig")
-    buffer.seek(0)
-
-    return StreamingResponse(
-        iter([buffer.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=report_{id}.csv"}
-    )
+    criteria = company_log_criteria(db, user.company_id)
+    return csv_response(f"report_{id}.csv", LOG_COLUMNS_EN, criteria, order_by=LogAnalysis.id)
 
 
 @router.get("/excel")
@@ -68,35 +152,8 @@ def export_excel(
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    logs = db.query(LogAnalysis).filter_by(company_id=user.company_id).all()
-    if not logs:
-        raise HTTPException(404, detail="Нет логов для экспорта")
-
-    df = pd.DataFrame([{
-        "Лог ID": l.id,
-        "IP": l.ip,
-        "Тип атаки": l.attack_type,
-        "MITRE": l.mitre_id,
-        "Вероятность": l.probability,
-        "Рекомендация": l.recommendation,
-        "Страна": l.country,
-        "Город": l.city,
-        "Время": l.timestamp,
-        "Статус": l.status,
-        "Устранено кем": l.resolved_by,
-        "Когда устранено": l.resolved_at
-    } for l in logs])
-
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Логи")
-    buffer.seek(0)
-
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=report_{id}.xlsx"}
-    )
+    criteria = company_log_criteria(db, user.company_id)
+    return xlsx_response(f"report_{id}.xlsx", LOG_COLUMNS_RU, criteria, "Логи", order_by=LogAnalysis.id)
 
 
 @router.get("/txt")
@@ -125,7 +182,6 @@ def export_txt(
     )
 
 
-
 @router.get("/raw/csv")
 def export_raw_logs_csv(
     id: str = Query(..., description="Report ID"),
@@ -134,43 +190,10 @@ def export_raw_logs_csv(
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    report = db.query(Report).filter_by(id=id, company_id=user.company_id).first()
-    if not report:
-        raise HTTPException(404, detail="Отчёт не найден")
+    criteria = report_period_criteria(db, id, user.company_id)
+    return csv_response(f"raw_logs_{id}.csv", RAW_COLUMNS, criteria, order_by=LogAnalysis.timestamp)
 
-    # ВАЖНО: использовать диапазон из заголовка отчёта!
-    try:
-        from_date, to_date = extract_date_range_from_title(report.title)
-        # Если нужно включить последний день полностью:
-        to_date = to_date + timedelta(days=1)
-    except Exception as e:
-        raise HTTPException(400, detail=str(e))
 
-    logs = db.query(LogAnalysis).filter(
-        LogAnalysis.company_id == user.company_id,
-        LogAnalysis.timestamp >= from_date,
-        LogAnalysis.timestamp < to_date
-    ).all()
-
-    df = pd.DataFrame([{
-        "ID": log.id,
-        "Источник": log.source,
-        "Текст": log.log_text,
-        "Время": log.timestamp,
-    } for log in logs])
-
-    buf = io.StringIO()
-    df.to_csv(buf, index=False, encoding="utf-8-sig")
-    buf.seek(0)
-
-    print(f"FROM: {from_date}, TO: {to_date}, COMPANY: {user.company_id}")
-    print(f"Найдено логов: {len(logs)}")
-
-    return StreamingResponse(
-        iter([buf.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=raw_logs_{id}.csv"}
-    )
 @router.get("/raw/xlsx")
 def export_raw_logs_xlsx(
     id: str = Query(..., description="Report ID"),
@@ -179,41 +202,8 @@ def export_raw_logs_xlsx(
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    report = db.query(Report).filter_by(id=id, company_id=user.company_id).first()
-    if not report:
-        raise HTTPException(404, detail="Отчёт не найден")
-
-    # Используем диапазон дат из заголовка отчета
-    try:
-        from_date, to_date = extract_date_range_from_title(report.title)
-        to_date = to_date + timedelta(days=1)  # чтобы включить последний день полностью
-    except Exception as e:
-        raise HTTPException(400, detail=str(e))
-
-    logs = db.query(LogAnalysis).filter(
-        LogAnalysis.company_id == user.company_id,
-        LogAnalysis.timestamp >= from_date,
-        LogAnalysis.timestamp < to_date
-    ).all()
-
-    df = pd.DataFrame([{
-        "ID": log.id,
-        "Источник": log.source,
-        "Текст": log.log_text,
-        "Время": log.timestamp,
-    } for log in logs])
-
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Raw Logs")
-
-    buffer.seek(0)
-
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=raw_logs_{id}.xlsx"}
-    )
+    criteria = report_period_criteria(db, id, user.company_id)
+    return xlsx_response(f"raw_logs_{id}.xlsx", RAW_COLUMNS, criteria, "Raw Logs", order_by=LogAnalysis.timestamp)
 
 
 @router.get("/analyzed/csv")
@@ -224,95 +214,49 @@ def export_analyzed_logs_csv(
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    report = db.query(Report).filter_by(id=id, company_id=user.company_id).first()
-    if not report:
-        raise HTTPException(404, detail="Отчёт не найден")
+    criteria = report_period_criteria(db, id, user.company_id)
+    return csv_response(f"analyzed_logs_{id}.csv", ANALYZED_COLUMNS, criteria, order_by=LogAnalysis.timestamp)
 
-    try:
-        from_date, to_date = extract_date_range_from_title(report.title)
-        to_date = to_date + timedelta(days=1)
-    except Exception as e:
-        raise HTTPException(400, detail=str(e))
 
-    logs = db.query(LogAnalysis).filter(
-        LogAnalysis.company_id == user.company_id,
-        LogAnalysis.timestamp >= from_date,
-        LogAnalysis.timestamp < to_date
-    ).all()
-
-    df = pd.DataFrame([{
-        "ID": l.id,
-        "IP": l.ip,
-        "Тип атаки": l.attack_type,
-        "MITRE": l.mitre_id,
-        "Вероятность": l.probability,
-        "Рекомендация": l.recommendation,
-        "Страна": l.country,
-        "Город": l.city,
-        "Время": l.timestamp,
-        "Статус": l.status,
-        "Устранено кем": l.resolved_by,
-        "Когда устранено": l.resolved_at
-    } for l in logs])
-
-    buf = io.StringIO()
-    df.to_csv(buf, index=False, encoding="utf-8-sig")
-    buf.seek(0)
+@router.get("/analyzed/xlsx")
+def export_analyzed_logs_xlsx(
+    id: str = Query(..., description="Report ID"),
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    check_role(user, ["ADMIN", "ANALYST"])
 
-    return StreamingResponse(
-        iter([buf.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=analyzed_logs_{id}.csv"}
+    criteria = report_period_criteria(db, id, user.company_id)
+    return xlsx_response(
+        f"analyzed_logs_{id}.xlsx", ANALYZED_COLUMNS, criteria, "Analyzed Logs", order_by=LogAnalysis.timestamp
     )
 
 
-@router.get("/analyzed/xlsx")
-def export_analyzed_logs_xlsx(
+@router.get("/analyzed/parquet")
+def export_analyzed_logs_parquet(
     id: str = Query(..., description="Report ID"),
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    report = db.query(Report).filter_by(id=id, company_id=user.company_id).first()
-    if not report:
-        raise HTTPException(404, detail="Отчёт не найден")
-
-    try:
-        from_date, to_date = extract_date_range_from_title(report.title)
-        to_date = to_date + timedelta(days=1)
-    except Exception as e:
-        raise HTTPException(400, detail=str(e))
+    schema = analyzed_arrow_schema()
+    criteria = report_period_criteria(db, id, user.company_id)
+    return parquet_response(
+        f"analyzed_logs_{id}.parquet", schema, ARROW_COLUMNS, criteria, order_by=LogAnalysis.timestamp
+    )
 
-    logs = db.query(LogAnalysis).filter(
-        LogAnalysis.company_id == user.company_id,
-        LogAnalysis.timestamp >= from_date,
-        LogAnalysis.timestamp < to_date
-    ).all()
-
-    df = pd.DataFrame([{
-        "ID": l.id,
-        "IP": l.ip,
-        "Тип атаки": l.attack_type,
-        "MITRE": l.mitre_id,
-        "Вероятность": l.probability,
-        "Рекомендация": l.recommendation,
-        "Страна": l.country,
-        "Город": l.city,
-        "Время": l.timestamp,
-        "Статус": l.status,
-        "Устранено кем": l.resolved_by,
-        "Когда устранено": l.resolved_at
-    } for l in logs])
-
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Analyzed Logs")
 
-    buffer.seek(0)
+@router.get("/analyzed/arrow")
+def export_analyzed_logs_arrow(
+    id: str = Query(..., description="Report ID"),
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    check_role(user, ["ADMIN", "ANALYST"])
 
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=analyzed_logs_{id}.xlsx"}
-    )
\ No newline at end of file
+    schema = analyzed_arrow_schema()
+    criteria = report_period_criteria(db, id, user.company_id)
+    return arrow_stream_response(
+        f"analyzed_logs_{id}.arrows", schema, ARROW_COLUMNS, criteria, order_by=LogAnalysis.timestamp
+    )
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Body, Response, Query
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 from datetime import datetime
+import queue
 import re
-import geoip2.database
 
 from backend import schemas
 from backend.database import get_db
@@ -13,14 +14,21 @@ from backend.core.security import get_current_user, check_role
 from backend.securitygpt import (
     analyze_log_with_gpt,
     parse_gpt_response,
-    notify_telegram,
-    ALERT_THRESHOLD
+    evict_examples
 )
-from backend.utils.log_utils import get_recent_logs
-from backend.utils.ws_manager import notify_dashboard_update, notify_analytics_update, notify_threats_update
+from backend.utils.log_utils import get_recent_logs, apply_analysis, send_threat_alert, PENDING_ATTACK_TYPE
+from backend.utils.analysis_queue import enqueue_analysis, has_capacity, process_queued_logs, ANALYSIS_BATCH_SIZE
+from backend.utils.geo_utils import lookup_ip
+from backend.utils.index_updater import schedule_index_update
+from backend.utils.ws_manager import schedule_company_update
+from backend.utils.aggregate_utils import record_logs, record_analysis
+from backend.utils.rollup_utils import record_rollups, record_rollup_change, rollup_values
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
+ANALYZED_PAGE_SIZE = 100
+ANALYZED_PAGE_SIZE_MAX = 1000
+
 
 def extract_ip_from_text(text):
     match = re.search(r"\b(?:\d{1,3}\.){3}\d{1,3}\b", text)
@@ -33,6 +41,34 @@ def find_severity(text, keywords):
             return level
     return None
 
+def build_log_values(log_text: str, company_id: str, source: str = "agent") -> dict:
+    """Сырой лог без GPT-анализа: IP, геолокация, severity и время события."""
+    ip = extract_ip_from_text(log_text)
+
+    # --- Геолокация ---
+    geo = lookup_ip(ip)
+    country = geo["country"] or "Unknown"
+    city = geo["city"] or "—"
+
+    # --- Определение severity ---
+    severity_windows = find_severity(log_text, ["success", "information", "failure", "warning", "error"])
+    severity_syslog = find_severity(log_text, ["info", "notice", "warning", "debug", "critical", "emergency"])
+
+    return {
+        "ip": ip,
+        "log_text": log_text,
+        "source": source,
+        "country": country,
+        "city": city,
+        "severity_windows": severity_windows,
+        "severity_syslog": severity_syslog,
+        "timestamp": datetime.utcnow(),
+        "company_id": company_id,
+    }
+
+def build_log_entry(log_text: str, company_id: str, source: str = "agent") -> LogAnalysis:
+    return LogAnalysis(**build_log_values(log_text, company_id, source))
+
 def process_log(
     log_text: str,
     db: Session,
@@ -40,116 +76,183 @@ def process_log(
     background_tasks: BackgroundTasks,
     source: str = "agent"
 ):
-    ip = extract_ip_from_text(log_text)
-
     # --- GPT анализ ---
     gpt_response = analyze_log_with_gpt(log_text)
     parsed = parse_gpt_response(gpt_response)
 
-    # --- Геолокация ---
-    country = city = None
-    try:
-        reader = geoip2.database.Reader("backend/data/GeoLite2-City.mmdb")
-        response = reader.city(ip)
-        country = response.country.name or "Unknown"
-        city = response.city.name or "—"
-        reader.close()
-    except:
-        country, city = "Unknown", "—"
-
-    # --- Определение severity ---
-    severity_windows = find_severity(log_text, ["success", "information", "failure", "warning", "error"])
-    severity_syslog = find_severity(log_text, ["info", "notice", "warning", "debug", "critical", "emergency"])
-
-    timestamp = datetime.utcnow()
-
-    new_analysis = LogAnalysis(
-        ip=ip,
-        log_text=log_text,
-        source=source,
-        attack_type=parsed["attack_type"],
-        mitre_id=parsed["mitre_id"],
-        probability=parsed["probability"],
-        recommendation=parsed["recommendation"],
-        country=country,
-        city=city,
-        severity_windows=severity_windows,
-        severity_syslog=severity_syslog,
-        timestamp=timestamp,
-        company_id=user.company_id
-    )
+    new_analysis = build_log_entry(log_text, user.company_id, source)
+    apply_analysis(new_analysis, parsed)
     db.add(new_analysis)
+    record_rollups(db, [new_analysis])
     db.commit()
     db.refresh(new_analysis)
 
-    try:
-        probability = parsed.get("probability")
-        if probability is not None and probability >= ALERT_THRESHOLD:
-            tg_msg = (
-                f"🚨 Обнаружена угроза!\n"
-                f"Вероятность: {probability}%\n"
-                f"MITRE ID: {parsed.get('mitre_id', '-')}\n"
-            )
-            notify_telegram(tg_msg)
-    except Exception as e:
-        print("Ошибка при отправке уведомления в Telegram:", str(e))
-
-    # Асинхронное оповещение дашборда через BackgroundTasks
-    background_tasks.add_task(notify_dashboard_update, user.company_id)
-    background_tasks.add_task(notify_threats_update, user.company_id)
-    background_tasks.add_task(notify_analytics_update, user.company_id)
+    record_logs([new_analysis])
+    schedule_index_update([new_analysis.id])
+    send_threat_alert(parsed)
+
+    # Оповещение дашборда после ответа; рассылки склеиваются планировщиком ws_manager
+    background_tasks.add_task(schedule_company_update, user.company_id)
 
     return new_analysis
 
 
+def enqueue_log(
+    log_text: str,
+    db: Session,
+    user,
+    background_tasks: BackgroundTasks,
+    source: str = "agent"
+):
+    """Сохраняет лог сразу со статусом pending, а GPT-анализ отдаёт в очередь воркеров."""
+    if not has_capacity():
+        raise HTTPException(503, detail="Очередь анализа переполнена, повторите позже", headers={"Retry-After": "5"})
+
+    new_log = build_log_entry(log_text, user.company_id, source)
+    new_log.attack_type = PENDING_ATTACK_TYPE
+    new_log.probability = 0
+    new_log.analysis_status = "pending"
+    db.add(new_log)
+    record_rollups(db, [new_log])
+    db.commit()
+    db.refresh(new_log)
+    record_logs([new_log])
+
+    try:
+        enqueue_analysis([new_log.id])
+    except queue.Full:
+        # Очередь успела заполниться между проверкой и вставкой — анализируем на месте, чтобы лог не завис в pending
+        parsed = parse_gpt_response(analyze_log_with_gpt(log_text))
+        before = rollup_values(new_log)
+        apply_analysis(new_log, parsed)
+        record_rollup_change(db, [before], [new_log])
+        db.commit()
+        db.refresh(new_log)
+        evict_examples([new_log.id])
+        record_analysis(new_log.company_id, {"attack_type": PENDING_ATTACK_TYPE, "probability": 0}, parsed)
+        schedule_index_update([new_log.id])
+        send_threat_alert(parsed)
+
+    background_tasks.add_task(schedule_company_update, user.company_id, ("dashboard", "threats"))
+
+    return new_log
+
+
 @router.post("", response_model=LogAnalysisOut)
 def create_log(
     log: LogCreate,
     background_tasks: BackgroundTasks,
+    response: Response,
+    async_analysis: bool = False,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
     check_role(user, ["ADMIN", "ANALYST"])
+    if async_analysis:
+        response.status_code = 202
+        return enqueue_log(log.log_text, db, user, background_tasks, log.source)
     return process_log(log.log_text, db, user, background_tasks, log.source)
 
 
 @router.post("/from-agent")
-async def logs_from_agent(
-    request: Request,
+def logs_from_agent(
     background_tasks: BackgroundTasks,
+    payload: Union[dict, List[dict]] = Body(...),
     db: Session = Depends(get_db)
 ):
-    logs = await request.json()
-    if isinstance(logs, dict):
-        logs = [logs]
-    results = []
+    logs = [payload] if isinstance(payload, dict) else payload
+
+    # Один запрос на все компании пачки вместо запроса на каждый лог
+    company_ids = {log.get("company_id") for log in logs if log.get("company_id")}
+    system_users = {}
+    if company_ids:
+        for u in db.query(User).filter(User.company_id.in_(company_ids)).order_by(User.id).all():
+            system_users.setdefault(u.company_id, u)
+
+    rows = []
     for log in logs:
         company_id = log.get("company_id")
-        if not company_id:
-            continue
-        system_user = db.query(User).filter_by(company_id=company_id).first()
-        if not system_user:
+        if company_id not in system_users:
             continue
         log_text = f"{log.get('level','')} {log.get('message','')} ip:{log.get('ip','')}"
-        res = process_log(log_text, db, system_user, background_tasks, source="agent")
-        results.append(res.id)
-    return {"ok": True, "ids": results}
+        values = build_log_values(log_text, company_id, source="agent")
+        values.update(attack_type=PENDING_ATTACK_TYPE, probability=0, analysis_status="pending")
+        rows.append(values)
+
+    if not rows:
+        return {"ok": True, "ids": []}
+
+    if not has_capacity():
+        raise HTTPException(503, detail="Очередь анализа переполнена, повторите позже", headers={"Retry-After": "5"})
+
+    # Вся пачка — один INSERT ... RETURNING и один commit
+    ids = list(db.scalars(
+        insert(LogAnalysis).returning(LogAnalysis.id, sort_by_parameter_order=True),
+        rows
+    ))
+    record_rollups(db, rows)
+    db.commit()
+    record_logs(rows)
+
+    # Что не влезло в очередь (пачка больше свободного места или очередь заполнилась после проверки),
+    # анализируется этим же процессом после ответа — как enqueue_log, только не задерживая агента.
+    # Логи не зависают в pending, а двойного анализа не будет: каждый лог забирается атомарно (claim_logs)
+    overflow = []
+    for i in range(0, len(ids), ANALYSIS_BATCH_SIZE):
+        batch_ids = ids[i:i + ANALYSIS_BATCH_SIZE]
+        if overflow:
+            overflow.append(batch_ids)
+            continue
+        try:
+            enqueue_analysis(batch_ids)
+        except queue.Full:
+            overflow.append(batch_ids)
+    for batch_ids in overflow:
+        background_tasks.add_task(process_queued_logs, batch_ids)
 
+    # Один набор уведомлений на компанию за пачку, а не три на каждый лог
+    for company_id in {row["company_id"] for row in rows}:
+        background_tasks.add_task(schedule_company_update, company_id)
 
-@router.get("/analyzed", response_model=List[LogAnalysisOut])
+    return {"ok": True, "ids": ids}
+
+
+@router.get("/analyzed", response_model=List[LogAnalysisOut], response_model_exclude_unset=True)
 def get_analyzed_logs(
+    response: Response,
+    cursor: Optional[int] = Query(None, description="id последнего лога предыдущей страницы (из X-Next-Cursor)"),
+    limit: int = Query(ANALYZED_PAGE_SIZE, ge=1, le=ANALYZED_PAGE_SIZE_MAX),
+    fields: Optional[str] = Query(None, description="Поля через запятую, например id,attack_type,probability,timestamp"),
     skip: int = 0,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
     check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
-    return (
-        db.query(LogAnalysis)
-        .filter_by(company_id=user.company_id)
+
+    # Проекция: для списков не тянем тяжёлые log_text / recommendation
+    columns = None
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in LogAnalysisOut.model_fields]
+        if unknown:
+            raise HTTPException(400, detail=f"Неизвестные поля: {', '.join(unknown)}")
+        columns = [LogAnalysis.id] + [getattr(LogAnalysis, f) for f in dict.fromkeys(requested) if f != "id"]
+
+    query = (
+        (db.query(*columns) if columns else db.query(LogAnalysis))
+        .filter(LogAnalysis.company_id == user.company_id)
         .order_by(LogAnalysis.id.desc())
-        .offset(skip)
-        .all()
     )
+    # Keyset по id вместо OFFSET: страница читается по индексу (company_id, id) независимо от глубины
+    if cursor is not None:
+        query = query.filter(LogAnalysis.id < cursor)
+    elif skip:
+        query = query.offset(skip)  # оставлено для старых клиентов
+    rows = query.limit(limit).all()
+
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [row._asdict() for row in rows] if columns else rows
 
 
 @router.get("/analyzed/{log_id}", response_model=LogAnalysisOut)
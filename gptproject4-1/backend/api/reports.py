@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from uuid import uuid4
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import case, func
 
 from backend.database import get_db
 from backend.models import Report, LogAnalysis, User
 from backend.schemas import ReportOut, ReportCreateRequest
 from backend.core.security import get_current_user, check_role
 from backend.securitygpt import generate_report_summary
+from backend.utils.rollup_utils import rollup_summary, has_rollups, to_utc_naive
+from backend.utils.aggregate_utils import HIGH_RISK_THRESHOLD
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
@@ -50,6 +54,32 @@ def delete_report(
 
 
 
+def raw_period_stats(db: Session, company_id: str, date_from: datetime, date_to: datetime) -> dict:
+    """Запасной путь для компаний, чьи логи ещё не попали в роллапы (бэкфилл не запускался).
+    Ключи — те же, что читает отчёт из rollup_summary."""
+    is_high = case((LogAnalysis.probability >= HIGH_RISK_THRESHOLD, 1), else_=0)
+    rows = (
+        db.query(LogAnalysis.attack_type, LogAnalysis.mitre_id, LogAnalysis.country, func.count(), func.sum(is_high))
+        .filter(
+            LogAnalysis.company_id == company_id,
+            LogAnalysis.timestamp >= date_from,
+            LogAnalysis.timestamp < date_to
+        )
+        .group_by(LogAnalysis.attack_type, LogAnalysis.mitre_id, LogAnalysis.country)
+        .all()
+    )
+    stats = {"total": 0, "high_risk": 0, "attack_types": Counter(), "mitre": Counter(), "countries": Counter()}
+    for attack_type, mitre_id, country, count, high in rows:
+        stats["total"] += count
+        stats["high_risk"] += high or 0
+        stats["attack_types"][attack_type] += count
+        if mitre_id:
+            stats["mitre"][mitre_id] += count
+        if country:
+            stats["countries"][country] += count
+    return stats
+
+
 @router.post("/generate", response_model=ReportOut)
 def generate_report(
     body: ReportCreateRequest,
@@ -58,19 +88,28 @@ def generate_report(
 ):
     check_role(user, ["ADMIN", "ANALYST"])
 
-    logs = db.query(LogAnalysis).filter(
-        LogAnalysis.company_id == user.company_id,
-        LogAnalysis.timestamp >= body.from_date,
-        LogAnalysis.timestamp <= body.to_date
-    ).all()
+    # to_date в API включительный, как и раньше. Роллапам нужен полуоткрытый период, поэтому верхняя
+    # граница сдвигается на микросекунду; минутные корзины всё равно округляют края периода до минуты
+    date_from = to_utc_naive(body.from_date)
+    date_to = to_utc_naive(body.to_date) + timedelta(microseconds=1)
 
-    if not logs:
+    # Статистика периода — из роллапов; сырые строки нужны только как примеры для GPT
+    if has_rollups(db, user.company_id):
+        stats = rollup_summary(db, user.company_id, date_from, date_to)
+    else:
+        stats = raw_period_stats(db, user.company_id, date_from, date_to)
+    if not stats["total"]:
         raise HTTPException(404, detail="Логи не найдены за указанный период")
 
-    summary = generate_report_summary(logs[:20])
+    logs = db.query(LogAnalysis).filter(
+        LogAnalysis.company_id == user.company_id,
+        LogAnalysis.timestamp >= date_from,
+        LogAnalysis.timestamp < date_to
+    ).order_by(LogAnalysis.timestamp).limit(20).all()
+
+    summary = generate_report_summary(logs, stats)
 
-    mitres = set(l.mitre_id for l in logs if l.mitre_id)
-    mitre_ids = ",".join(mitres)
+    mitre_ids = ",".join(stats["mitre"])
 
     report = Report(
         id=str(uuid4()),
@@ -79,7 +118,7 @@ def generate_report(
         content=summary,
         insights="Автоматически сгенерировано на основе логов",
         mitre_ids=mitre_ids,
-        stats=f"Total logs: {len(logs)}"
+        stats=f"Total logs: {stats['total']}"
     )
 
     db.add(report)
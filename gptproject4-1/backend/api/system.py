@@ -1,7 +1,19 @@
 import psutil
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 
 from backend.core.security import check_role, get_current_user
+from backend.utils.analysis_queue import get_queue_stats
+from backend.utils.geo_utils import get_geoip_stats
+from backend.utils.index_updater import get_index_updater_stats
+from backend.utils.gpt_cache import get_cache_stats
+from backend.utils.llm_gateway import get_gateway_stats
+from backend.securitygpt import get_readiness
+from backend.utils.ws_manager import get_broadcast_stats
+from backend.utils.aggregate_utils import get_aggregate_stats
+from backend.utils.rollup_utils import get_rollup_stats
+from backend.utils.upload_utils import get_upload_stats
+from backend.core.principals import get_principal_cache_stats
 
 router = APIRouter(prefix="/system", tags=["System"])
 
@@ -58,4 +70,30 @@ async def get_system_metrics(
             "bytes_recv": net.bytes_recv
         },
         "temperatures": temps  # Словарь с температурой по датчикам, если есть поддержка
-    }
\ No newline at end of file
+    }
+
+@router.get("/ready")
+def get_readiness_status():
+    # Без авторизации: для healthcheck'ов балансировщика. 503, пока модель и индекс не загружены
+    readiness = get_readiness()
+    return JSONResponse(status_code=200 if readiness["status"] == "ready" else 503, content=readiness)
+
+@router.get("/pipeline")
+def get_pipeline_metrics(
+        user=Depends(get_current_user)
+):
+    check_role(user, ["ADMIN", "ANALYST", "VIEWER"])
+
+    return {
+        "analysis_queue": get_queue_stats(),
+        "geoip": get_geoip_stats(),
+        "index_updater": get_index_updater_stats(),
+        "gpt_cache": get_cache_stats(),
+        "llm_gateway": get_gateway_stats(),
+        "resources": get_readiness(),
+        "ws_broadcast": get_broadcast_stats(),
+        "aggregates": get_aggregate_stats(),
+        "rollups": get_rollup_stats(),
+        "uploads": get_upload_stats(),
+        "principals": get_principal_cache_stats()
+    }
@@ -6,6 +6,9 @@ from backend.database import get_db
 from backend.models import LogAnalysis
 from backend.core.security import get_current_user, check_role
 from backend.schemas import LogAnalysisOut
+from backend.utils.index_updater import schedule_index_update
+from backend.utils.aggregate_utils import record_status_change
+from backend.securitygpt import evict_examples
 
 router = APIRouter(prefix="/threats", tags=["Threats"])
 
@@ -25,10 +28,16 @@ def resolve_threat(
     if threat.status == "Заблокирована":
         return {"message": "Угроза уже заблокирована"}
 
+    old_status = threat.status
     threat.status = "Заблокирована"
     threat.resolved_by = user.username
     threat.resolved_at = datetime.utcnow()
     db.commit()
+    record_status_change(user.company_id, old_status, threat.status)
+    evict_examples([threat.id])
+
+    # Разобранная аналитиком угроза — хороший пример для поиска похожих логов
+    schedule_index_update([threat.id])
 
     return {"message": "Угроза успешно заблокирована"}
 
@@ -1,19 +1,19 @@
-import io
-import pandas as pd
-from datetime import datetime
+import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from sqlalchemy.orm import Session
 
 from backend.database import get_db
-from backend.models import LogAnalysis
+from backend.models import UploadJob
 from backend.core.security import get_current_user, check_role
+from backend.utils.upload_utils import read_header, detect_columns, spool_upload, submit_job, job_view, cancel_job
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
 
-@router.post("/csv")
+@router.post("/csv", status_code=202)
 def upload_csv(
     file: UploadFile = File(...),
+    enrich: bool = False,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
@@ -22,46 +22,52 @@ def upload_csv(
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Файл должен быть CSV")
 
-    content = file.file.read()
-    df = pd.read_csv(io.BytesIO(content))
-    df.columns = df.columns.str.strip()
+    # Файл целиком в память не читаем: копируем потоком в spool-каталог, дальше его кусками разбирает воркер
+    job_id, path = spool_upload(file.file)
 
-    possible_columns = [
-        ('Destination Port', 'Flow Duration', 'Total Fwd Packets', 'Label'),
-        ('Dst Port', 'Flow Duration', 'Fwd Pkts', 'Label'),
-        ('dst_port', 'duration', 'fwd_packets', 'label')
-    ]
+    try:
+        header = read_header(path)
+    except Exception:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail="Не удалось прочитать CSV")
 
-    for cols in possible_columns:
-        if all(c in df.columns for c in cols):
-            col_port, col_dur, col_pkt, col_label = cols
-            break
-    else:
+    columns = detect_columns(header)
+    if columns is None:
+        os.remove(path)
         raise HTTPException(
             status_code=400,
-            detail=f"Нужные колонки не найдены. Обнаружены: {df.columns.tolist()}"
+            detail=f"Нужные колонки не найдены. Обнаружены: {[c.strip() for c in header]}"
         )
 
-    df = df[[col_port, col_dur, col_pkt, col_label]].dropna()
+    job = submit_job(db, job_id, path, columns, user.company_id, file.filename, enrich)
+    return {"job_id": job.id, "message": "Файл принят, загрузка идёт в фоне"}
 
-    for _, row in df.iterrows():
-        log_text = f"Порт: {int(row[col_port])}, Длительность: {int(row[col_dur])}, Пакеты: {int(row[col_pkt])}"
-        log = LogAnalysis(
-            ip="0.0.0.0",  # неизвестен
-            log_text=log_text,
-            attack_type=row[col_label],
-            mitre_id=None,
-            probability=0.0,
-            recommendation=None,
-            country=None,
-            city=None,
-            severity_windows=None,
-            severity_syslog=None,
-            timestamp=datetime.utcnow(),
-            company_id=user.company_id,
-            status="Активна"
-        )
-        db.add(log)
 
-    db.commit()
-    return {"message": f"Загружено логов: {len(df)}"}
+def get_company_job(db: Session, job_id: str, user) -> UploadJob:
+    job = db.query(UploadJob).filter_by(id=job_id, company_id=user.company_id).first()
+    if not job:
+        raise HTTPException(404, detail="Задача загрузки не найдена")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+def upload_job_status(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    check_role(user, ["ADMIN", "ANALYST"])
+    return job_view(get_company_job(db, job_id, user))
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_upload_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    check_role(user, ["ADMIN", "ANALYST"])
+    job = get_company_job(db, job_id, user)
+    if job.status not in ("queued", "running"):
+        raise HTTPException(409, detail=f"Задача уже завершена: {job.status}")
+    return job_view(cancel_job(db, job))
@@ -5,62 +5,73 @@ from backend.core.security_ws import get_current_user_ws
 from backend.utils.ws_manager import (
     add_connection, remove_connection,
     add_analytics_connection, remove_analytics_connection,
-    add_threats_connection, remove_threats_connection
+    add_threats_connection, remove_threats_connection,
+    register_delta_client, unregister_delta_client, send_snapshot,
+    open_outbox, close_outbox, enqueue_message, encode_message
 )
 import json
 
 router = APIRouter(prefix="/ws", tags=["WebSocket"])
 
-@router.websocket("/dashboard")
-async def dashboard_ws(websocket: WebSocket):
-    print("WS ENDPOINT CALLED")
-    user = await get_current_user_ws(websocket)
-    company_id = user.company_id
-    await websocket.accept()
-    add_connection(company_id, websocket)
+PING_INTERVAL = 20
+PING_MESSAGE = encode_message({"type": "ping"})
+
 
+async def _ping(websocket: WebSocket):
+    # Пинг идёт через ту же очередь, что и рассылки: у сокета один писатель
+    while enqueue_message(websocket, PING_MESSAGE):
+        await asyncio.sleep(PING_INTERVAL)  # Пинг каждые 20 секунд
+
+
+async def _serve(websocket: WebSocket, channel: str, company_id: str, add, remove):
+    # ?protocol=delta — снапшот + дельты с seq; без параметра — полные *_update, как раньше
+    delta = websocket.query_params.get("protocol") == "delta"
+    open_outbox(channel, company_id, websocket)
+    add(company_id, websocket)
+    pinger = asyncio.create_task(_ping(websocket))
     try:
+        if delta:
+            register_delta_client(channel, company_id, websocket)
+            await send_snapshot(channel, company_id, websocket)
         while True:
-            # Отправляем ping-сообщение клиенту
-            await websocket.send_text(json.dumps({"type": "ping"}))
-            await asyncio.sleep(20)  # Пинг каждые 20 секунд
+            text = await websocket.receive_text()
+            if not delta:
+                continue
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "resync":
+                await send_snapshot(channel, company_id, websocket, resync=True)
     except WebSocketDisconnect:
-        remove_connection(company_id, websocket)
+        pass
     except Exception as e:
-        print("WS error (dashboard):", e)
-        remove_connection(company_id, websocket)
+        print(f"WS error ({channel}):", e)
+    finally:
+        pinger.cancel()
+        close_outbox(websocket)
+        remove(company_id, websocket)
+        if delta:
+            unregister_delta_client(channel, company_id, websocket)
+
+
+@router.websocket("/dashboard")
+async def dashboard_ws(websocket: WebSocket):
+    print("WS ENDPOINT CALLED")
+    user = await get_current_user_ws(websocket)
+    await websocket.accept()
+    await _serve(websocket, "dashboard", user.company_id, add_connection, remove_connection)
 
 @router.websocket("/threats")
 async def ws_threats(websocket: WebSocket):
     user = await get_current_user_ws(websocket)
     print("ws_threats called, company_id:", user.company_id, "user:", user)
-
     await websocket.accept()
-    company_id = user.company_id
-    add_threats_connection(company_id, websocket)
-    try:
-        while True:
-            await websocket.send_text(json.dumps({"type": "ping"}))
-            await asyncio.sleep(20)  # Пинг каждые 20 секунд
-    except WebSocketDisconnect:
-        remove_threats_connection(company_id, websocket)
-    except Exception as e:
-        print("WS error (threats):", e)
-        remove_threats_connection(company_id, websocket)
+    await _serve(websocket, "threats", user.company_id, add_threats_connection, remove_threats_connection)
 
 @router.websocket("/analytics")
 async def analytics_ws(websocket: WebSocket):
     user = await get_current_user_ws(websocket)
     print("analytics_ws called, company_id:", user.company_id, "user:", user)
     await websocket.accept()
-    company_id = user.company_id
-    add_analytics_connection(company_id, websocket)
-    try:
-        while True:
-            await websocket.send_text(json.dumps({"type": "ping"}))
-            await asyncio.sleep(20)  # Пинг каждые 20 секунд
-    except WebSocketDisconnect:
-        remove_analytics_connection(company_id, websocket)
-    except Exception as e:
-        print("WS error (analytics):", e)
-        remove_analytics_connection(company_id, websocket)
\ No newline at end of file
+    await _serve(websocket, "analytics", user.company_id, add_analytics_connection, remove_analytics_connection)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from backend.models import UserRole
+
+# 🪪 Кэш аутентифицированных пользователей: токен → (id, username, role, company_id).
+# Попадание в кэш не трогает ни базу, ни jwt.decode. Запись живёт PRINCIPAL_CACHE_TTL секунд,
+# но не дольше exp самого токена. Удаление пользователя или компании сбрасывает записи сразу
+# в этом процессе; в остальных воркерах — не позже чем через TTL.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# 1 — верить role/company_id/uid из подписанного токена и не ходить в базу даже при промахе.
+# Тогда удалённый пользователь в других процессах работает до истечения токена — поэтому по умолчанию выключено
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "0") == "1"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """То, что обработчики читают у текущего пользователя; не ORM-объект и к сессии не привязан."""
+    id: int
+    username: str
+    role: UserRole
+    company_id: str | None
+
+
+def principal_from_user(user) -> Principal:
+    return Principal(id=user.id, username=user.username, role=user.role, company_id=user.company_id)
+
+
+def principal_from_claims(payload: dict) -> Principal | None:
+    # Старые токены без uid так не разобрать — для них всё равно идём в базу
+    if payload.get("uid") is None or "company_id" not in payload:
+        return None
+    try:
+        role = UserRole(payload.get("role"))
+    except ValueError:
+        return None
+    return Principal(
+        id=payload["uid"],
+        username=payload.get("username") or payload.get("sub"),
+        role=role,
+        company_id=payload["company_id"]
+    )
+
+
+class PrincipalCache:
+    # Отдельный экземпляр на каждый способ проверки токена: HTTP и WS подписывают разными ключами,
+    # и токен, проверенный одним, не должен считаться проверенным другим
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # токен -> (Principal, monotonic-дедлайн)
+        self._stats = {"hits": 0, "misses": 0, "claims": 0, "invalidated": 0, "evicted": 0}
+        _caches.append(self)
+
+    def get(self, token: str) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[token]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(token)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal, exp=None):
+        ttl = PRINCIPAL_CACHE_TTL
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (principal, time.monotonic() + ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > PRINCIPAL_CACHE_SIZE:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+
+    def resolve(self, token: str, payload: dict, load_user) -> Principal | None:
+        """Промах кэша: claims токена (если TRUST_TOKEN_CLAIMS) или load_user(username) из базы."""
+        principal = principal_from_claims(payload) if TRUST_TOKEN_CLAIMS else None
+        if principal is not None:
+            with self._lock:
+                self._stats["claims"] += 1
+        else:
+            user = load_user(payload.get("username") or payload.get("sub"))
+            if user is None:
+                return None
+            principal = principal_from_user(user)
+        self.put(token, principal, payload.get("exp"))
+        return principal
+
+    def invalidate(self, predicate):
+        with self._lock:
+            stale = [token for token, (principal, _) in self._entries.items() if predicate(principal)]
+            for token in stale:
+                del self._entries[token]
+            self._stats["invalidated"] += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+_caches = []
+
+
+def invalidate_user(username: str):
+    for cache in _caches:
+        cache.invalidate(lambda principal: principal.username == username)
+
+
+def invalidate_company(company_id: str):
+    for cache in _caches:
+        cache.invalidate(lambda principal: principal.company_id == company_id)
+
+
+def get_principal_cache_stats() -> dict:
+    return {
+        "ttl_seconds": PRINCIPAL_CACHE_TTL,
+        "trust_token_claims": TRUST_TOKEN_CLAIMS,
+        **{cache.name: cache.stats() for cache in _caches},
+    }
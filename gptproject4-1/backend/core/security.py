@@ -7,20 +7,29 @@ from backend.database import get_db
 from backend.models import User
 from backend.auth import SECRET_KEY, ALGORITHM
 from backend.schemas import TokenData
+from backend.core.principals import Principal, PrincipalCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+http_principals = PrincipalCache("http")
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить токен",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    # Токен уже проверяли недавно — ни jwt.decode, ни запроса к users
+    principal = http_principals.get(token)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("username")
@@ -29,14 +38,16 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter_by(username=username).first()
-    if user is None:
+    principal = http_principals.resolve(
+        token, payload, lambda name: db.query(User).filter_by(username=name).first()
+    )
+    if principal is None:
         raise credentials_exception
 
-    return user
+    return principal
 
 
-def check_role(user: User, allowed_roles: list[str]):
+def check_role(user: Principal, allowed_roles: list[str]):
     if user.role not in allowed_roles:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -12,12 +12,19 @@ print(SECRET_KEY)
 ALGORITHM = "HS256"
 print("WS AUTH FILE LOADED")
 from backend.database import SessionLocal
+from backend.core.principals import PrincipalCache
+
+ws_principals = PrincipalCache("ws")
 
 async def get_current_user_ws(websocket: WebSocket):
     token = websocket.query_params.get("token")
     if not token:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Missing token")
+    # Тот же кэш, что и у HTTP, но свой экземпляр: здесь токен проверяется своим ключом
+    principal = ws_principals.get(token)
+    if principal is not None:
+        return principal
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("username") or payload.get("sub")
@@ -28,8 +35,10 @@ async def get_current_user_ws(websocket: WebSocket):
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid token")
     # Здесь создаём и сразу закрываем сессию
     with SessionLocal() as db:
-        user = db.query(User).filter_by(username=username).first()
-        if not user:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="User not found")
-        return user
\ No newline at end of file
+        principal = ws_principals.resolve(
+            token, payload, lambda name: db.query(User).filter_by(username=name).first()
+        )
+    if principal is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="User not found")
+    return principal
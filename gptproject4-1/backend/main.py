@@ -1,10 +1,17 @@
-import os
-import requests
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from backend.core.config import custom_openapi
 from backend.database import engine
 from backend.models import Base
+from backend.utils.analysis_queue import start_analysis_workers, stop_analysis_workers
+from backend.utils.geo_utils import init_geoip
+from backend.utils.ws_manager import start_broadcast_scheduler, stop_broadcast_scheduler
+from backend.utils.aggregate_utils import start_aggregate_reconciler
+from backend.utils.rollup_utils import start_rollup_compactor
+from backend.utils.index_updater import start_index_updater, stop_index_updater
+from backend.utils.upload_utils import start_upload_workers, stop_upload_workers
+from backend.securitygpt import warm_up_in_background
 
 # 📦 Импортируем роутеры
 from backend.api import (
@@ -27,25 +34,6 @@ from backend.api import (
 )
 
 
-INDEX_PATH = "backend/logs_faiss.index"
-DRIVE_FILE_ID = os.getenv("FAISS_INDEX_ID")
-
-def download_index_from_gdrive(file_id, dest_path):
-    url = f"https://drive.google.com/uc?export=download&id={file_id}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(dest_path, "wb") as f:
-            f.write(response.content)
-        print("Индекс успешно скачан с Google Drive!")
-    else:
-        print("Ошибка скачивания индекса с Google Drive:", response.status_code)
-
-if not os.path.exists(INDEX_PATH):
-    print("Файл индекса не найден, скачиваем...")
-    download_index_from_gdrive(DRIVE_FILE_ID, INDEX_PATH)
-else:
-    print("Файл индекса уже есть локально.")
-
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
@@ -57,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # 🔌 Подключение роутеров
@@ -82,6 +71,28 @@ app.include_router(system.router)
 print("WS ROUTER REGISTERED")
 
 
+@app.on_event("startup")
+async def start_background_workers():
+    init_geoip()
+    # Модель и FAISS индекс (а при необходимости и скачивание индекса) — в фоне, сервер уже принимает запросы
+    warm_up_in_background()
+    # WS-рассылки считаются в этом event loop; воркеры анализа из своих потоков только помечают компании
+    start_broadcast_scheduler(asyncio.get_running_loop())
+    start_analysis_workers()
+    start_index_updater()
+    start_aggregate_reconciler()
+    start_rollup_compactor()
+    start_upload_workers()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    stop_analysis_workers()
+    stop_index_updater()
+    stop_upload_workers()
+    stop_broadcast_scheduler()
+
+
 @app.get("/")
 def root():
     return {"msg": "SecurityGPT API работает 🔐"}
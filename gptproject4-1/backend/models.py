@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Enum, ForeignKey, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Float, Enum, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -95,6 +95,22 @@ class LogAnalysis(Base):
     status = Column(String, default="Активна", nullable=False)  # или "Заблокирована"
     resolved_by = Column(String, nullable=True)
     resolved_at = Column(DateTime, nullable=True)
+    analysis_status = Column(String, default="done", server_default="done", nullable=False)  # pending / processing / done / failed
+    analysis_claimed_at = Column(DateTime, nullable=True)  # когда воркер анализа забрал лог (processing)
+
+    # Все горячие запросы ограничены компанией: company_id идёт первым в каждом индексе
+    __table_args__ = (
+        Index("ix_log_analysis_company_timestamp", "company_id", "timestamp"),  # последние логи, периоды отчётов и экспорта
+        Index("ix_log_analysis_company_id_id", "company_id", "id"),  # ленты угроз по id desc
+        Index("ix_log_analysis_company_attack_type", "company_id", "attack_type"),
+        # Частичный индекс только по опасным логам — маленький и всегда горячий
+        Index(
+            "ix_log_analysis_company_high_risk",
+            "company_id",
+            "timestamp",
+            postgresql_where=text("probability >= 70")
+        ),
+    )
 
     def as_dict(self):
         d = {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -102,6 +118,51 @@ class LogAnalysis(Base):
         return d
 
 
+# 📈 Роллап логов по временным корзинам (minute / hour / day), см. utils/rollup_utils.
+# Пустые измерения хранятся как '' — иначе NULL в первичном ключе ломает upsert.
+class LogRollup(Base):
+    __tablename__ = "log_rollups"
+
+    company_id = Column(String, primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    attack_type = Column(String, primary_key=True, default="", server_default="")
+    mitre_id = Column(String, primary_key=True, default="", server_default="")
+    severity_windows = Column(String, primary_key=True, default="", server_default="")
+    severity_syslog = Column(String, primary_key=True, default="", server_default="")
+    country = Column(String, primary_key=True, default="", server_default="")
+    risk_level = Column(String, primary_key=True, default="low", server_default="low")  # low / medium / high
+    count = Column(Integer, default=0, server_default="0", nullable=False)
+    high_risk = Column(Integer, default=0, server_default="0", nullable=False)
+
+
+# 📥 Задачи загрузки CSV: файл лежит в UPLOAD_SPOOL_DIR, обрабатывает его воркер utils/upload_utils
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex
+    company_id = Column(String, nullable=False, index=True)
+    filename = Column(String)
+    spool_path = Column(String)
+    columns = Column(Text)  # JSON: исходные имена колонок порта, длительности, пакетов и метки
+    enrich = Column(Boolean, default=False, nullable=False)
+    status = Column(String, default="queued", server_default="queued", nullable=False)  # queued / running / done / failed / cancelled
+    cancel_requested = Column(Boolean, default=False, server_default="false", nullable=False)
+    rows_processed = Column(Integer, default=0, server_default="0", nullable=False)
+    rows_failed = Column(Integer, default=0, server_default="0", nullable=False)
+    bytes_read = Column(BigInteger, default=0, server_default="0", nullable=False)  # файлы бывают в несколько ГБ
+    bytes_total = Column(BigInteger, default=0, server_default="0", nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # обновляется после каждого куска; по нему находим задачи упавшего процесса
+
+    __table_args__ = (
+        Index("ix_upload_jobs_status_created_at", "status", "created_at"),  # выборка очереди воркером
+    )
+
+
 class LoginHistory(Base):
     __tablename__ = "login_history"
 
@@ -119,24 +119,26 @@ from typing import Optional
 from datetime import datetime
 
 class LogAnalysisOut(BaseModel):
+    # Значения по умолчанию нужны проекции /logs/analyzed?fields=...: там приходит только часть полей
     id: int
-    ip: Optional[str]
-    log_text: Optional[str]
-    source: Optional[str]
-    attack_type: Optional[str]
-    mitre_id: Optional[str]
-    probability: Optional[float]
-    recommendation: Optional[str]
-    country: Optional[str]
-    city: Optional[str]
-    severity_windows: Optional[str]
-    severity_syslog: Optional[str]
-    timestamp: Optional[datetime]
-    company_id: Optional[str]
-    created_at: Optional[datetime]
-    status: Optional[str]
-    resolved_by: Optional[str]
-    resolved_at: Optional[datetime]
+    ip: Optional[str] = None
+    log_text: Optional[str] = None
+    source: Optional[str] = None
+    attack_type: Optional[str] = None
+    mitre_id: Optional[str] = None
+    probability: Optional[float] = None
+    recommendation: Optional[str] = None
+    country: Optional[str] = None
+    city: Optional[str] = None
+    severity_windows: Optional[str] = None
+    severity_syslog: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    company_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    status: Optional[str] = None
+    resolved_by: Optional[str] = None
+    resolved_at: Optional[datetime] = None
+    analysis_status: Optional[str] = None
 
     class Config:
         from_attributes = True  # для pydantic v2
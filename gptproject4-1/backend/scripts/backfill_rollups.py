@@ -0,0 +1,32 @@
+# backend/scripts/backfill_rollups.py
+# Пересчёт таблицы log_rollups по уже сохранённым логам (после миграции или для починки):
+#   python -m backend.scripts.backfill_rollups
+#   python -m backend.scripts.backfill_rollups --company <company_id> --from 2025-01-01 --to 2025-02-01
+import argparse
+from datetime import datetime
+
+from backend.database import SessionLocal
+from backend.utils.rollup_utils import rebuild_rollups
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бэкфилл роллапов log_rollups из log_analysis")
+    parser.add_argument("--company", help="Только одна компания (по умолчанию — все)")
+    parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat,
+                        help="Начало периода, округляется вниз до суток")
+    parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat,
+                        help="Конец периода, округляется вверх до суток")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with SessionLocal() as db:
+        print("📈 Пересчитываем роллапы...")
+        rebuild_rollups(db, args.company, args.date_from, args.date_to)
+        db.commit()
+    print("✅ Роллапы пересчитаны")
+
+
+if __name__ == "__main__":
+    main()
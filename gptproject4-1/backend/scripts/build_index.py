@@ -1,29 +1,113 @@
 # backend/build_index.py
-from sentence_transformers import SentenceTransformer
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+
 import faiss
 import numpy as np
-import sqlite3
-import os
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сборка FAISS индекса по размеченным логам")
+    parser.add_argument("--db", default="../../security_logs.db", help="SQLite база с таблицей logs")
+    parser.add_argument("--index-path", default="logs_faiss.index")
+    parser.add_argument("--ids-path", default="log_ids.npy")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="flat — точный перебор; ivf_flat / ivf_pq / hnsw — приближённый поиск")
+    parser.add_argument("--nlist", type=int, default=1024, help="Кол-во кластеров IVF")
+    parser.add_argument("--nprobe", type=int, default=16, help="Сколько кластеров IVF просматривать при поиске")
+    parser.add_argument("--pq-m", type=int, default=16, help="Кол-во подвекторов PQ (размерность должна делиться на него)")
+    parser.add_argument("--pq-nbits", type=int, default=8, help="Бит на код подвектора PQ")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="Кол-во связей на вершину HNSW")
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, default=64)
+    return parser.parse_args()
+
+
+def build_index(args, embeddings: np.ndarray):
+    n, dimension = embeddings.shape
+    params = {}
+
+    if args.index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+
+    elif args.index_type in ("ivf_flat", "ivf_pq"):
+        # Для обучения k-means нужно хотя бы ~39 точек на кластер
+        nlist = max(1, min(args.nlist, n // 39 or 1))
+        if nlist != args.nlist:
+            print(f"⚠️ nlist уменьшен до {nlist}: слишком мало логов для {args.nlist} кластеров")
+        quantizer = faiss.IndexFlatL2(dimension)
+        if args.index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            if dimension % args.pq_m != 0:
+                raise SystemExit(f"❌ Размерность {dimension} не делится на --pq-m {args.pq_m}")
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, args.pq_m, args.pq_nbits)
+            params.update(pq_m=args.pq_m, pq_nbits=args.pq_nbits)
+        print(f"🎓 Обучаем IVF ({nlist} кластеров)...")
+        index.train(embeddings)
+        index.nprobe = args.nprobe
+        params.update(nlist=nlist, nprobe=args.nprobe)
+
+    else:
+        index = faiss.IndexHNSWFlat(dimension, args.hnsw_m)
+        index.hnsw.efConstruction = args.ef_construction
+        index.hnsw.efSearch = args.ef_search
+        params.update(hnsw_m=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search)
+
+    index.add(embeddings)
+    return index, params
+
+
+def meta_path_for(index_path: str) -> str:
+    return os.path.splitext(index_path)[0] + ".meta.json"
+
+
+def main():
+    args = parse_args()
+    model = SentenceTransformer(MODEL_NAME)
+
+    print("📥 Загружаем логи из базы...")
+    conn = sqlite3.connect(args.db)
+    cursor = conn.cursor()
+    cursor.execute("SELECT rowid, log_text FROM logs")
+    rows = cursor.fetchall()
+    conn.close()
+
+    texts = [r[1] for r in rows]
+    ids = [r[0] for r in rows]
+
+    print(f"🧠 Генерируем эмбеддинги для {len(texts)} логов...")
+    embeddings = model.encode(texts, convert_to_numpy=True, batch_size=32, show_progress_bar=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+    print(f"🏗 Строим индекс типа {args.index_type}...")
+    index, params = build_index(args, embeddings)
 
-print("📥 Загружаем логи из базы...")
-conn = sqlite3.connect("../../security_logs.db")
-cursor = conn.cursor()
-cursor.execute("SELECT rowid, log_text FROM logs")
-rows = cursor.fetchall()
-conn.close()
+    faiss.write_index(index, args.index_path)
+    np.save(args.ids_path, np.array(ids))
 
-texts = [r[1] for r in rows]
-ids = [r[0] for r in rows]
+    # Метаданные рядом с индексом: securitygpt по ним выставляет параметры поиска при загрузке
+    meta = {
+        "index_type": args.index_type,
+        "metric": "L2",
+        "dimension": int(embeddings.shape[1]),
+        "ntotal": int(index.ntotal),
+        "model": MODEL_NAME,
+        "created_at": datetime.utcnow().isoformat(),
+        **params,
+    }
+    with open(meta_path_for(args.index_path), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
 
-print(f"🧠 Генерируем эмбеддинги для {len(texts)} логов...")
-embeddings = model.encode(texts, convert_to_numpy=True, batch_size=32, show_progress_bar=True)
+    print("✅ FAISS индекс, ID и метаданные сохранены!")
 
-dimension = embeddings.shape[1]
-index = faiss.IndexFlatL2(dimension)
-index.add(embeddings)
 
-faiss.write_index(index, "logs_faiss.index")
-np.save("log_ids.npy", np.array(ids))
-print("✅ FAISS индекс и ID сохранены!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# backend/scripts/llm_stub_server.py
+# Локальная заглушка OpenAI Chat Completions для проверки utils/llm_gateway без реального API:
+#   python backend/scripts/llm_stub_server.py --port 8081 --delay 0.5 --fail-rate 0.2
+#   OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=stub uvicorn backend.main:app
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ANSWER = """Тип атаки: Brute Force
+MITRE: T1110
+Вероятность: 80%
+Рекомендации: Ограничьте число попыток входа и заблокируйте IP источника."""
+
+counter_lock = threading.Lock()
+counter = {"requests": 0}
+
+
+def make_handler(args):
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with counter_lock:
+                counter["requests"] += 1
+                n = counter["requests"]
+            print(f"📥 #{n} {self.path} model={request.get('model')}")
+
+            time.sleep(args.delay)
+            if random.random() < args.fail_rate:
+                status = random.choice([429, 500, 503])
+                self._send(status, {"error": {"message": "stub failure", "type": "server_error"}}, {"Retry-After": "0"})
+                return
+
+            self._send(200, {
+                "id": f"chatcmpl-stub-{n}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": args.answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        def log_message(self, *_):
+            pass
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenAI API для локальных тестов")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.2, help="Задержка ответа, сек")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Доля ответов 429/5xx")
+    parser.add_argument("--answer", default=STUB_ANSWER)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args))
+    print(f"✅ Заглушка OpenAI слушает http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
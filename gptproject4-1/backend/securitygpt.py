@@ -1,24 +1,29 @@
-import gdown
-import openai
 import faiss
 import numpy as np
 import sqlite3
 import re
+import time
 
 import requests
-from sentence_transformers import SentenceTransformer
 from sqlalchemy.orm import Session
 from backend.database import SessionLocal
 from backend.models import LogAnalysis
+from backend.utils import gpt_cache
+from backend.utils.llm_gateway import chat_completion
 import os
 from dotenv import load_dotenv
-from collections import Counter
+from collections import Counter, OrderedDict
 import json
+import threading
+
+try:
+    import fcntl  # межпроцессная блокировка снимка дельта-индекса; на Windows воркер обычно один
+except ImportError:
+    fcntl = None
 
 load_dotenv()
 
 # Настройки и переменные
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 ALERT_THRESHOLD = 70  # процент вероятности
@@ -26,57 +31,330 @@ ALERT_THRESHOLD = 70  # процент вероятности
 # Пути к файлам
 INDEX_PATH = os.path.join(os.path.dirname(__file__), "logs_faiss.index")
 IDS_PATH = os.path.join(os.path.dirname(__file__), "log_ids.npy")
+META_PATH = os.path.join(os.path.dirname(__file__), "logs_faiss.meta.json")  # пишет scripts/build_index.py
+# Дельта-индекс: логи, проанализированные уже в проде (id = LogAnalysis.id), см. utils/index_updater
+DELTA_INDEX_PATH = os.path.join(os.path.dirname(__file__), "logs_faiss.delta.index")
+# Дельта — точный перебор (IndexFlatL2), поэтому её размер ограничен: при превышении самые старые
+# векторы (меньшие id) выбрасываются. Они вернутся в поиск при пересборке основного индекса
+DELTA_INDEX_MAX = int(os.getenv("DELTA_INDEX_MAX", "50000"))
 DRIVE_FILE_ID = os.getenv("FAISS_INDEX_ID")  # ID файла на Google Drive (если используешь автоскачивание)
 
-# INDEX_PATH = os.path.join(os.path.dirname(__file__), "logs_faiss.index")
 FILE_ID = "1THFPYvsGfgxbSQvNc8SMYh0CtsWpBnBo"
+MODEL_NAME = "all-MiniLM-L6-v2"
+# 🗺 Индекс и log_ids отображаются в память (mmap): страницы файла в page cache общие для всех
+# воркеров uvicorn, поэтому N процессов держат одну физическую копию, а не N приватных
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+
+# ⏳ Тяжёлые ресурсы (MiniLM, FAISS, log_ids) грузятся не при импорте, а при первом обращении
+# или в фоне после старта сервера (warm_up_in_background) — /auth/login и прочее не ждут модель.
+_resources_lock = threading.Lock()
+_model = None
+_index = None
+_ids = None
+index_meta = None
+delta_index = None
+_readiness = {"status": "not_loaded", "error": None, "load_seconds": None, "mmap": None}
+
+def _ensure_index_file():
+    if os.path.exists(INDEX_PATH):
+        return
+    import gdown
 
-if not os.path.exists(INDEX_PATH):
     print("Файл индекса не найден, скачиваем из Google Drive...")
-    gdown.download(f"https://drive.google.com/uc?id={FILE_ID}", INDEX_PATH, quiet=False)
+    # Качаем во временный файл: соседний воркер не должен отобразить в память недокачанный индекс
+    tmp_path = f"{INDEX_PATH}.{os.getpid()}.part"
+    gdown.download(f"https://drive.google.com/uc?id={DRIVE_FILE_ID or FILE_ID}", tmp_path, quiet=False)
     # Проверим, что скачан бинарник, а не html:
-    with open(INDEX_PATH, "rb") as f:
+    with open(tmp_path, "rb") as f:
         head = f.read(100)
         print("First 100 bytes:", head)
-# Проверяем наличие ID-файла
-if not os.path.exists(IDS_PATH):
-    print(f"❌ Не найден файл: {IDS_PATH}. Проверь, что log_ids.npy лежит рядом с logs_faiss.index!")
-    raise FileNotFoundError(f"{IDS_PATH} not found")
-
-# Инициализация клиентов
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Отладка: покажем первые байты индекса
-with open(INDEX_PATH, "rb") as f:
-    head = f.read(100)
-    print("First 100 bytes of logs_faiss.index:", head)
-
-# Загрузка FAISS индекса и ID
-index = faiss.read_index(INDEX_PATH)
-ids = np.load(IDS_PATH)
-
-def get_similar_logs_pg(input_text: str, top_k: int = 3):
-    query_vec = model.encode([input_text])
-    D, I = index.search(query_vec, top_k)
-
-    db: Session = SessionLocal()
-    results = []
-
-    for idx in I[0]:
-        log_id = int(ids[idx])
-        entry = db.query(LogAnalysis).filter_by(id=log_id).first()
-
-        if entry:
-            results.append({
-                "log": entry.log_text,
-                "type": entry.attack_type,
-                "mitre": entry.mitre_id,
-                "recommendation": entry.recommendation,
-            })
-
-    db.close()
-    return results
+    os.replace(tmp_path, INDEX_PATH)
+
+def _mmap_flag(index_type: str):
+    """Флаг чтения, при котором коды индекса действительно остаются в файле, а не копируются в память.
+
+    IO_FLAG_MMAP отображает только инвертированные списки IVF; плоские коды (flat и хранилище hnsw)
+    отображает лишь IO_FLAG_MMAP_IFC из faiss >= 1.11. Вместе их не передать: IFC ломает чтение IVF.
+    """
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.IO_FLAG_MMAP
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+
+def read_main_index(index_type: str):
+    flag = _mmap_flag(index_type) if FAISS_MMAP else None
+    if flag is not None:
+        try:
+            return faiss.read_index(INDEX_PATH, flag), True
+        except RuntimeError as e:
+            # Не все типы индексов (и не все сборки faiss) умеют mmap — тогда обычное чтение
+            print("⚠️ FAISS индекс не удалось отобразить в память, читаем целиком:", str(e))
+    elif FAISS_MMAP:
+        print(f"⚠️ faiss {faiss.__version__} не умеет отображать в память индекс {index_type}, читаем целиком")
+    return faiss.read_index(INDEX_PATH), False
+
+def load_index_meta() -> dict:
+    if not os.path.exists(META_PATH):
+        return {"index_type": "flat"}
+    with open(META_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def apply_search_params(index, meta: dict):
+    """nprobe для IVF и efSearch для HNSW из метаданных индекса (env FAISS_NPROBE / FAISS_EF_SEARCH важнее)."""
+    params = faiss.ParameterSpace()
+    index_type = meta.get("index_type", "flat")
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nprobe = int(os.getenv("FAISS_NPROBE", meta.get("nprobe", 16)))
+        params.set_index_parameter(index, "nprobe", nprobe)
+        print(f"🔧 FAISS {index_type}: nprobe={nprobe}")
+    elif index_type == "hnsw":
+        ef_search = int(os.getenv("FAISS_EF_SEARCH", meta.get("ef_search", 64)))
+        params.set_index_parameter(index, "efSearch", ef_search)
+        print(f"🔧 FAISS hnsw: efSearch={ef_search}")
+
+def compact_delta(delta) -> int:
+    """Оставляет в delta (приватной копии!) не больше DELTA_INDEX_MAX самых новых векторов."""
+    excess = delta.ntotal - DELTA_INDEX_MAX
+    if excess <= 0:
+        return 0
+    ids = np.sort(faiss.vector_to_array(delta.id_map))
+    delta.remove_ids(ids[:excess])
+    print(f"🧹 Дельта-индекс упёрся в DELTA_INDEX_MAX={DELTA_INDEX_MAX}: выброшено {excess} старых векторов, "
+          "пора пересобрать основной индекс (scripts/build_index.py)")
+    return excess
+
+def load_delta_index(dimension: int):
+    if os.path.exists(DELTA_INDEX_PATH):
+        delta = faiss.read_index(DELTA_INDEX_PATH)
+        compact_delta(delta)
+        print(f"✅ Дельта-индекс загружен: {delta.ntotal} векторов")
+        return delta
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+def load_resources():
+    """Однократная загрузка модели и индексов; повторные вызовы ничего не делают."""
+    global _model, _index, _ids, index_meta, delta_index
+    if _readiness["status"] == "ready":
+        return
+    with _resources_lock:
+        if _readiness["status"] == "ready":
+            return
+        _readiness.update(status="loading", error=None)
+        started = time.monotonic()
+        try:
+            _ensure_index_file()
+            # Проверяем наличие ID-файла
+            if not os.path.exists(IDS_PATH):
+                print(f"❌ Не найден файл: {IDS_PATH}. Проверь, что log_ids.npy лежит рядом с logs_faiss.index!")
+                raise FileNotFoundError(f"{IDS_PATH} not found")
+
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(MODEL_NAME)
+
+            # Загрузка FAISS индекса и ID
+            meta = load_index_meta()
+            index, mmapped = read_main_index(meta.get("index_type", "flat"))
+            # Массив только читается (ids[idx]), поэтому read-only отображения достаточно
+            ids = np.load(IDS_PATH, mmap_mode="r" if FAISS_MMAP else None)
+            apply_search_params(index, meta)
+            delta = load_delta_index(index.d)
+        except Exception as e:
+            _readiness.update(status="failed", error=str(e))
+            print("❌ Ошибка загрузки модели/индекса:", str(e))
+            raise
+
+        _model, _index, _ids, index_meta, delta_index = model, index, ids, meta, delta
+        _readiness.update(status="ready", load_seconds=round(time.monotonic() - started, 2), mmap=mmapped)
+        print(f"✅ Модель и FAISS индекс загружены за {_readiness['load_seconds']}с ({index.ntotal} векторов)")
+
+def warm_up_in_background():
+    def _warm_up():
+        try:
+            load_resources()
+        except Exception:
+            pass  # ошибка уже записана в _readiness; следующий вызов попробует снова
+
+    threading.Thread(target=_warm_up, name="securitygpt-warmup", daemon=True).start()
+
+def get_readiness() -> dict:
+    return dict(_readiness)
+
+def get_model():
+    load_resources()
+    return _model
+
+def get_index():
+    load_resources()
+    return _index
+
+# Основной индекс только читается и ищется без блокировок. Дельта — copy-on-write: опубликованный
+# объект delta_index больше не меняется, поиск берёт ссылку на него без лока. Пополнение собирает
+# новую копию в стороне и подменяет ссылку одним присваиванием; лок лишь упорядочивает писателей.
+delta_lock = threading.Lock()
+
+def get_delta_ids() -> set[int]:
+    load_resources()
+    return set(int(i) for i in faiss.vector_to_array(delta_index.id_map))
+
+def add_to_delta_index(log_ids: list[int], vecs: np.ndarray):
+    global delta_index
+    load_resources()
+    with delta_lock:
+        updated = faiss.clone_index(delta_index)
+        updated.add_with_ids(vecs, np.asarray(log_ids, dtype="int64"))
+        compact_delta(updated)
+        delta_index = updated
+
+def _merge_into(target, source):
+    """Докладывает в target векторы из source, которых там ещё нет (оба — IndexIDMap2 над плоским индексом)."""
+    if not source.ntotal:
+        return
+    ids = faiss.vector_to_array(source.id_map)
+    vecs = source.index.reconstruct_n(0, source.ntotal)
+    known = set(int(i) for i in faiss.vector_to_array(target.id_map))
+    fresh = np.array([int(i) not in known for i in ids], dtype=bool)
+    if fresh.any():
+        target.add_with_ids(vecs[fresh], ids[fresh])
+
+def snapshot_delta_index():
+    """Атомарный снимок на диск: пишем во временный файл и подменяем через os.replace.
+
+    Файл общий для всех воркеров uvicorn, а дельта у каждого своя. Поэтому снимок делается под
+    межпроцессной блокировкой: читаем то, что уже на диске, докладываем свои векторы и пишем
+    во временный файл своего pid — иначе воркеры затирают и .tmp, и снимки друг друга.
+    """
+    own = delta_index  # неизменяемый снимок — копировать не нужно
+    if own is None:
+        return 0
+    tmp_path = f"{DELTA_INDEX_PATH}.{os.getpid()}.tmp"
+    with open(DELTA_INDEX_PATH + ".lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            merged = faiss.read_index(DELTA_INDEX_PATH) if os.path.exists(DELTA_INDEX_PATH) else own
+            if merged is not own:
+                _merge_into(merged, own)
+                compact_delta(merged)
+            faiss.write_index(merged, tmp_path)
+            os.replace(tmp_path, DELTA_INDEX_PATH)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return merged.ntotal
+
+def search_neighbours(query_vecs: np.ndarray, top_k: int) -> list[list[int]]:
+    """id ближайших логов по основному и дельта-индексу, отсортированные по расстоянию."""
+    index = get_index()
+    D, I = index.search(query_vecs, top_k)
+    candidates = [
+        [(float(d), int(_ids[idx])) for d, idx in zip(d_row, i_row) if idx >= 0]
+        for d_row, i_row in zip(D, I)
+    ]
+
+    delta = delta_index
+    delta_hits = delta.search(query_vecs, top_k) if delta.ntotal else None
+    if delta_hits is not None:
+        for row, d_row, i_row in zip(candidates, *delta_hits):
+            row.extend((float(d), int(log_id)) for d, log_id in zip(d_row, i_row) if log_id >= 0)
+
+    ranked = []
+    for row in candidates:
+        row.sort(key=lambda hit: hit[0])
+        ranked.append(list(dict.fromkeys(log_id for _, log_id in row))[:top_k])
+    return ranked
+
+# Кэш примеров из базы по id: строки-примеры почти не меняются, а запрашиваются на каждый лог.
+# Записавший результат анализа зовёт evict_examples; TTL страхует от записей из других процессов
+EXAMPLE_CACHE_SIZE = int(os.getenv("EXAMPLE_CACHE_SIZE", "50000"))
+EXAMPLE_CACHE_TTL = float(os.getenv("EXAMPLE_CACHE_TTL", "600"))
+_example_cache = OrderedDict()  # id -> (пример, monotonic-дедлайн)
+_example_cache_lock = threading.Lock()
+
+def _example_from_entry(entry) -> dict:
+    return {
+        "log": entry.log_text,
+        "type": entry.attack_type,
+        "mitre": entry.mitre_id,
+        "recommendation": entry.recommendation,
+    }
+
+def evict_examples(log_ids):
+    """Строки изменились (анализ, статус) — соседи должны увидеть новые attack_type / mitre / рекомендацию."""
+    with _example_cache_lock:
+        for log_id in log_ids:
+            _example_cache.pop(log_id, None)
+
+def fetch_examples(log_ids: list[int], db: Session | None = None) -> dict:
+    """id -> пример. Всё, чего нет в кэше, достаётся одним запросом IN (...)."""
+    found = {}
+    missing = []
+    now = time.monotonic()
+    with _example_cache_lock:
+        for log_id in dict.fromkeys(log_ids):
+            cached = _example_cache.get(log_id)
+            if cached is not None and cached[1] > now:
+                _example_cache.move_to_end(log_id)
+                found[log_id] = cached[0]
+            else:
+                missing.append(log_id)
+
+    if missing:
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            rows = (
+                db.query(
+                    LogAnalysis.id,
+                    LogAnalysis.log_text,
+                    LogAnalysis.attack_type,
+                    LogAnalysis.mitre_id,
+                    LogAnalysis.recommendation,
+                )
+                .filter(LogAnalysis.id.in_(missing))
+                .all()
+            )
+        finally:
+            if own_session:
+                db.close()
+
+        with _example_cache_lock:
+            for row in rows:
+                example = _example_from_entry(row)
+                found[row.id] = example
+                if EXAMPLE_CACHE_SIZE > 0:
+                    _example_cache[row.id] = (example, now + EXAMPLE_CACHE_TTL)
+                    _example_cache.move_to_end(row.id)
+            while len(_example_cache) > EXAMPLE_CACHE_SIZE:
+                _example_cache.popitem(last=False)
+
+    return found
+
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "64"))
+
+def encode_texts(texts: list[str]) -> np.ndarray:
+    """Эмбеддинги пачкой: на CPU батч MiniLM в разы дешевле на лог, чем вызовы по одному предложению."""
+    vecs = get_model().encode(texts, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False)
+    return np.ascontiguousarray(vecs, dtype="float32")
+
+def get_similar_logs_by_vectors(query_vecs: np.ndarray, top_k: int = 3, db: Session | None = None) -> list[list[dict]]:
+    """Похожие логи по уже посчитанным эмбеддингам: один поиск FAISS и один запрос в БД на всю матрицу."""
+    # Порядок выдачи FAISS (по близости) сохраняем для каждого входного лога
+    ranked_ids = search_neighbours(query_vecs, top_k)
+    examples = fetch_examples([log_id for row in ranked_ids for log_id in row], db)
+
+    return [
+        [examples[log_id] for log_id in row if log_id in examples]
+        for row in ranked_ids
+    ]
+
+def get_similar_logs_batch(input_texts: list[str], top_k: int = 3, db: Session | None = None) -> list[list[dict]]:
+    """Похожие логи для нескольких входных логов: один encode, один поиск FAISS, один запрос в БД."""
+    if not input_texts:
+        return []
+    return get_similar_logs_by_vectors(encode_texts(input_texts), top_k, db)
+
+def get_similar_logs_pg(input_text: str, top_k: int = 3, db: Session | None = None):
+    return get_similar_logs_batch([input_text], top_k, db)[0]
 
 def build_prompt(similar_logs, input_log):
     context = "\n\n".join([
@@ -99,18 +377,43 @@ MITRE: ...
 Рекомендации: ...
 """
 
-def analyze_log_with_gpt(input_log: str) -> str:
-    try:
-        similar_logs = get_similar_logs_pg(input_log)
-        if similar_logs:
-            context = "\n\n".join([
-                f"Пример:\nЛог: {e['log']}\nТип: {e['type']}\nMITRE: {e['mitre']}\nРекомендации: {e['recommendation']}"
-                for e in similar_logs
-            ])
-        else:
-            context = "Нет похожих логов. Проанализируй лог без примеров."
+FALLBACK_ANALYSIS = """Тип атаки: Подозрительная активность
+MITRE: T1078
+Вероятность: 55%
+Рекомендации: Проверьте IP и заблокируйте источник при повторении."""
 
-        prompt = f"""
+def request_log_analysis(
+    input_log: str,
+    similar_logs: list[dict] | None = None,
+    query_vec: np.ndarray | None = None
+) -> str:
+    """Запрос к GPT без fallback: ошибки пробрасываются вызывающему (нужно для ретраев в очереди).
+
+    similar_logs и query_vec можно передать заранее (например, посчитанные для всей пачки логов).
+    Сначала проверяется кэш ответов: шаблон лога, затем ближайший эмбеддинг.
+    """
+    cached, cache_vec = gpt_cache.lookup(
+        input_log,
+        lambda: query_vec if query_vec is not None else encode_texts([input_log])[0]
+    )
+    if cached is not None:
+        return cached
+    if cache_vec is not None:
+        query_vec = cache_vec
+
+    if similar_logs is None:
+        if query_vec is None:
+            query_vec = encode_texts([input_log])[0]
+        similar_logs = get_similar_logs_by_vectors(query_vec[None, :])[0]
+    if similar_logs:
+        context = "\n\n".join([
+            f"Пример:\nЛог: {e['log']}\nТип: {e['type']}\nMITRE: {e['mitre']}\nРекомендации: {e['recommendation']}"
+            for e in similar_logs
+        ])
+    else:
+        context = "Нет похожих логов. Проанализируй лог без примеров."
+
+    prompt = f"""
 Ты — SecurityGPT, эксперт по кибербезопасности.
 Используй примеры и проанализируй новый лог.
 
@@ -126,24 +429,28 @@ MITRE: ...
 Рекомендации: ...
 """
 
-        print("📤 Prompt в analyze_log_with_gpt:\n", prompt)
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=400
-        )
-
-        return response.choices[0].message.content.strip()
+    print("📤 Prompt в analyze_log_with_gpt:\n", prompt)
 
+    content = chat_completion(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=400
+    )
+    gpt_cache.store(input_log, query_vec, content)
+    return content
+
+def analyze_log_with_gpt(
+    input_log: str,
+    similar_logs: list[dict] | None = None,
+    query_vec: np.ndarray | None = None
+) -> str:
+    try:
+        return request_log_analysis(input_log, similar_logs, query_vec)
     except Exception as e:
         print("⚠️ Ошибка при запросе к GPT:", str(e))
         # Возвращаем безопасный fallback-ответ
-        return """Тип атаки: Подозрительная активность
-MITRE: T1078
-Вероятность: 55%
-Рекомендации: Проверьте IP и заблокируйте источник при повторении."""
+        return FALLBACK_ANALYSIS
 
 def parse_gpt_response(response_text: str) -> dict:
     # Значения по умолчанию
@@ -200,7 +507,7 @@ def forecast_attack_with_gpt(logs_text: str) -> dict | None:
     print("📤 Prompt в forecast_attack_with_gpt:\n", prompt)
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "Ты — эксперт по кибербезопасности."},
@@ -209,8 +516,6 @@ def forecast_attack_with_gpt(logs_text: str) -> dict | None:
             temperature=0.2,
             max_tokens=500
         )
-
-        content = response.choices[0].message.content.strip()
         print("📥 Ответ от GPT:\n", content)
 
         # Удаляем Markdown-обертку, если есть
@@ -230,23 +535,34 @@ def forecast_attack_with_gpt(logs_text: str) -> dict | None:
         print("❌ Ошибка при запросе к GPT:", str(e))
         return None
 
-def generate_report_summary(logs: list[LogAnalysis]) -> str:
+def generate_report_summary(logs: list[LogAnalysis], period_stats: dict | None = None) -> str:
+    """logs — до 20 примеров для GPT; period_stats — счётчики за весь период (rollup_summary).
+    Без period_stats статистика считается по самим примерам."""
     if not logs:
         return "Нет логов для анализа за выбранный период."
 
     log_texts = [log.log_text for log in logs[:20]]
 
     # Сбор аналитики
-    attack_counter = Counter([l.attack_type for l in logs if l.attack_type and l.attack_type != "Нет атаки"])
-    mitre_counter = Counter([l.mitre_id for l in logs if l.mitre_id])
-    country_counter = Counter([l.country for l in logs if l.country])
+    if period_stats is not None:
+        total = period_stats["total"]
+        high_risk_count = period_stats["high_risk"]
+        attack_counter = Counter({k: v for k, v in period_stats["attack_types"].items() if k and k != "Нет атаки"})
+        mitre_counter = Counter(period_stats["mitre"])
+        country_counter = Counter(period_stats["countries"])
+    else:
+        total = len(logs)
+        high_risk_count = sum(1 for l in logs if (l.probability or 0) >= 70)
+        attack_counter = Counter([l.attack_type for l in logs if l.attack_type and l.attack_type != "Нет атаки"])
+        mitre_counter = Counter([l.mitre_id for l in logs if l.mitre_id])
+        country_counter = Counter([l.country for l in logs if l.country])
+    # Города и IP в роллапах не хранятся — по ним только примеры
     city_counter = Counter([l.city for l in logs if l.city])
     ip_counter = Counter([l.ip for l in logs if l.ip])
-    high_risk_count = sum(1 for l in logs if l.probability >= 70)
 
     # Форматируем статистику
     stats = f"""
-📊 Обнаружено логов: {len(logs)}
+📊 Обнаружено логов: {total}
 🚨 Атак с высоким риском: {high_risk_count}
 
 🛡 ТОП атак:
@@ -258,10 +574,10 @@ def generate_report_summary(logs: list[LogAnalysis]) -> str:
 🌍 ТОП стран:
 {chr(10).join(f"- {k}: {v}" for k, v in country_counter.most_common(3))}
 
-🏙 ТОП городов:
+🏙 ТОП городов (по примерам):
 {chr(10).join(f"- {k}: {v}" for k, v in city_counter.most_common(3))}
 
-🔁 Повторяющиеся IP:
+🔁 Повторяющиеся IP (по примерам):
 {chr(10).join(f"- {k}: {v} раз" for k, v in ip_counter.most_common(3))}
 """
 
@@ -282,15 +598,13 @@ def generate_report_summary(logs: list[LogAnalysis]) -> str:
 Ответ представь как пояснительный доклад для руководства (можно с подзаголовками и списками).
 """
 
-    response = client.chat.completions.create(
+    return chat_completion(
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
         max_tokens=2000
     )
 
-    return response.choices[0].message.content.strip()
-
 def explain_log_with_gpt(log_text: str) -> str:
     prompt = f"""
 Ты — эксперт по кибербезопасности. Проанализируй следующий лог:
@@ -306,15 +620,13 @@ def explain_log_with_gpt(log_text: str) -> str:
 3. Рекомендации
 """
 
-    response = client.chat.completions.create(
+    return chat_completion(
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
         max_tokens=500
     )
 
-    return response.choices[0].message.content.strip()
-
 def notify_telegram(message):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         print("⚠️ Telegram: переменные окружения не заданы.")
@@ -0,0 +1,309 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import case, extract, func
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal
+from backend.models import LogAnalysis
+
+# 📊 Агрегаты дашборда и аналитики по компании живут в памяти и обновляются по событиям
+# (вставка лога, завершение анализа, блокировка угрозы). С базой сверяемся раз в
+# AGGREGATE_RECONCILE_SECONDS — это же исправляет редкий дрейф, если событие пришло во время пересчёта.
+AGGREGATE_RECONCILE_SECONDS = float(os.getenv("AGGREGATE_RECONCILE_SECONDS", "300"))
+# Компании, к агрегатам которых давно не обращались, выгружаются из памяти
+AGGREGATE_IDLE_SECONDS = float(os.getenv("AGGREGATE_IDLE_SECONDS", "3600"))
+
+NO_ATTACK = "Нет атаки"
+# Заглушка attack_type, пока лог ждёт GPT-анализа (utils/analysis_queue)
+PENDING_ATTACK_TYPE = "Анализируется"
+HIGH_RISK_THRESHOLD = 70
+MEDIUM_RISK_THRESHOLD = 30
+
+_lock = threading.Lock()
+_states = {}  # company_id -> состояние из _empty_state()
+_thread = None
+_stats = {"loads": 0, "reconciles": 0, "events": 0, "evicted": 0, "deltas_out": 0, "deltas_in": 0}
+# Изменения счётчиков для воркеров в других процессах (см. utils/ws_backplane): копятся здесь
+# независимо от того, загружена ли компания у нас, и уходят вместе с NOTIFY
+_export_deltas = False
+_outgoing = {}  # company_id -> _delta_state()
+
+_COUNTERS = ("attack_types", "mitre", "risk_levels", "severity_windows", "severity_syslog", "status")
+_SCALARS = ("total", "attacks_detected", "high_risk")
+
+
+def _delta_state() -> dict:
+    return {
+        "total": 0,
+        "attacks_detected": 0,
+        "high_risk": 0,
+        "attack_types": Counter(),
+        "mitre": Counter(),
+        "risk_levels": Counter(),
+        "severity_windows": Counter(),
+        "severity_syslog": Counter(),
+        "hourly": [0] * 24,
+        "status": Counter(),
+    }
+
+
+def _empty_state() -> dict:
+    return {**_delta_state(), "loaded_at": time.monotonic(), "accessed_at": time.monotonic()}
+
+
+def _targets(company_id: str) -> list:
+    # Вызывается под _lock: своё состояние (если компания загружена) и дельта для других процессов
+    targets = []
+    state = _states.get(company_id)
+    if state is not None:
+        targets.append(state)
+    if _export_deltas:
+        targets.append(_outgoing.setdefault(company_id, _delta_state()))
+    return targets
+
+
+def risk_bucket(probability) -> str:
+    p = probability or 0
+    if p >= HIGH_RISK_THRESHOLD:
+        return "high"
+    if p >= MEDIUM_RISK_THRESHOLD:
+        return "medium"
+    return "low"
+
+
+def is_attack(attack_type) -> bool:
+    # Как на прежнем дашборде: атака — любой результат анализа, кроме "Нет атаки"; неразобранные логи не считаются
+    return attack_type is not None and attack_type not in (NO_ATTACK, PENDING_ATTACK_TYPE)
+
+
+def _get(row, key):
+    return row.get(key) if isinstance(row, dict) else getattr(row, key, None)
+
+
+def _apply_analysis_fields(state: dict, attack_type, mitre_id, risk: str, sign: int, count: int = 1):
+    n = sign * count
+    state["attack_types"][attack_type] += n
+    if mitre_id:
+        state["mitre"][mitre_id] += n
+    state["risk_levels"][risk] += n
+    if is_attack(attack_type):
+        state["attacks_detected"] += n
+    if risk == "high":
+        state["high_risk"] += n
+
+
+def _apply_row(state: dict, attack_type, mitre_id, risk, severity_windows, severity_syslog, hour, status, count=1):
+    state["total"] += count
+    _apply_analysis_fields(state, attack_type, mitre_id, risk, 1, count)
+    if severity_windows:
+        state["severity_windows"][severity_windows] += count
+    if severity_syslog:
+        state["severity_syslog"][severity_syslog] += count
+    if hour is not None:
+        state["hourly"][int(hour)] += count
+    state["status"][status] += count
+
+
+def _load_state(db: Session, company_id: str) -> dict:
+    # Один проход по таблице компании: группируем сразу по всем измерениям и сворачиваем в Python
+    risk = case(
+        (LogAnalysis.probability >= HIGH_RISK_THRESHOLD, "high"),
+        (LogAnalysis.probability >= MEDIUM_RISK_THRESHOLD, "medium"),
+        else_="low"
+    )
+    hour = extract("hour", LogAnalysis.timestamp)
+    rows = (
+        db.query(
+            LogAnalysis.attack_type,
+            LogAnalysis.mitre_id,
+            risk,
+            LogAnalysis.severity_windows,
+            LogAnalysis.severity_syslog,
+            hour,
+            LogAnalysis.status,
+            func.count()
+        )
+        .filter(LogAnalysis.company_id == company_id)
+        .group_by(
+            LogAnalysis.attack_type,
+            LogAnalysis.mitre_id,
+            risk,
+            LogAnalysis.severity_windows,
+            LogAnalysis.severity_syslog,
+            hour,
+            LogAnalysis.status
+        )
+        .all()
+    )
+    state = _empty_state()
+    for attack_type, mitre_id, bucket, sev_w, sev_s, hr, status, count in rows:
+        _apply_row(state, attack_type, mitre_id, bucket, sev_w, sev_s, hr, status, count)
+    return state
+
+
+def _positive(counter: Counter) -> dict:
+    return {key: value for key, value in counter.items() if value > 0}
+
+
+def get_aggregates(db: Session, company_id: str) -> dict:
+    """Снимок агрегатов компании; при первом обращении считается одним запросом к базе."""
+    with _lock:
+        state = _states.get(company_id)
+    if state is None:
+        loaded = _load_state(db, company_id)
+        with _lock:
+            state = _states.setdefault(company_id, loaded)
+            _stats["loads"] += 1
+
+    with _lock:
+        state["accessed_at"] = time.monotonic()
+        return {
+            "total": state["total"],
+            "attacks_detected": state["attacks_detected"],
+            "high_risk": state["high_risk"],
+            "attack_types": _positive(state["attack_types"]),
+            "mitre": _positive(state["mitre"]),
+            "risk_levels": {level: max(state["risk_levels"][level], 0) for level in ("low", "medium", "high")},
+            "severity": {
+                "windows": _positive(state["severity_windows"]),
+                "syslog": _positive(state["severity_syslog"]),
+            },
+            "hourly": list(state["hourly"]),
+            "status": _positive(state["status"]),
+        }
+
+
+def record_logs(rows):
+    """Новые логи (ORM-объекты или словари из build_log_values; у сгруппированных словарей есть count).
+    Не загруженные компании пропускаются — их агрегаты всё равно посчитаются из базы при первом обращении."""
+    with _lock:
+        for row in rows:
+            targets = _targets(_get(row, "company_id"))
+            if not targets:
+                continue
+            timestamp = _get(row, "timestamp")
+            for state in targets:
+                _apply_row(
+                    state,
+                    _get(row, "attack_type"),
+                    _get(row, "mitre_id"),
+                    risk_bucket(_get(row, "probability")),
+                    _get(row, "severity_windows"),
+                    _get(row, "severity_syslog"),
+                    timestamp.hour if timestamp else None,
+                    _get(row, "status") or "Активна",
+                    _get(row, "count") or 1
+                )
+            _stats["events"] += 1
+
+
+def record_analysis(company_id: str, old: dict, new: dict):
+    """Лог сменил attack_type / mitre_id / probability (например, pending → результат GPT)."""
+    with _lock:
+        targets = _targets(company_id)
+        for state in targets:
+            _apply_analysis_fields(state, old.get("attack_type"), old.get("mitre_id"), risk_bucket(old.get("probability")), -1)
+            _apply_analysis_fields(state, new.get("attack_type"), new.get("mitre_id"), risk_bucket(new.get("probability")), 1)
+        if targets:
+            _stats["events"] += 1
+
+
+def record_status_change(company_id: str, old_status: str, new_status: str):
+    with _lock:
+        targets = _targets(company_id)
+        for state in targets:
+            state["status"][old_status] -= 1
+            state["status"][new_status] += 1
+        if targets:
+            _stats["events"] += 1
+
+
+def drop_company(company_id: str):
+    with _lock:
+        _states.pop(company_id, None)
+
+
+def start_delta_export():
+    """Включается, когда у процесса есть соседи (WS_BACKPLANE=postgres): иначе дельты некому забирать."""
+    global _export_deltas
+    _export_deltas = True
+
+
+def take_delta(company_id: str) -> dict | None:
+    """Накопленные изменения счётчиков компании в виде JSON-совместимого словаря; None — изменений нет.
+    Счётчики — списками пар: ключ attack_type бывает None, а в JSON-объекте он стал бы строкой "null"."""
+    with _lock:
+        delta = _outgoing.pop(company_id, None)
+    if delta is None:
+        return None
+    payload = {key: delta[key] for key in _SCALARS if delta[key]}
+    payload.update({key: [[k, v] for k, v in delta[key].items() if v] for key in _COUNTERS if any(delta[key].values())})
+    if any(delta["hourly"]):
+        payload["hourly"] = delta["hourly"]
+    _stats["deltas_out"] += 1
+    return payload
+
+
+def apply_delta(company_id: str, payload: dict | None):
+    """Изменения счётчиков из другого процесса. payload=None — отправитель не смог их передать
+    (слишком большое сообщение, сбой NOTIFY): состояние сбрасывается и перечитается из базы."""
+    if payload is None:
+        drop_company(company_id)
+        return
+    with _lock:
+        state = _states.get(company_id)
+        if state is None:
+            return
+        for key in _SCALARS:
+            state[key] += payload.get(key, 0)
+        for key in _COUNTERS:
+            for k, v in payload.get(key, ()):
+                state[key][k] += v
+        for hour, count in enumerate(payload.get("hourly") or ()):
+            state["hourly"][hour] += count
+        _stats["deltas_in"] += 1
+
+
+def reconcile_company(company_id: str):
+    with SessionLocal() as db:
+        fresh = _load_state(db, company_id)
+    with _lock:
+        current = _states.get(company_id)
+        if current is None:
+            return
+        fresh["accessed_at"] = current["accessed_at"]
+        _states[company_id] = fresh
+        _stats["reconciles"] += 1
+
+
+def _run():
+    while True:
+        time.sleep(AGGREGATE_RECONCILE_SECONDS)
+        now = time.monotonic()
+        with _lock:
+            idle = [cid for cid, state in _states.items() if now - state["accessed_at"] > AGGREGATE_IDLE_SECONDS]
+            for company_id in idle:
+                del _states[company_id]
+            _stats["evicted"] += len(idle)
+            company_ids = list(_states)
+        for company_id in company_ids:
+            try:
+                reconcile_company(company_id)
+            except Exception as e:
+                print(f"❌ Ошибка сверки агрегатов company_id={company_id}:", str(e))
+
+
+def start_aggregate_reconciler():
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=_run, name="aggregate-reconciler", daemon=True)
+    _thread.start()
+
+
+def get_aggregate_stats() -> dict:
+    with _lock:
+        return {**_stats, "companies": len(_states)}
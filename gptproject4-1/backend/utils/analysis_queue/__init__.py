@@ -0,0 +1,251 @@
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from backend.database import SessionLocal
+from backend.models import LogAnalysis
+from backend.securitygpt import (
+    request_log_analysis,
+    parse_gpt_response,
+    encode_texts,
+    get_similar_logs_by_vectors,
+    FALLBACK_ANALYSIS,
+    evict_examples
+)
+from backend.utils.log_utils import analysis_values, send_threat_alert
+from backend.utils.index_updater import schedule_index_update
+from backend.utils.ws_manager import schedule_company_update
+from backend.utils.aggregate_utils import record_analysis
+from backend.utils.rollup_utils import record_rollup_change
+
+# ⚙️ Настройки очереди анализа
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "1000"))
+ENQUEUE_TIMEOUT = float(os.getenv("ANALYSIS_ENQUEUE_TIMEOUT", "0.5"))
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "25"))
+# processing-лог без результата дольше этого срока считается брошенным (процесс упал) и снова уходит в pending
+ANALYSIS_STALE_SECONDS = float(os.getenv("ANALYSIS_STALE_SECONDS", "900"))
+
+# Очередь ограничена: при переполнении put() отдаёт queue.Full — это и есть backpressure.
+# Элемент очереди — список id логов (одиночный лог = список из одного id)
+analysis_queue = queue.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+
+_workers = []
+_stats_lock = threading.Lock()
+_stats = {
+    "enqueued": 0,
+    "processed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "skipped_claimed": 0,
+    "lost_claims": 0,
+    "reclaimed": 0,
+    "in_flight": 0,
+    "max_depth": 0,
+}
+
+
+def _inc(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+def get_queue_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["depth"] = analysis_queue.qsize()
+    stats["capacity"] = ANALYSIS_QUEUE_SIZE
+    stats["workers"] = sum(1 for t in _workers if t.is_alive())
+    return stats
+
+
+def has_capacity() -> bool:
+    return not analysis_queue.full()
+
+
+def enqueue_analysis(log_ids: list[int], block: bool = True):
+    """Ставит пачку логов в очередь анализа. Если очередь полна — пробрасывает queue.Full."""
+    try:
+        analysis_queue.put(list(log_ids), block=block, timeout=ENQUEUE_TIMEOUT if block else None)
+    except queue.Full:
+        _inc("rejected", len(log_ids))
+        raise
+    with _stats_lock:
+        _stats["enqueued"] += len(log_ids)
+        _stats["max_depth"] = max(_stats["max_depth"], analysis_queue.qsize())
+
+
+def _analyze(log_text: str, similar_logs: list[dict] | None = None, query_vec=None) -> tuple[str, bool]:
+    # Ретраи с backoff и общим дедлайном уже внутри llm_gateway — второй слой повторов здесь
+    # только умножал бы число запросов к GPT и задерживал воркер
+    try:
+        return request_log_analysis(log_text, similar_logs, query_vec), True
+    except Exception as e:
+        print("⚠️ Анализ не удался:", str(e))
+        return FALLBACK_ANALYSIS, False
+
+
+def claim_logs(log_ids: list[int]) -> tuple[list, datetime]:
+    """pending → processing одним условным UPDATE: лог достаётся ровно одному воркеру во всех процессах,
+    даже если его id стоит в очередях нескольких процессов (requeue_pending_logs при старте каждого).
+    Время захвата — метка владельца: по ней запись результата отличает свой захват от чужого."""
+    claimed_at = datetime.utcnow()
+    with SessionLocal() as db:
+        rows = db.execute(
+            update(LogAnalysis)
+            .where(LogAnalysis.id.in_(log_ids), LogAnalysis.analysis_status == "pending")
+            .values(analysis_status="processing", analysis_claimed_at=claimed_at)
+            .returning(
+                LogAnalysis.id,
+                LogAnalysis.log_text,
+                LogAnalysis.company_id,
+                LogAnalysis.attack_type,
+                LogAnalysis.mitre_id,
+                LogAnalysis.probability,
+                LogAnalysis.timestamp,
+                LogAnalysis.severity_windows,
+                LogAnalysis.severity_syslog,
+                LogAnalysis.country
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+    skipped = len(set(log_ids)) - len(rows)
+    if skipped:
+        _inc("skipped_claimed", skipped)
+    return sorted(rows, key=lambda row: row.id), claimed_at
+
+
+def process_queued_logs(log_ids: list[int]):
+    # Соединение из пула не держим на время запросов к GPT: забираем логи, закрываем, потом пишем одним UPDATE
+    entries, claimed_at = claim_logs(log_ids)
+    if not entries:
+        return
+
+    # Эмбеддинги и поиск FAISS — один раз на всю пачку; те же векторы идут в кэш ответов GPT
+    try:
+        vecs = encode_texts([entry.log_text for entry in entries])
+        similar = get_similar_logs_by_vectors(vecs)
+    except Exception as e:
+        print("⚠️ Пакетный поиск похожих логов не удался, ищем по одному:", str(e))
+        vecs = [None] * len(entries)
+        similar = [None] * len(entries)
+
+    results = []
+    for entry, similar_logs, vec in zip(entries, similar, vecs):
+        gpt_response, ok = _analyze(entry.log_text, similar_logs, vec)
+        parsed = parse_gpt_response(gpt_response)
+        values = {"id": entry.id, **analysis_values(parsed, status="done" if ok else "failed")}
+        results.append((entry, values, parsed if ok else None))
+
+    with SessionLocal() as db:
+        # Пишем только логи, которые всё ещё наши: строку могли вернуть в pending как зависшую
+        # (и отдать другому воркеру) или удалить вместе с компанией. Роллапы и агрегаты — только по ним
+        mine = (LogAnalysis.analysis_status == "processing", LogAnalysis.analysis_claimed_at == claimed_at)
+        owned = {
+            row.id for row in
+            db.query(LogAnalysis.id)
+            .filter(LogAnalysis.id.in_([entry.id for entry in entries]), *mine)
+            .with_for_update()
+        }
+        written = [result for result in results if result[0].id in owned]
+        if written:
+            db.execute(
+                update(LogAnalysis).where(*mine).execution_options(synchronize_session=None),
+                [{**values, "analysis_claimed_at": None} for _, values, _ in written]
+            )
+            before = [entry._asdict() for entry, _, _ in written]
+            record_rollup_change(db, before, [{**old, **values} for old, (_, values, _) in zip(before, written)])
+        db.commit()
+    if len(written) < len(entries):
+        _inc("lost_claims", len(entries) - len(written))
+
+    alerts = [parsed for _, _, parsed in written if parsed is not None]
+    evict_examples([entry.id for entry, _, _ in written])
+    schedule_index_update([entry.id for entry, values, _ in written if values["analysis_status"] == "done"])
+    for entry, values, _ in written:
+        record_analysis(entry.company_id, entry._asdict(), values)
+
+    with _stats_lock:
+        _stats["processed"] += len(alerts)
+        _stats["failed"] += len(written) - len(alerts)
+
+    for parsed in alerts:
+        send_threat_alert(parsed)
+    for company_id in {entry.company_id for entry, _, _ in written}:
+        schedule_company_update(company_id)
+
+
+def _worker():
+    while True:
+        log_ids = analysis_queue.get()
+        if log_ids is None:
+            analysis_queue.task_done()
+            return
+        _inc("in_flight", len(log_ids))
+        try:
+            process_queued_logs(log_ids)
+        except Exception as e:
+            print(f"❌ Ошибка воркера анализа (log_ids={log_ids}):", str(e))
+            _inc("failed", len(log_ids))
+        finally:
+            _inc("in_flight", -len(log_ids))
+            analysis_queue.task_done()
+
+
+def requeue_pending_logs():
+    """После рестарта возвращает в очередь логи, которые остались в статусе pending.
+    Зовётся в каждом процессе: одни и те же id попадут в несколько очередей, но забрать лог
+    сможет только один воркер (claim_logs), остальные его пропустят."""
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=ANALYSIS_STALE_SECONDS)
+        reclaimed = db.execute(
+            update(LogAnalysis)
+            .where(
+                LogAnalysis.analysis_status == "processing",
+                (LogAnalysis.analysis_claimed_at < stale_before) | LogAnalysis.analysis_claimed_at.is_(None)
+            )
+            .values(analysis_status="pending", analysis_claimed_at=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if reclaimed:
+            _inc("reclaimed", reclaimed)
+            print(f"♻️ Возвращено в очередь зависших логов: {reclaimed}")
+        pending_ids = [
+            row.id for row in
+            db.query(LogAnalysis.id).filter_by(analysis_status="pending").order_by(LogAnalysis.id).all()
+        ]
+    finally:
+        db.close()
+
+    for i in range(0, len(pending_ids), ANALYSIS_BATCH_SIZE):
+        try:
+            enqueue_analysis(pending_ids[i:i + ANALYSIS_BATCH_SIZE], block=False)
+        except queue.Full:
+            print("⚠️ Очередь анализа заполнена, часть pending-логов будет подхвачена после следующего рестарта")
+            break
+
+
+def start_analysis_workers():
+    if _workers:
+        return
+    for i in range(ANALYSIS_WORKERS):
+        t = threading.Thread(target=_worker, name=f"analysis-worker-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+    print(f"✅ Запущено воркеров анализа: {ANALYSIS_WORKERS}, размер очереди: {ANALYSIS_QUEUE_SIZE}")
+    requeue_pending_logs()
+
+
+def stop_analysis_workers():
+    for _ in _workers:
+        try:
+            analysis_queue.put_nowait(None)
+        except queue.Full:
+            break  # потоки-демоны завершатся вместе с процессом
+    _workers.clear()
@@ -1,23 +1,18 @@
+from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from backend.models import LogAnalysis
+from backend.utils.aggregate_utils import get_aggregates
+from backend.utils.rollup_utils import rollup_summary
 
-def get_dashboard_stats(db: Session, company_id: str):
-    query = db.query(LogAnalysis).filter_by(company_id=company_id)
+def get_period_aggregates(db: Session, company_id: str, from_date: datetime | None = None, to_date: datetime | None = None):
+    # За всё время — агрегаты в памяти (utils/aggregate_utils), за период — роллапы (utils/rollup_utils)
+    if from_date is None and to_date is None:
+        return get_aggregates(db, company_id)
+    return rollup_summary(db, company_id, from_date, to_date)
 
-    attack_counts = (
-        query.with_entities(LogAnalysis.attack_type, func.count().label("count"))
-        .group_by(LogAnalysis.attack_type)
-        .order_by(func.count().desc())
-        .all()
-    )
+def get_dashboard_stats(db: Session, company_id: str, from_date: datetime | None = None, to_date: datetime | None = None):
+    aggregates = get_period_aggregates(db, company_id, from_date, to_date)
 
-    mitre_counts = (
-        query.with_entities(LogAnalysis.mitre_id, func.count().label("count"))
-        .filter(LogAnalysis.mitre_id != None)
-        .group_by(LogAnalysis.mitre_id)
-        .all()
-    )
+    attack_counts = sorted(aggregates["attack_types"].items(), key=lambda item: item[1], reverse=True)
 
     # Формируем attack_types и top_3_attacks как массивы объектов
     attack_types = [
@@ -27,15 +22,15 @@ def get_dashboard_stats(db: Session, company_id: str):
 
     # То же для mitre_ids
     top_mitre_ids = [
-        {"mitre_id": a, "count": b} for a, b in mitre_counts
+        {"mitre_id": a, "count": b} for a, b in aggregates["mitre"].items()
     ]
 
     return {
-        "total_logs": query.count(),
-        "total_analyzed": query.count(),
-        "attacks_detected": query.filter(LogAnalysis.attack_type != "Нет атаки").count(),
-        "high_risk_attacks": query.filter(LogAnalysis.probability >= 70).count(),
+        "total_logs": aggregates["total"],
+        "total_analyzed": aggregates["total"],
+        "attacks_detected": aggregates["attacks_detected"],
+        "high_risk_attacks": aggregates["high_risk"],
         "attack_types": attack_types,
         "top_mitre_ids": top_mitre_ids,
         "top_3_attacks": top_3_attacks,
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,159 @@
+import csv
+import io
+import os
+import tempfile
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from sqlalchemy import select
+
+from backend.database import SessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow нужен только для /export/analyzed/parquet и /arrow
+    pa = None
+    pq = None
+
+# 📤 Потоковый экспорт: строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE
+# и сразу кодируются в файл — память воркера не растёт с количеством логов
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# Строк в одной row group Parquet / record batch Arrow: крупнее пачки курсора, иначе страдает сжатие
+ARROW_BATCH_ROWS = int(os.getenv("EXPORT_ARROW_BATCH_ROWS", "100000"))
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def iter_batches(columns: list[tuple], criteria: list, order_by=None, batch_size: int | None = None):
+    """Пачки кортежей значений. Своя сессия: зависимость get_db закрывается раньше, чем уходит тело ответа."""
+    stmt = select(*(column for _, column in columns)).where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    with SessionLocal() as db:
+        # yield_per включает stream_results — на PostgreSQL это серверный (именованный) курсор
+        result = db.execute(stmt.execution_options(yield_per=batch_size or EXPORT_BATCH_SIZE))
+        for batch in result.partitions():
+            yield batch
+
+
+def _csv_chunks(columns: list[tuple], criteria: list, order_by=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл кириллицу как UTF-8
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _ in columns])
+    for batch in iter_batches(columns, criteria, order_by):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _xlsx_chunks(columns: list[tuple], criteria: list, sheet_name: str, order_by=None):
+    # write_only: строки сразу уходят во временный XML на диске, в памяти держится только текущая
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([header for header, _ in columns])
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        for batch in iter_batches(columns, criteria, order_by):
+            for row in batch:
+                sheet.append(list(row))
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while chunk := f.read(FILE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def csv_response(filename: str, columns: list[tuple], criteria: list, order_by=None) -> StreamingResponse:
+    return StreamingResponse(
+        _csv_chunks(columns, criteria, order_by),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def xlsx_response(filename: str, columns: list[tuple], criteria: list, sheet_name: str, order_by=None) -> StreamingResponse:
+    return StreamingResponse(
+        _xlsx_chunks(columns, criteria, sheet_name, order_by),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл только на запись: писатель pyarrow складывает байты сюда, генератор их забирает."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _record_batches(schema, columns: list[tuple], criteria: list, order_by=None):
+    for rows in iter_batches(columns, criteria, order_by, batch_size=ARROW_BATCH_ROWS):
+        arrays = []
+        for field, values in zip(schema, zip(*rows)):
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _parquet_chunks(schema, columns: list[tuple], criteria: list, order_by=None):
+    sink = _ChunkSink()
+    # Каждая пачка курсора — отдельная row group; footer пишется в close()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+        for batch in _record_batches(schema, columns, criteria, order_by):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _arrow_stream_chunks(schema, columns: list[tuple], criteria: list, order_by=None):
+    sink = _ChunkSink()
+    # Формат stream (не file) допускает замену словаря между пачками
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for batch in _record_batches(schema, columns, criteria, order_by):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parquet_response(filename: str, schema, columns: list[tuple], criteria: list, order_by=None) -> StreamingResponse:
+    return StreamingResponse(
+        _parquet_chunks(schema, columns, criteria, order_by),
+        media_type=PARQUET_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def arrow_stream_response(filename: str, schema, columns: list[tuple], criteria: list, order_by=None) -> StreamingResponse:
+    return StreamingResponse(
+        _arrow_stream_chunks(schema, columns, criteria, order_by),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from functools import lru_cache
+
+import geoip2.database
+import maxminddb
+
+# 🌍 Общий на процесс GeoIP: базы открываются один раз (mmap), результаты кэшируются по IP
+CITY_DB_PATH = os.getenv("GEOIP_CITY_DB", "backend/data/GeoLite2-City.mmdb")
+ASN_DB_PATH = os.getenv("GEOIP_ASN_DB", "backend/data/GeoLite2-ASN.mmdb")
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "100000"))
+GEOIP_RELOAD_INTERVAL = float(os.getenv("GEOIP_RELOAD_INTERVAL", "60"))
+
+_lock = threading.Lock()
+_readers = {"city": None, "asn": None}
+_mtimes = {"city": None, "asn": None}
+_paths = {"city": CITY_DB_PATH, "asn": ASN_DB_PATH}
+_last_check = 0.0
+_reloads = 0
+
+
+def _open_reader(path):
+    try:
+        return geoip2.database.Reader(path, mode=maxminddb.MODE_MMAP), os.path.getmtime(path)
+    except Exception as e:
+        print(f"GeoIP DB open error ({path}):", e)
+        return None, None
+
+
+def init_geoip():
+    global _last_check
+    with _lock:
+        for kind, path in _paths.items():
+            _readers[kind], _mtimes[kind] = _open_reader(path)
+        _last_check = time.monotonic()
+    _lookup.cache_clear()
+
+
+def _maybe_reload():
+    """Горячая перезагрузка: раз в GEOIP_RELOAD_INTERVAL секунд сверяем mtime файлов .mmdb."""
+    global _last_check, _reloads
+    now = time.monotonic()
+    if now - _last_check < GEOIP_RELOAD_INTERVAL:
+        return
+    with _lock:
+        if now - _last_check < GEOIP_RELOAD_INTERVAL:
+            return
+        _last_check = now
+        changed = False
+        for kind, path in _paths.items():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtime != _mtimes[kind]:
+                reader, mtime = _open_reader(path)
+                if reader:
+                    # Старый reader не закрываем явно: его может читать другой поток, GC закроет сам
+                    _readers[kind], _mtimes[kind] = reader, mtime
+                    changed = True
+        if changed:
+            _reloads += 1
+            print("🔄 GeoIP базы перезагружены")
+    if changed:
+        _lookup.cache_clear()
+
+
+@lru_cache(maxsize=GEOIP_CACHE_SIZE)
+def _lookup(ip: str) -> dict:
+    result = {"country": None, "city": None, "lat": None, "lon": None, "asn": None, "organization": None}
+
+    city_reader = _readers["city"]
+    if city_reader:
+        try:
+            city_info = city_reader.city(ip)
+            result["country"] = city_info.country.name
+            result["city"] = city_info.city.name
+            result["lat"] = city_info.location.latitude
+            result["lon"] = city_info.location.longitude
+        except Exception:
+            pass
+
+    asn_reader = _readers["asn"]
+    if asn_reader:
+        try:
+            asn_info = asn_reader.asn(ip)
+            result["asn"] = asn_info.autonomous_system_number
+            result["organization"] = asn_info.autonomous_system_organization
+        except Exception:
+            pass
+
+    return result
+
+
+def lookup_ip(ip: str) -> dict:
+    """country/city/lat/lon/asn/organization по IP; поля, которые не нашлись, равны None."""
+    if _readers["city"] is None and _readers["asn"] is None and _last_check == 0.0:
+        init_geoip()
+    _maybe_reload()
+    return dict(_lookup(ip))
+
+
+def get_geoip_stats() -> dict:
+    info = _lookup.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "reloads": _reloads,
+        "city_db_loaded": _readers["city"] is not None,
+        "asn_db_loaded": _readers["asn"] is not None,
+    }
@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 🧠 Кэш ответов GPT для analyze_log_with_gpt.
+# 1-й уровень — точное совпадение шаблона лога (IP, числа, время замаскированы).
+# 2-й уровень — ближайший сосед по эмбеддингу, если расстояние не больше порога.
+GPT_CACHE_ENABLED = os.getenv("GPT_CACHE_ENABLED", "1") == "1"
+GPT_CACHE_SIZE = int(os.getenv("GPT_CACHE_SIZE", "10000"))
+GPT_CACHE_TTL = float(os.getenv("GPT_CACHE_TTL", "3600"))
+# Квадрат L2, как у IndexFlatL2; для нормированных эмбеддингов MiniLM 0.1 ≈ косинус 0.95
+GPT_CACHE_MAX_DISTANCE = float(os.getenv("GPT_CACHE_MAX_DISTANCE", "0.1"))
+
+_MASKS = [
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?\b"), "<TS>"),
+    (re.compile(r"\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}\b", re.IGNORECASE), "<TS>"),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}\b"), "<TIME>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<UUID>"),
+    (re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b(?:[0-9a-f]{1,4}:){2,7}[0-9a-f]{1,4}\b", re.IGNORECASE), "<IP>"),
+    (re.compile(r"\b0x[0-9a-f]+\b|\b[0-9a-f]{12,}\b", re.IGNORECASE), "<HEX>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<NUM>"),
+    (re.compile(r"\s+"), " "),
+]
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # шаблон -> {"response", "slot", "expires_at"}
+# Эмбеддинги 2-го уровня лежат в заранее выделенной матрице: запись занимает слот, вытеснение его освобождает
+_vectors = None
+_valid = np.zeros(GPT_CACHE_SIZE, dtype=bool)
+_slot_keys = [None] * GPT_CACHE_SIZE
+_free_slots = list(range(GPT_CACHE_SIZE - 1, -1, -1))
+_stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+
+def normalize_log(log_text: str) -> str:
+    template = log_text.strip()
+    for pattern, mask in _MASKS:
+        template = pattern.sub(mask, template)
+    return template.strip()
+
+
+def _drop(template: str):
+    entry = _entries.pop(template, None)
+    if entry is not None:
+        _valid[entry["slot"]] = False
+        _slot_keys[entry["slot"]] = None
+        _free_slots.append(entry["slot"])
+
+
+def _lookup_exact(template: str, now: float):
+    entry = _entries.get(template)
+    if entry is None:
+        return None
+    if entry["expires_at"] < now:
+        _drop(template)
+        _stats["expired"] += 1
+        return None
+    _entries.move_to_end(template)
+    return entry["response"]
+
+
+def _lookup_similar(vec: np.ndarray, now: float):
+    if not _entries or _vectors is None:
+        return None
+    distances = np.sum((_vectors - vec) ** 2, axis=1)
+    distances[~_valid] = np.inf
+    best = int(np.argmin(distances))
+    if distances[best] > GPT_CACHE_MAX_DISTANCE:
+        return None
+    return _lookup_exact(_slot_keys[best], now)
+
+
+def lookup(log_text: str, get_vec) -> tuple[str | None, np.ndarray | None]:
+    """Ищет закэшированный ответ. get_vec() вызывается, только если 1-й уровень промахнулся.
+
+    Возвращает (ответ или None, вектор или None) — вектор пригодится вызывающему для поиска в FAISS.
+    """
+    if not GPT_CACHE_ENABLED:
+        return None, None
+
+    template = normalize_log(log_text)
+    now = time.monotonic()
+    with _lock:
+        response = _lookup_exact(template, now)
+        if response is not None:
+            _stats["exact_hits"] += 1
+            return response, None
+
+    vec = np.asarray(get_vec(), dtype="float32")
+    with _lock:
+        response = _lookup_similar(vec, now)
+        if response is not None:
+            _stats["semantic_hits"] += 1
+            return response, vec
+        _stats["misses"] += 1
+    return None, vec
+
+
+def store(log_text: str, vec: np.ndarray, response: str):
+    global _vectors
+    if not GPT_CACHE_ENABLED or vec is None or GPT_CACHE_SIZE <= 0:
+        return
+    template = normalize_log(log_text)
+    vec = np.asarray(vec, dtype="float32")
+    with _lock:
+        if _vectors is None:
+            _vectors = np.zeros((GPT_CACHE_SIZE, vec.shape[0]), dtype="float32")
+        _drop(template)
+        if not _free_slots:
+            # LRU: вытесняем самую давно использованную запись
+            _drop(next(iter(_entries)))
+            _stats["evictions"] += 1
+        slot = _free_slots.pop()
+        _vectors[slot] = vec
+        _valid[slot] = True
+        _slot_keys[slot] = template
+        _entries[template] = {
+            "response": response,
+            "slot": slot,
+            "expires_at": time.monotonic() + GPT_CACHE_TTL,
+        }
+
+
+def get_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_entries)
+    lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+import time
+
+from backend.database import SessionLocal
+from backend.models import LogAnalysis
+from backend.securitygpt import encode_texts, add_to_delta_index, snapshot_delta_index, get_delta_ids
+
+# ⚙️ Инкрементальное пополнение FAISS: новые проанализированные логи становятся примерами для поиска
+INDEX_UPDATE_BATCH_SIZE = int(os.getenv("INDEX_UPDATE_BATCH_SIZE", "256"))
+INDEX_UPDATE_FLUSH_SECONDS = float(os.getenv("INDEX_UPDATE_FLUSH_SECONDS", "5"))
+INDEX_SNAPSHOT_INTERVAL = float(os.getenv("INDEX_SNAPSHOT_INTERVAL", "300"))
+
+_pending = queue.Queue(maxsize=int(os.getenv("INDEX_UPDATE_QUEUE_SIZE", "100000")))
+_indexed_ids = set()
+_thread = None
+_dirty = False
+_last_snapshot = time.monotonic()
+_stats_lock = threading.Lock()
+_stats = {"added": 0, "skipped": 0, "dropped": 0, "snapshots": 0}
+
+
+def _inc(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+def schedule_index_update(log_ids: list[int]):
+    """Не блокирует вызывающего: при переполнении очереди id просто теряются (индекс — не источник истины)."""
+    for log_id in log_ids:
+        try:
+            _pending.put_nowait(log_id)
+        except queue.Full:
+            _inc("dropped")
+
+
+def get_index_updater_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "pending": _pending.qsize(),
+        "delta_size": len(_indexed_ids),
+    }
+
+
+def _index_logs(log_ids: list[int]):
+    new_ids = [log_id for log_id in dict.fromkeys(log_ids) if log_id not in _indexed_ids]
+    _inc("skipped", len(log_ids) - len(new_ids))
+    if not new_ids:
+        return False
+
+    with SessionLocal() as db:
+        rows = (
+            db.query(LogAnalysis.id, LogAnalysis.log_text)
+            .filter(LogAnalysis.id.in_(new_ids), LogAnalysis.analysis_status == "done")
+            .all()
+        )
+    rows = [row for row in rows if row.log_text]
+    if not rows:
+        return False
+
+    # Эмбеддинги считаются вне лока — поиск по индексам в это время не блокируется
+    vecs = encode_texts([row.log_text for row in rows])
+    add_to_delta_index([row.id for row in rows], vecs)
+    _indexed_ids.update(row.id for row in rows)
+    _inc("added", len(rows))
+    return True
+
+
+def _drain_batch() -> list[int]:
+    batch = []
+    deadline = time.monotonic() + INDEX_UPDATE_FLUSH_SECONDS
+    while len(batch) < INDEX_UPDATE_BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(_pending.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return batch
+
+
+def snapshot_if_dirty(force: bool = False):
+    global _dirty, _last_snapshot
+    if not _dirty:
+        return
+    if not force and time.monotonic() - _last_snapshot < INDEX_SNAPSHOT_INTERVAL:
+        return
+    try:
+        ntotal = snapshot_delta_index()
+        _dirty = False
+        _last_snapshot = time.monotonic()
+        _inc("snapshots")
+        print(f"💾 Снимок дельта-индекса сохранён: {ntotal} векторов")
+    except Exception as e:
+        print("❌ Ошибка сохранения дельта-индекса:", str(e))
+
+
+def _run():
+    global _dirty
+    # Первое обращение к дельта-индексу дожидается загрузки модели — поэтому уже в потоке, а не в startup
+    try:
+        _indexed_ids.update(get_delta_ids())
+    except Exception as e:
+        print("❌ Не удалось загрузить дельта-индекс:", str(e))
+    while True:
+        batch = _drain_batch()
+        if batch:
+            try:
+                _dirty = _index_logs(batch) or _dirty
+            except Exception as e:
+                print("❌ Ошибка инкрементального индексирования:", str(e))
+        snapshot_if_dirty()
+
+
+def start_index_updater():
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=_run, name="index-updater", daemon=True)
+    _thread.start()
+
+
+def stop_index_updater():
+    snapshot_if_dirty(force=True)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import random
+import threading
+
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 🚪 Единая точка выхода к OpenAI: асинхронный клиент в отдельном event loop,
+# лимит одновременных запросов, дедлайн на вызов, ретраи с jitter и склейка одинаковых запросов.
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # например, http://127.0.0.1:8081/v1 для локальной заглушки
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "10"))
+
+_start_lock = threading.Lock()
+_loop = None
+_client = None
+_semaphore = None
+_inflight = {}  # ключ запроса -> asyncio.Task; живёт только в потоке шлюза
+_stats = {"calls": 0, "coalesced": 0, "retries": 0, "timeouts": 0, "errors": 0, "in_flight": 0}
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+def _run_loop(loop, ready):
+    global _client, _semaphore
+    asyncio.set_event_loop(loop)
+    # Клиент и семафор создаются внутри своего loop, чтобы httpx-пул был привязан к нему
+    _client = openai.AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL or None,
+        max_retries=0,  # ретраи делаем сами, с общим дедлайном
+        timeout=LLM_TIMEOUT,
+    )
+    _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    ready.set()
+    loop.run_forever()
+
+
+def _ensure_started() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is not None:
+        return _loop
+    with _start_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            threading.Thread(target=_run_loop, args=(loop, ready), name="llm-gateway", daemon=True).start()
+            ready.wait()
+            _loop = loop
+    return _loop
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def _retry_after(e: Exception) -> float:
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def _call_llm(request: dict, timeout: float) -> str:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    attempt = 0
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            _stats["timeouts"] += 1
+            raise LLMTimeoutError(f"LLM deadline {timeout}s exceeded")
+        try:
+            async with _semaphore:
+                _stats["in_flight"] += 1
+                try:
+                    response = await asyncio.wait_for(_client.chat.completions.create(**request), remaining)
+                finally:
+                    _stats["in_flight"] -= 1
+            return response.choices[0].message.content.strip()
+        except asyncio.TimeoutError:
+            _stats["timeouts"] += 1
+            raise LLMTimeoutError(f"LLM deadline {timeout}s exceeded")
+        except Exception as e:
+            if not _is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                _stats["errors"] += 1
+                raise
+            # Full jitter: случайная пауза до экспоненциального потолка, но не меньше Retry-After
+            delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+            delay = max(delay, _retry_after(e))
+            if loop.time() + delay >= deadline:
+                _stats["errors"] += 1
+                raise
+            attempt += 1
+            _stats["retries"] += 1
+            print(f"⚠️ LLM ошибка ({type(e).__name__}), повтор #{attempt} через {delay:.2f}с")
+            await asyncio.sleep(delay)
+
+
+async def _chat(request: dict, timeout: float) -> str:
+    # Single-flight: одинаковый запрос, который уже в полёте, не отправляется второй раз
+    key = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    task = _inflight.get(key)
+    if task is None:
+        _stats["calls"] += 1
+        task = asyncio.ensure_future(_call_llm(request, timeout))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        _stats["coalesced"] += 1
+    # shield: отмена одного ожидающего не должна отменять общий запрос
+    return await asyncio.shield(task)
+
+
+def _submit(model: str, messages: list[dict], temperature: float, max_tokens: int, timeout: float | None):
+    request = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    timeout = timeout or LLM_TIMEOUT
+    return asyncio.run_coroutine_threadsafe(_chat(request, timeout), _ensure_started()), timeout
+
+
+def chat_completion(
+    messages: list[dict],
+    model: str = "gpt-4o",
+    temperature: float = 0.2,
+    max_tokens: int = 400,
+    timeout: float | None = None
+) -> str:
+    """Синхронный вызов из обработчиков и воркеров; ждёт ответ не дольше дедлайна."""
+    future, timeout = _submit(model, messages, temperature, max_tokens, timeout)
+    try:
+        # Небольшой запас сверх дедлайна: сам дедлайн отрабатывает внутри шлюза
+        return future.result(timeout=timeout + 5)
+    except TimeoutError:
+        future.cancel()
+        raise LLMTimeoutError(f"LLM deadline {timeout}s exceeded")
+
+
+async def chat_completion_async(
+    messages: list[dict],
+    model: str = "gpt-4o",
+    temperature: float = 0.2,
+    max_tokens: int = 400,
+    timeout: float | None = None
+) -> str:
+    """То же для корутин из любого другого event loop (например, основного loop FastAPI)."""
+    future, _ = _submit(model, messages, temperature, max_tokens, timeout)
+    return await asyncio.wrap_future(future)
+
+
+def get_gateway_stats() -> dict:
+    return {
+        **_stats,
+        "pending_unique": len(_inflight),
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "started": _loop is not None,
+    }
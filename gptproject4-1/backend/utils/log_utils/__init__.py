@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
 from backend.models import LogAnalysis
+from backend.securitygpt import notify_telegram, ALERT_THRESHOLD
+from backend.utils.aggregate_utils import PENDING_ATTACK_TYPE
 
 def get_recent_logs(db: Session, company_id: str, limit: int = 5):
     return (
@@ -8,4 +10,30 @@ def get_recent_logs(db: Session, company_id: str, limit: int = 5):
         .order_by(LogAnalysis.timestamp.desc())
         .limit(limit)
         .all()
-    )
\ No newline at end of file
+    )
+
+def analysis_values(parsed: dict, status: str = "done") -> dict:
+    return {
+        "attack_type": parsed["attack_type"],
+        "mitre_id": parsed["mitre_id"],
+        "probability": parsed["probability"],
+        "recommendation": parsed["recommendation"],
+        "analysis_status": status,
+    }
+
+def apply_analysis(entry: LogAnalysis, parsed: dict, status: str = "done"):
+    for key, value in analysis_values(parsed, status).items():
+        setattr(entry, key, value)
+
+def send_threat_alert(parsed: dict):
+    try:
+        probability = parsed.get("probability")
+        if probability is not None and probability >= ALERT_THRESHOLD:
+            tg_msg = (
+                f"🚨 Обнаружена угроза!\n"
+                f"Вероятность: {probability}%\n"
+                f"MITRE ID: {parsed.get('mitre_id', '-')}\n"
+            )
+            notify_telegram(tg_msg)
+    except Exception as e:
+        print("Ошибка при отправке уведомления в Telegram:", str(e))
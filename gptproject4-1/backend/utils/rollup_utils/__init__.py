@@ -0,0 +1,346 @@
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, case, delete, extract, false, func, insert, literal, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal
+from backend.models import LogAnalysis, LogRollup
+from backend.utils.aggregate_utils import is_attack, HIGH_RISK_THRESHOLD, MEDIUM_RISK_THRESHOLD, risk_bucket
+
+# 📈 Роллапы для аналитики по произвольному периоду: счётчики логов по корзинам minute / hour / day.
+# Пишутся в той же транзакции, что и сами логи; компактор чистит мелкие корзины старше срока хранения.
+GRANULARITIES = ("minute", "hour", "day")
+DIMENSIONS = ("attack_type", "mitre_id", "severity_windows", "severity_syslog", "country", "risk_level")
+ROLLUP_MINUTE_RETENTION_DAYS = int(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", "14"))
+ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv("ROLLUP_HOUR_RETENTION_DAYS", "180"))
+ROLLUP_COMPACT_INTERVAL = float(os.getenv("ROLLUP_COMPACT_INTERVAL", "3600"))
+
+_KEY = ("company_id", "granularity", "bucket_start") + DIMENSIONS
+_thread = None
+_stats = {"upserted_rows": 0, "compactions": 0, "pruned_rows": 0}
+
+
+def to_utc_naive(ts: datetime | None) -> datetime | None:
+    """Корзины и log_analysis.timestamp хранятся в наивном UTC; фронтенд же шлёт toISOString() с зоной."""
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def truncate(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _step(granularity: str) -> timedelta:
+    return {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}[granularity]
+
+
+def _ceil(ts: datetime, granularity: str) -> datetime:
+    floor = truncate(ts, granularity)
+    return floor if floor == ts else floor + _step(granularity)
+
+
+def _get(row, key):
+    return row.get(key) if isinstance(row, dict) else getattr(row, key, None)
+
+
+def rollup_values(row) -> dict:
+    """Поля лога, от которых зависят роллапы (снимок до изменения анализа)."""
+    return {key: _get(row, key) for key in (
+        "company_id", "timestamp", "attack_type", "mitre_id",
+        "severity_windows", "severity_syslog", "country", "probability"
+    )}
+
+
+def _collect(counts: Counter, high: Counter, rows, sign: int):
+    for row in rows:
+        timestamp = _get(row, "timestamp")
+        company_id = _get(row, "company_id")
+        if timestamp is None or company_id is None:
+            continue
+        risk = risk_bucket(_get(row, "probability"))
+        dims = tuple(_get(row, d) or "" for d in DIMENSIONS[:-1]) + (risk,)
+        # Строка может быть уже сгруппированной (загрузка CSV) — тогда в ней есть count
+        weight = sign * (_get(row, "count") or 1)
+        for granularity in GRANULARITIES:
+            key = (company_id, granularity, truncate(timestamp, granularity)) + dims
+            counts[key] += weight
+            if risk == "high":
+                high[key] += weight
+
+
+def _upsert(db: Session, counts: Counter, high: Counter):
+    # В одном INSERT ... ON CONFLICT ключ не может встречаться дважды — поэтому сначала сворачиваем в Python.
+    # Строки сортируются по ключу: параллельные транзакции блокируют общие корзины в одном порядке
+    # и не ловят deadlock друг на друге
+    values = [
+        {**dict(zip(_KEY, key)), "count": count, "high_risk": high[key]}
+        for key, count in sorted(counts.items()) if count or high[key]
+    ]
+    if not values:
+        return
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(LogRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_KEY),
+        set_={
+            "count": LogRollup.count + stmt.excluded.count,
+            "high_risk": LogRollup.high_risk + stmt.excluded.high_risk,
+        }
+    )
+    db.execute(stmt)
+    _stats["upserted_rows"] += len(values)
+
+
+def record_rollups(db: Session, rows, sign: int = 1):
+    """Добавляет (или с sign=-1 вычитает) логи в роллапы. Коммит — на вызывающем, вместе с самими логами."""
+    counts, high = Counter(), Counter()
+    _collect(counts, high, rows, sign)
+    _upsert(db, counts, high)
+
+
+def record_rollup_change(db: Session, before_rows, after_rows):
+    """Лог поменял attack_type / mitre_id / probability: старые значения вычитаются, новые добавляются."""
+    counts, high = Counter(), Counter()
+    _collect(counts, high, before_rows, -1)
+    _collect(counts, high, after_rows, 1)
+    _upsert(db, counts, high)
+
+
+def _segments(start: datetime, end: datetime, levels: tuple) -> list[tuple]:
+    """Разбивает [start, end) на куски: внутри — самые крупные корзины, по краям — всё мельче.
+    levels — от крупных к мелким, например ("day", "hour", "minute")."""
+    if start >= end:
+        return []
+    granularity, finer = levels[0], levels[1:]
+    if not finer:
+        return [(granularity, truncate(start, granularity), end)]
+    inner_start, inner_end = _ceil(start, granularity), truncate(end, granularity)
+    if inner_start >= inner_end:
+        return _segments(start, end, finer)
+    return _segments(start, inner_start, finer) + [(granularity, inner_start, inner_end)] + _segments(inner_end, end, finer)
+
+
+def _range_filter(company_id: str, date_from: datetime, date_to: datetime, levels: tuple):
+    segments = _segments(date_from, date_to, levels)
+    # Мелкие корзины старше срока хранения удалены компактором — края такого периода берём из более крупных.
+    # Расширенные куски могут пересекаться, но это условия одного OR, так что строки не задваиваются
+    now = datetime.utcnow()
+    cutoffs = {
+        "minute": now - timedelta(days=ROLLUP_MINUTE_RETENTION_DAYS),
+        "hour": now - timedelta(days=ROLLUP_HOUR_RETENTION_DAYS),
+    }
+    coarser = {"minute": "hour", "hour": "day"}
+    conditions = []
+    for granularity, start, end in segments:
+        while granularity in cutoffs and end <= cutoffs[granularity] and coarser[granularity] in levels:
+            granularity = coarser[granularity]
+            start, end = truncate(start, granularity), _ceil(end, granularity)
+        conditions.append(and_(
+            LogRollup.granularity == granularity,
+            LogRollup.bucket_start >= start,
+            LogRollup.bucket_start < end
+        ))
+    return and_(LogRollup.company_id == company_id, or_(*conditions) if conditions else false())
+
+
+def rollup_summary(db: Session, company_id: str, date_from: datetime, date_to: datetime) -> dict:
+    """Те же счётчики, что и get_aggregates, но за период [date_from, date_to)."""
+    date_from = to_utc_naive(date_from) or datetime(1970, 1, 1)
+    date_to = to_utc_naive(date_to) or datetime.utcnow() + timedelta(minutes=1)
+
+    rows = (
+        db.query(
+            LogRollup.attack_type,
+            LogRollup.mitre_id,
+            LogRollup.severity_windows,
+            LogRollup.severity_syslog,
+            LogRollup.country,
+            LogRollup.risk_level,
+            func.sum(LogRollup.count),
+            func.sum(LogRollup.high_risk)
+        )
+        .filter(_range_filter(company_id, date_from, date_to, ("day", "hour", "minute")))
+        .group_by(*(getattr(LogRollup, d) for d in DIMENSIONS))
+        .all()
+    )
+
+    summary = {
+        "total": 0,
+        "attacks_detected": 0,
+        "high_risk": 0,
+        "attack_types": Counter(),
+        "mitre": Counter(),
+        "risk_levels": Counter({"low": 0, "medium": 0, "high": 0}),
+        "severity": {"windows": Counter(), "syslog": Counter()},
+        "countries": Counter(),
+    }
+    for attack_type, mitre_id, sev_w, sev_s, country, risk, count, high in rows:
+        if not count:
+            continue
+        attack_type = attack_type or None
+        summary["total"] += count
+        summary["high_risk"] += high or 0
+        summary["attack_types"][attack_type] += count
+        summary["risk_levels"][risk] += count
+        if is_attack(attack_type):
+            summary["attacks_detected"] += count
+        if mitre_id:
+            summary["mitre"][mitre_id] += count
+        if sev_w:
+            summary["severity"]["windows"][sev_w] += count
+        if sev_s:
+            summary["severity"]["syslog"][sev_s] += count
+        if country:
+            summary["countries"][country] += count
+
+    # Гистограмма по часу суток: дневные корзины час не хранят, поэтому только hour + minute
+    hour = extract("hour", LogRollup.bucket_start)
+    hourly = [0] * 24
+    for hr, count in (
+        db.query(hour, func.sum(LogRollup.count))
+        .filter(_range_filter(company_id, date_from, date_to, ("hour", "minute")))
+        .group_by(hour)
+        .all()
+    ):
+        hourly[int(hr)] = int(count or 0)
+
+    return {
+        **summary,
+        "attack_types": dict(summary["attack_types"]),
+        "mitre": dict(summary["mitre"]),
+        "risk_levels": dict(summary["risk_levels"]),
+        "severity": {k: dict(v) for k, v in summary["severity"].items()},
+        "countries": dict(summary["countries"]),
+        "hourly": hourly,
+    }
+
+
+def has_rollups(db: Session, company_id: str) -> bool:
+    return db.query(LogRollup.company_id).filter(LogRollup.company_id == company_id).first() is not None
+
+
+def get_timeseries(db: Session, company_id: str, date_from: datetime, date_to: datetime, granularity: str = "hour") -> list[dict]:
+    date_from, date_to = to_utc_naive(date_from), to_utc_naive(date_to)
+    rows = (
+        db.query(LogRollup.bucket_start, func.sum(LogRollup.count), func.sum(LogRollup.high_risk))
+        .filter(
+            LogRollup.company_id == company_id,
+            LogRollup.granularity == granularity,
+            LogRollup.bucket_start >= truncate(date_from, granularity),
+            LogRollup.bucket_start < date_to
+        )
+        .group_by(LogRollup.bucket_start)
+        .order_by(LogRollup.bucket_start)
+        .all()
+    )
+    return [
+        {"bucket_start": bucket, "count": int(count or 0), "high_risk": int(high or 0)}
+        for bucket, count, high in rows if count
+    ]
+
+
+def rebuild_rollups(db: Session, company_id: str | None = None, date_from: datetime | None = None, date_to: datetime | None = None):
+    """Пересчёт роллапов из log_analysis (бэкфилл и починка). Только PostgreSQL: использует date_trunc."""
+    date_from = truncate(to_utc_naive(date_from), "day") if date_from else None
+    date_to = _ceil(to_utc_naive(date_to), "day") if date_to else None
+    now = datetime.utcnow()
+    # Мелкие корзины старше срока хранения не восстанавливаем — компактор всё равно их удалит
+    cutoffs = {
+        "minute": truncate(now - timedelta(days=ROLLUP_MINUTE_RETENTION_DAYS), "day"),
+        "hour": truncate(now - timedelta(days=ROLLUP_HOUR_RETENTION_DAYS), "day"),
+    }
+
+    def scope(column, start):
+        conditions = [column >= start] if start else []
+        if date_to:
+            conditions.append(column < date_to)
+        return conditions
+
+    company_filter = [LogRollup.company_id == company_id] if company_id else []
+    db.execute(delete(LogRollup).where(*company_filter, *scope(LogRollup.bucket_start, date_from)))
+
+    risk = case(
+        (LogAnalysis.probability >= HIGH_RISK_THRESHOLD, "high"),
+        (LogAnalysis.probability >= MEDIUM_RISK_THRESHOLD, "medium"),
+        else_="low"
+    )
+    is_high = case((LogAnalysis.probability >= HIGH_RISK_THRESHOLD, 1), else_=0)
+    for granularity in GRANULARITIES:
+        start = date_from
+        if granularity in cutoffs:
+            start = max(start, cutoffs[granularity]) if start else cutoffs[granularity]
+        conditions = [LogAnalysis.timestamp.isnot(None), LogAnalysis.company_id.isnot(None)]
+        conditions += scope(LogAnalysis.timestamp, start)
+        if company_id:
+            conditions.append(LogAnalysis.company_id == company_id)
+        # Измерения считаем в подзапросе: в GROUP BY PostgreSQL не сопоставит выражения с разными bind-параметрами
+        rows = (
+            select(
+                LogAnalysis.company_id.label("company_id"),
+                func.date_trunc(granularity, LogAnalysis.timestamp).label("bucket_start"),
+                *(func.coalesce(getattr(LogAnalysis, d), "").label(d) for d in DIMENSIONS[:-1]),
+                risk.label("risk_level"),
+                is_high.label("is_high")
+            )
+            .where(*conditions)
+            .subquery()
+        )
+        keys = [rows.c.company_id, rows.c.bucket_start] + [rows.c[d] for d in DIMENSIONS]
+        query = (
+            select(rows.c.company_id, literal(granularity), *keys[1:], func.count(), func.sum(rows.c.is_high))
+            .group_by(*keys)
+        )
+        db.execute(insert(LogRollup).from_select(list(_KEY) + ["count", "high_risk"], query))
+
+
+def compact_rollups():
+    """Удаляет минутные и часовые корзины старше срока хранения: крупные корзины за тот же период остаются."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        pruned = 0
+        for granularity, days in (("minute", ROLLUP_MINUTE_RETENTION_DAYS), ("hour", ROLLUP_HOUR_RETENTION_DAYS)):
+            result = db.execute(delete(LogRollup).where(
+                LogRollup.granularity == granularity,
+                LogRollup.bucket_start < truncate(now - timedelta(days=days), "day")
+            ))
+            pruned += result.rowcount or 0
+        # Пары +1/-1 после анализа оставляют нулевые строки — они тоже не нужны
+        result = db.execute(delete(LogRollup).where(LogRollup.count == 0, LogRollup.high_risk == 0))
+        pruned += result.rowcount or 0
+        db.commit()
+    _stats["compactions"] += 1
+    _stats["pruned_rows"] += pruned
+    return pruned
+
+
+def _run():
+    while True:
+        try:
+            pruned = compact_rollups()
+            if pruned:
+                print(f"🧹 Компактор роллапов: удалено {pruned} строк")
+        except Exception as e:
+            print("❌ Ошибка компактора роллапов:", str(e))
+        time.sleep(ROLLUP_COMPACT_INTERVAL)
+
+
+def start_rollup_compactor():
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=_run, name="rollup-compactor", daemon=True)
+    _thread.start()
+
+
+def get_rollup_stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,403 @@
+import csv
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal
+from backend.models import LogAnalysis, UploadJob
+from backend.securitygpt import get_similar_logs_batch
+from backend.utils.aggregate_utils import record_logs
+from backend.utils.rollup_utils import record_rollups
+from backend.utils.ws_manager import schedule_company_update
+
+# 📥 Загрузка CSV (CIC-IDS и похожие дампы): файл читается кусками по UPLOAD_CHUNK_ROWS строк,
+# log_text собирается векторно, каждый кусок пишется одним COPY (PostgreSQL) или одним INSERT
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
+# Загруженные файлы ждут воркера здесь; задачи — в таблице upload_jobs, так что переживают рестарт
+# и разбираются любым процессом API (SELECT ... FOR UPDATE SKIP LOCKED). Процесс берёт только задачи,
+# чей файл видит у себя, поэтому на нескольких машинах UPLOAD_SPOOL_DIR должен быть общим томом —
+# иначе файл разберёт только тот сервер, который его принял
+UPLOAD_SPOOL_DIR = os.getenv(
+    "UPLOAD_SPOOL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "upload_spool")
+)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "1"))
+UPLOAD_POLL_SECONDS = float(os.getenv("UPLOAD_POLL_SECONDS", "5"))
+# running-задача без heartbeat дольше этого времени считается брошенной упавшим процессом
+UPLOAD_STALE_SECONDS = float(os.getenv("UPLOAD_STALE_SECONDS", "600"))
+UPLOAD_STOP_TIMEOUT = float(os.getenv("UPLOAD_STOP_TIMEOUT", "30"))
+# Сколько queued-задач смотреть за раз в поисках той, чей файл лежит в нашем spool
+UPLOAD_CLAIM_SCAN = 20
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+POSSIBLE_COLUMNS = [
+    ('Destination Port', 'Flow Duration', 'Total Fwd Packets', 'Label'),
+    ('Dst Port', 'Flow Duration', 'Fwd Pkts', 'Label'),
+    ('dst_port', 'duration', 'fwd_packets', 'label')
+]
+
+# Порядок колонок в COPY / INSERT; analysis_status и created_at берутся из умолчаний таблицы
+INSERT_COLUMNS = [
+    "ip", "log_text", "attack_type", "mitre_id", "probability", "recommendation",
+    "timestamp", "company_id", "status"
+]
+
+_workers = []
+_wake = threading.Event()
+_stopping = threading.Event()
+_stats_lock = threading.Lock()
+_stats = {"submitted": 0, "done": 0, "failed": 0, "cancelled": 0, "rows": 0, "rows_failed": 0, "stale": 0, "foreign_skipped": 0}
+
+
+def _inc(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+def read_header(path: str) -> list[str]:
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def detect_columns(header: list[str]):
+    """Исходные имена колонок (порт, длительность, пакеты, метка) или None.
+    В дампах CIC-IDS имена идут с пробелами (' Destination Port') — сравниваем без них."""
+    stripped = {name.strip(): name for name in header}
+    for cols in POSSIBLE_COLUMNS:
+        if all(c in stripped for c in cols):
+            return tuple(stripped[c] for c in cols)
+    return None
+
+
+def build_chunk(df: pd.DataFrame, columns: tuple, company_id: str, enrich: bool = False) -> pd.DataFrame:
+    """Кусок CSV → строки log_analysis. Никаких iterrows: все операции над колонками целиком."""
+    col_port, col_dur, col_pkt, col_label = columns
+    df = df.dropna()
+    numbers = df[[col_port, col_dur, col_pkt]].apply(pd.to_numeric, errors="coerce")
+    # В CIC-IDS встречаются Infinity и мусор в числовых колонках — такие строки отбрасываем
+    valid = np.isfinite(numbers.to_numpy(dtype="float64")).all(axis=1)
+    numbers = numbers[valid].astype("int64").astype(str)
+    labels = df.loc[valid, col_label].astype(str)
+
+    frame = pd.DataFrame({
+        "ip": "0.0.0.0",  # неизвестен
+        "log_text": "Порт: " + numbers[col_port] + ", Длительность: " + numbers[col_dur] + ", Пакеты: " + numbers[col_pkt],
+        "attack_type": labels,
+        "mitre_id": None,
+        "probability": 0.0,
+        "recommendation": None,
+        "timestamp": datetime.utcnow(),
+        "company_id": company_id,
+        "status": "Активна",
+    }, columns=INSERT_COLUMNS).reset_index(drop=True)
+
+    if enrich and len(frame):
+        # MITRE и рекомендацию берём у ближайшего размеченного примера — весь кусок одним батчем
+        nearest = get_similar_logs_batch(frame["log_text"].tolist(), top_k=1)
+        examples = [found[0] if found else {} for found in nearest]
+        frame["mitre_id"] = [example.get("mitre") for example in examples]
+        frame["recommendation"] = [example.get("recommendation") for example in examples]
+    return frame
+
+
+def _copy_chunk(db: Session, frame: pd.DataFrame):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False, quoting=csv.QUOTE_MINIMAL)
+    buffer.seek(0)
+    # COPY идёт через сырое psycopg2-соединение той же сессии — в одной транзакции с роллапами
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {LogAnalysis.__tablename__} ({', '.join(INSERT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def insert_chunk(db: Session, frame: pd.DataFrame):
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_chunk(db, frame)
+    else:
+        # executemany одним INSERT без ORM-объектов
+        rows = frame.astype(object).where(frame.notna(), None).to_dict("records")
+        db.execute(insert(LogAnalysis), rows)
+
+
+def summarize_chunk(frame: pd.DataFrame) -> list[dict]:
+    """Кусок, свёрнутый до (attack_type, mitre_id) с count: для роллапов и агрегатов
+    миллион строк CIC-IDS — это десяток групп, а не миллион событий."""
+    if frame.empty:
+        return []
+    first = frame.iloc[0]
+    grouped = frame.groupby(["attack_type", "mitre_id"], dropna=False).size()
+    return [
+        {
+            "attack_type": attack_type,
+            "mitre_id": None if pd.isna(mitre_id) else mitre_id,
+            "probability": 0.0,
+            "severity_windows": None,
+            "severity_syslog": None,
+            "country": None,
+            "timestamp": first["timestamp"].to_pydatetime(),
+            "company_id": first["company_id"],
+            "status": first["status"],
+            "count": int(count),
+        }
+        for (attack_type, mitre_id), count in grouped.items()
+    ]
+
+
+def ingest_csv(path: str, columns: tuple, company_id: str, enrich: bool = False, progress=None) -> tuple[int, int, bool]:
+    """Загружает файл кусками; каждый кусок — отдельная транзакция.
+    progress(rows, rows_failed, bytes_read) зовётся после куска; если вернёт True — загрузка прерывается.
+    Возвращает (строк записано, строк отброшено, прервана ли)."""
+    rows = failed = 0
+    with open(path, "rb") as f, SessionLocal() as db:
+        # usecols: остальные ~80 колонок CIC-IDS даже не парсятся
+        reader = pd.read_csv(f, usecols=list(columns), chunksize=UPLOAD_CHUNK_ROWS)
+        for df in reader:
+            frame = build_chunk(df, columns, company_id, enrich)
+            failed += len(df) - len(frame)
+            if not frame.empty:
+                summary = summarize_chunk(frame)
+                insert_chunk(db, frame)
+                record_rollups(db, summary)
+                db.commit()
+                record_logs(summary)
+                rows += len(frame)
+            if progress and progress(rows, failed, f.tell()):
+                return rows, failed, True
+    return rows, failed, False
+
+
+def spool_upload(fileobj) -> tuple[str, str]:
+    """Потоком копирует загружаемый файл в spool-каталог, не читая его в память. Возвращает (job_id, путь)."""
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    path = os.path.join(UPLOAD_SPOOL_DIR, f"{job_id}.csv")
+    with open(path, "wb") as spool:
+        shutil.copyfileobj(fileobj, spool, SPOOL_CHUNK_SIZE)
+    return job_id, path
+
+
+def _remove_spool(path: str | None):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def submit_job(db: Session, job_id: str, path: str, columns: tuple, company_id: str, filename: str, enrich: bool = False) -> UploadJob:
+    job = UploadJob(
+        id=job_id,
+        company_id=company_id,
+        filename=filename,
+        spool_path=path,
+        columns=json.dumps(list(columns)),
+        enrich=enrich,
+        status="queued",
+        bytes_total=os.path.getsize(path)
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _inc("submitted")
+    _wake.set()
+    return job
+
+
+def job_view(job: UploadJob) -> dict:
+    finished = job.finished_at or datetime.utcnow()
+    elapsed = (finished - job.started_at).total_seconds() if job.started_at else 0
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "cancel_requested": job.cancel_requested,
+        "rows_processed": job.rows_processed,
+        "rows_failed": job.rows_failed,
+        "bytes_read": job.bytes_read,
+        "bytes_total": job.bytes_total,
+        "progress": round(job.bytes_read / job.bytes_total, 4) if job.bytes_total else None,
+        "rows_per_second": round(job.rows_processed / elapsed, 1) if elapsed > 0 else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def cancel_job(db: Session, job: UploadJob) -> UploadJob:
+    """queued — отменяется сразу; running — воркер остановится после текущего куска.
+    Уже записанные куски остаются в базе."""
+    # Условный UPDATE: воркер мог забрать задачу между чтением и отменой
+    cancelled = db.execute(
+        update(UploadJob)
+        .where(UploadJob.id == job.id, UploadJob.status == "queued")
+        .values(status="cancelled", finished_at=datetime.utcnow())
+    ).rowcount
+    if not cancelled:
+        db.execute(
+            update(UploadJob)
+            .where(UploadJob.id == job.id, UploadJob.status == "running")
+            .values(cancel_requested=True)
+        )
+    db.commit()
+    db.refresh(job)
+    if cancelled:
+        _remove_spool(job.spool_path)
+        _inc("cancelled")
+    return job
+
+
+def _claim_job() -> dict | None:
+    with SessionLocal() as db:
+        candidates = (
+            db.query(UploadJob)
+            .filter(UploadJob.status == "queued")
+            .order_by(UploadJob.created_at)
+            .limit(UPLOAD_CLAIM_SCAN)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        job = next((c for c in candidates if os.path.exists(c.spool_path)), None)
+        if job is None:
+            if candidates:
+                _inc("foreign_skipped", len(candidates))
+            return None
+        now = datetime.utcnow()
+        job.status = "running"
+        job.started_at = now
+        job.heartbeat_at = now
+        db.commit()
+        return {
+            "id": job.id,
+            "company_id": job.company_id,
+            "path": job.spool_path,
+            "columns": tuple(json.loads(job.columns)),
+            "enrich": job.enrich,
+        }
+
+
+def _report_progress(job_id: str, rows: int, failed: int, bytes_read: int) -> bool:
+    with SessionLocal() as db:
+        job = db.get(UploadJob, job_id)
+        if job is None:  # компанию удалили вместе с задачами
+            return True
+        job.rows_processed = rows
+        job.rows_failed = failed
+        job.bytes_read = bytes_read
+        job.heartbeat_at = datetime.utcnow()
+        db.commit()
+        return job.cancel_requested
+
+
+def _finish_job(job_id: str, **values):
+    with SessionLocal() as db:
+        db.execute(update(UploadJob).where(UploadJob.id == job_id).values(finished_at=datetime.utcnow(), **values))
+        db.commit()
+
+
+def process_job(job: dict):
+    started = time.monotonic()
+    try:
+        rows, failed, cancelled = ingest_csv(
+            job["path"], job["columns"], job["company_id"], job["enrich"],
+            progress=lambda rows, failed, bytes_read: _report_progress(job["id"], rows, failed, bytes_read)
+        )
+        status = "cancelled" if cancelled else "done"
+        values = {"status": status, "rows_processed": rows, "rows_failed": failed}
+        if not cancelled:
+            values["bytes_read"] = UploadJob.bytes_total
+        _finish_job(job["id"], **values)
+        _inc(status)
+        _inc("rows", rows)
+        _inc("rows_failed", failed)
+        print(f"📥 CSV {status}: {rows} логов, отброшено {failed}, за {time.monotonic() - started:.1f}с (job={job['id']})")
+    except Exception as e:
+        print(f"❌ Ошибка загрузки CSV job={job['id']}:", str(e))
+        _finish_job(job["id"], status="failed", error=str(e))
+        _inc("failed")
+    finally:
+        _remove_spool(job["path"])
+    schedule_company_update(job["company_id"])
+
+
+def fail_stale_jobs():
+    """running-задачи, чей процесс умер (нет heartbeat), помечаются failed: часть кусков уже в базе,
+    поэтому молча перезапускать их нельзя — получились бы дубли."""
+    deadline = datetime.utcfromtimestamp(time.time() - UPLOAD_STALE_SECONDS)
+    with SessionLocal() as db:
+        stale = (
+            db.query(UploadJob)
+            .filter(UploadJob.status == "running", UploadJob.heartbeat_at < deadline)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for job in stale:
+            job.status = "failed"
+            job.error = "Загрузка прервана: процесс сервера остановился"
+            job.finished_at = datetime.utcnow()
+            _remove_spool(job.spool_path)
+        db.commit()
+    _inc("stale", len(stale))
+
+
+def _worker():
+    while not _stopping.is_set():
+        try:
+            job = _claim_job()
+        except Exception as e:
+            print("❌ Ошибка выборки задачи загрузки:", str(e))
+            job = None
+        if job is not None:
+            process_job(job)
+            continue
+        try:
+            fail_stale_jobs()
+        except Exception as e:
+            print("❌ Ошибка проверки зависших загрузок:", str(e))
+        # Новая задача этого процесса будит воркер сразу; задачи других процессов — по опросу
+        _wake.wait(UPLOAD_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_upload_workers():
+    if _workers and not _stopping.is_set():
+        return
+    # Потоки прошлого запуска ещё дописывают кусок — дождёмся их, иначе работали бы два набора воркеров
+    for t in _workers:
+        t.join()
+    _workers.clear()
+    _stopping.clear()
+    for i in range(UPLOAD_WORKERS):
+        t = threading.Thread(target=_worker, name=f"upload-worker-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+    print(f"✅ Запущено воркеров загрузки CSV: {UPLOAD_WORKERS}, spool: {UPLOAD_SPOOL_DIR}")
+
+
+def stop_upload_workers():
+    # Текущий кусок дописывается до конца; незавершённая задача останется running и уйдёт в failed по heartbeat
+    _stopping.set()
+    _wake.set()
+    for t in _workers:
+        t.join(UPLOAD_STOP_TIMEOUT)
+    _workers[:] = [t for t in _workers if t.is_alive()]
+    if _workers:
+        print(f"⚠️ Воркеры загрузки CSV не остановились за {UPLOAD_STOP_TIMEOUT}с: {len(_workers)}")
+
+
+def get_upload_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["workers"] = sum(1 for t in _workers if t.is_alive())
+    return stats
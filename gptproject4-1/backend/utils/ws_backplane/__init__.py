@@ -0,0 +1,201 @@
+import json
+import os
+import select
+import threading
+import time
+import uuid
+
+# 📡 Шина между процессами для WS-рассылок. Сокеты живут в памяти своего воркера Uvicorn,
+# поэтому событие «у компании новые логи» должно дойти до каждого процесса:
+#   local    — один процесс (и тесты): событие сразу уходит своему обработчику;
+#   postgres — LISTEN/NOTIFY в той же базе, без отдельного брокера.
+# Свой процесс обрабатывает событие сразу, а эхо собственного NOTIFY отбрасывается по ORIGIN_ID.
+# Вместе с событием едут данные отправителя (collect — например, дельты агрегатов дашборда):
+# получатель применяет их через on_remote до рассылки, иначе разослал бы устаревшие цифры.
+# Если данные потерялись (сбой NOTIFY) или не влезли в лимит PostgreSQL, событие помечается reload.
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "local")
+WS_BACKPLANE_CHANNEL = os.getenv("WS_BACKPLANE_CHANNEL", "ws_company_updates")
+# События за это окно склеиваются: один NOTIFY на компанию, а не на каждый лог
+WS_BACKPLANE_FLUSH_SECONDS = float(os.getenv("WS_BACKPLANE_FLUSH_SECONDS", "0.1"))
+# Payload NOTIFY в PostgreSQL ограничен 8000 байт
+NOTIFY_MAX_BYTES = 7900
+
+ORIGIN_ID = uuid.uuid4().hex[:12]
+
+_handler = None       # handler(company_id, channels) — потокобезопасный, см. ws_manager
+_on_reconnect = None  # зовётся после переподключения LISTEN: пропущенные события надо наверстать
+_on_remote = None     # on_remote(company_id, data) — до _handler, только для событий других процессов
+_collect = None       # collect(company_id) -> dict | None — данные этого процесса для соседей
+_backend = None
+_pending_lock = threading.Lock()
+_pending = {}  # company_id -> set(каналы), ждут NOTIFY
+_reload = set()  # компании, чьи данные из collect потеряны: следующий NOTIFY уйдёт с reload
+_wake = threading.Event()
+_stopping = threading.Event()
+_threads = []
+_stats = {"published": 0, "notified": 0, "received": 0, "echo_skipped": 0, "reconnects": 0, "errors": 0, "oversized": 0}
+
+
+def start_backplane(handler, on_reconnect=None, on_remote=None, collect=None):
+    global _handler, _on_reconnect, _on_remote, _collect, _backend
+    if _backend is not None:
+        return
+    _handler = handler
+    _on_reconnect = on_reconnect
+    _on_remote = on_remote
+    _collect = collect
+    _backend = WS_BACKPLANE
+    if _backend == "postgres":
+        _stopping.clear()
+        for target, name in ((_publish_loop, "ws-backplane-publisher"), (_listen_loop, "ws-backplane-listener")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            _threads.append(t)
+    elif _backend != "local":
+        raise ValueError(f"Неизвестный WS_BACKPLANE: {_backend}")
+    print(f"✅ WS backplane: {_backend} (origin={ORIGIN_ID})")
+
+
+def stop_backplane():
+    global _backend
+    _stopping.set()
+    _wake.set()
+    _threads.clear()
+    _backend = None
+
+
+def publish_company_update(company_id: str, channels):
+    """Потокобезопасно. Свои сокеты — сразу, остальным процессам — через шину."""
+    channels = tuple(channels)
+    _stats["published"] += 1
+    _handler(company_id, channels)
+    if _backend != "postgres":
+        return
+    with _pending_lock:
+        _pending.setdefault(company_id, set()).update(channels)
+    _wake.set()
+
+
+def _connect():
+    # Отдельное соединение мимо пула: LISTEN держит его всё время жизни процесса
+    from backend.database import engine
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    conn = engine.dialect.connect(*cargs, **cparams)
+    conn.autocommit = True
+    return conn
+
+
+def _close(conn):
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def build_payload(company_id: str, channels) -> str:
+    event = {"origin": ORIGIN_ID, "company_id": company_id, "channels": sorted(channels)}
+    with _pending_lock:
+        reload = company_id in _reload
+        _reload.discard(company_id)
+    data = _collect(company_id) if _collect else None
+    if reload:
+        event["reload"] = True
+    elif data:
+        event["data"] = data
+    payload = json.dumps(event)
+    if len(payload.encode()) > NOTIFY_MAX_BYTES:
+        _stats["oversized"] += 1
+        event.pop("data", None)
+        event["reload"] = True
+        payload = json.dumps(event)
+    return payload
+
+
+def _publish_loop():
+    conn = None
+    while not _stopping.is_set():
+        _wake.wait()
+        time.sleep(WS_BACKPLANE_FLUSH_SECONDS)
+        _wake.clear()
+        with _pending_lock:
+            batch = dict(_pending)
+            _pending.clear()
+        if not batch:
+            continue
+        try:
+            conn = conn or _connect()
+            with conn.cursor() as cursor:
+                for company_id, channels in list(batch.items()):
+                    payload = build_payload(company_id, channels)
+                    try:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (WS_BACKPLANE_CHANNEL, payload))
+                    except Exception:
+                        # Данные collect уже забраны — соседям придётся перечитать компанию целиком
+                        with _pending_lock:
+                            _reload.add(company_id)
+                        raise
+                    batch.pop(company_id)
+                    _stats["notified"] += 1
+        except Exception as e:
+            _stats["errors"] += 1
+            print("❌ Ошибка NOTIFY WS backplane:", str(e))
+            _close(conn)
+            conn = None
+            # Вернём пачку в очередь: следующая попытка — после паузы
+            with _pending_lock:
+                for company_id, channels in batch.items():
+                    _pending.setdefault(company_id, set()).update(channels)
+            _wake.set()
+            time.sleep(1)
+    _close(conn)
+
+
+def _dispatch(payload: str):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        return
+    if event.get("origin") == ORIGIN_ID:
+        _stats["echo_skipped"] += 1
+        return
+    _stats["received"] += 1
+    if _on_remote and (event.get("reload") or event.get("data")):
+        _on_remote(event["company_id"], None if event.get("reload") else event["data"])
+    _handler(event["company_id"], tuple(event.get("channels") or ()))
+
+
+def _listen_loop():
+    delay = 1
+    connected_before = False
+    while not _stopping.is_set():
+        conn = None
+        try:
+            conn = _connect()
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{WS_BACKPLANE_CHANNEL}"')
+            if connected_before:
+                _stats["reconnects"] += 1
+                if _on_reconnect:
+                    _on_reconnect()
+            connected_before = True
+            delay = 1
+            while not _stopping.is_set():
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _dispatch(conn.notifies.pop(0).payload)
+        except Exception as e:
+            _stats["errors"] += 1
+            print(f"❌ WS backplane LISTEN отвалился, переподключение через {delay}с:", str(e))
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+        finally:
+            _close(conn)
+
+
+def get_backplane_stats() -> dict:
+    with _pending_lock:
+        pending = len(_pending)
+    return {**_stats, "backend": _backend, "origin": ORIGIN_ID, "pending": pending}
@@ -1,4 +1,10 @@
 import asyncio
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
 
 from backend.models import LogAnalysis
@@ -6,9 +12,18 @@ from backend.schemas import LogAnalysisOut
 from backend.utils.dashboard_utils import get_dashboard_stats
 from backend.utils.companies_utils import get_user_count_for_company
 from backend.utils.log_utils import get_recent_logs
+from backend.utils.geo_utils import lookup_ip
+from backend.utils.aggregate_utils import get_aggregates, drop_company, start_delta_export, take_delta, apply_delta
+from backend.utils.ws_backplane import (
+    start_backplane, stop_backplane, publish_company_update, get_backplane_stats, WS_BACKPLANE
+)
 from backend.database import SessionLocal  # Импортируй фабрику сессий
 import json
-import traceback
+
+try:
+    import orjson
+except ImportError:  # необязательное ускорение кодирования WS-сообщений
+    orjson = None
 
 active_connections = {}
 
@@ -63,56 +78,126 @@ def fix_stats(stats):
 
     return stats
 
-async def notify_dashboard_update(company_id: str):
-    print("DEBUG: active_connections =", active_connections)
-
+# 🧵 Сборка payload'ов — синхронные запросы SQLAlchemy, GeoIP и кодирование больших сообщений —
+# идёт в отдельном пуле потоков, а не в event loop: иначе пока считается история одной компании,
+# стоят все пинги WebSocket и все async-эндпоинты. Время каждой сборки видно в /system/pipeline.
+WS_BUILD_WORKERS = int(os.getenv("WS_BUILD_WORKERS", "4"))
+LOOP_LAG_INTERVAL = 1.0
+
+_build_executor = ThreadPoolExecutor(max_workers=WS_BUILD_WORKERS, thread_name_prefix="ws-build")
+_build_lock = threading.Lock()
+_build_stats = {}  # имя сборки -> {"calls", "errors", "total_ms", "max_ms"}
+_build_in_flight = 0
+_loop_lag = {"last_ms": 0.0, "max_ms": 0.0}
+
+
+def _timed(name: str, fn, *args):
+    global _build_in_flight
+    with _build_lock:
+        _build_in_flight += 1
+    started = time.perf_counter()
+    failed = False
+    try:
+        return fn(*args)
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        with _build_lock:
+            _build_in_flight -= 1
+            stats = _build_stats.setdefault(name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += failed
+            stats["total_ms"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+
+
+def _with_session(builder, company_id: str, *args):
+    # Сессия открывается и закрывается в потоке пула: Session не должна переходить между потоками
     db = SessionLocal()
     try:
-        if company_id not in active_connections:
-            return
+        return builder(db, company_id, *args)
+    finally:
+        db.close()
 
-        stats = get_dashboard_stats(db, company_id)
-        user_count = get_user_count_for_company(db, company_id)
-        recent_logs = get_recent_logs(db, company_id, limit=5)
 
-        print("recent_logs types:", [type(log) for log in recent_logs])
+async def run_blocking(name: str, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_build_executor, _timed, name, fn, *args)
+
+
+async def run_builder(name: str, builder, company_id: str, *args):
+    """builder(db, company_id, *args) в пуле сборки со своей сессией."""
+    return await run_blocking(name, _with_session, builder, company_id, *args)
+
+
+async def _monitor_loop_lag():
+    # Насколько позже обещанного просыпается sleep — прямая мера того, что loop чем-то занят
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max((time.perf_counter() - started - LOOP_LAG_INTERVAL) * 1000, 0.0)
+        _loop_lag["last_ms"] = round(lag, 2)
+        _loop_lag["max_ms"] = round(max(_loop_lag["max_ms"], lag), 2)
+
+
+def get_build_stats() -> dict:
+    with _build_lock:
+        builders = {
+            name: {
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else None,
+                "max_ms": round(stats["max_ms"], 2),
+            }
+            for name, stats in _build_stats.items()
+        }
+        in_flight = _build_in_flight
+    return {"workers": WS_BUILD_WORKERS, "in_flight": in_flight, "builders": builders, "loop_lag": dict(_loop_lag)}
 
-        if not isinstance(stats, dict):
-            try:
-                stats = dict(stats)
-            except Exception:
-                stats = {"value": str(stats)}
 
-        if not isinstance(user_count, int):
+def build_dashboard_payload(db: Session, company_id: str) -> dict:
+    stats = get_dashboard_stats(db, company_id)
+    user_count = get_user_count_for_company(db, company_id)
+    recent_logs = get_recent_logs(db, company_id, limit=5)
+
+    if not isinstance(stats, dict):
+        try:
+            stats = dict(stats)
+        except Exception:
+            stats = {"value": str(stats)}
+
+    if not isinstance(user_count, int):
+        try:
+            user_count = int(user_count[0])
+        except Exception:
             try:
-                user_count = int(user_count[0])
+                user_count = int(user_count)
             except Exception:
-                try:
-                    user_count = int(user_count)
-                except Exception:
-                    user_count = 0
+                user_count = 0
 
-        stats = fix_stats(stats)
+    return {
+        "stats": fix_stats(stats),
+        "userCount": user_count,
+        "recentLogs": [LogAnalysisOut.from_orm(log).dict() for log in recent_logs],
+    }
 
-        message = json.dumps({
-            "type": "dashboard_update",
-            "stats": stats,
-            "userCount": user_count,
-            "recentLogs": [LogAnalysisOut.from_orm(log).dict() for log in recent_logs],
-        }, default=str)
 
-        print("Отправляем обновление по WS для company_id - notify_dashboard_update:", company_id, "клиентов:",
-              len(active_connections.get(company_id, [])))
+async def notify_dashboard_update(company_id: str):
+    legacy, delta = split_subscribers("dashboard", company_id)
+    if not legacy and not delta:
+        return
 
-        for ws in active_connections.get(company_id, [])[:]:
-            try:
-                await ws.send_text(message)
-            except Exception as e:
-                print("Ошибка при отправке ws:", e)
-                traceback.print_exc()
-                remove_connection(company_id, ws)
-    finally:
-        db.close()
+    payload = await run_builder("dashboard", build_dashboard_payload, company_id)
+
+    print("Отправляем обновление по WS для company_id - notify_dashboard_update:", company_id,
+          "клиентов:", len(legacy), "delta:", len(delta))
+
+    if legacy:
+        message = await run_blocking("dashboard_encode", encode_message, {"type": "dashboard_update", **payload})
+        send_to_sockets("dashboard", company_id, legacy, message)
+    if delta:
+        await publish_delta("dashboard", company_id, payload)
 
 
 ###########################################################################################################################
@@ -136,31 +221,40 @@ def remove_threats_connection(company_id, ws):
         if not active_threats_connections[company_id]:
             del active_threats_connections[company_id]
 
+THREATS_WINDOW = 50
+
+
+def build_threats_rows(db: Session, company_id: str) -> list[dict]:
+    logs = (
+        db.query(LogAnalysis)
+        .filter_by(company_id=company_id)
+        .order_by(LogAnalysis.id.desc())
+        .limit(THREATS_WINDOW)
+        .all()
+    )
+    return [LogAnalysisOut.from_orm(l).dict() for l in logs]
+
+
+def threats_state(rows: list[dict]) -> dict:
+    # Строки по id: в дельту попадают только новые строки и изменённые поля (статус, результат анализа),
+    # а вытесненные из окна последних THREATS_WINDOW приходят как null
+    return {"threats": {str(row["id"]): row for row in rows}}
+
+
 async def notify_threats_update(company_id: str):
-    db = SessionLocal()
-    try:
-        logs = (
-            db.query(LogAnalysis)
-            .filter_by(company_id=company_id)
-            .order_by(LogAnalysis.id.desc())
-            .limit(50)
-            .all()
-        )
-        logs_out = [LogAnalysisOut.from_orm(l).dict() for l in logs]
-        message = {
-            "type": "threats_update",
-            "threats": logs_out,
-        }
-        print("Отправляем обновление по WS для company_id - notify_threats_update:", company_id, "клиентов:",
-              len(active_threats_connections.get(company_id, [])))
-        for ws in active_threats_connections.get(company_id, [])[:]:
-            try:
-                await ws.send_text(json.dumps(message, default=str))
-            except Exception as e:
-                print("WS send error:", e)
-                remove_threats_connection(company_id, ws)
-    finally:
-        db.close()
+    legacy, delta = split_subscribers("threats", company_id)
+    if not legacy and not delta:
+        return
+    logs_out = await run_builder("threats", build_threats_rows, company_id)
+
+    print("Отправляем обновление по WS для company_id - notify_threats_update:", company_id,
+          "клиентов:", len(legacy), "delta:", len(delta))
+
+    if legacy:
+        message = await run_blocking("threats_encode", encode_message, {"type": "threats_update", "threats": logs_out})
+        send_to_sockets("threats", company_id, legacy, message)
+    if delta:
+        await publish_delta("threats", company_id, threats_state(logs_out))
 
 ###########################################################################################################################
 
@@ -182,118 +276,424 @@ def remove_analytics_connection(company_id, ws):
         if not active_analytics_connections[company_id]:
             del active_analytics_connections[company_id]
 
-import json
-from backend.database import SessionLocal
+IP_REGEX = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+
+# Гео для delta-клиентов считается инкрементально: по company_id помним последний учтённый id лога
+# и счётчики стран, так что каждая рассылка читает только новые логи, а не всю историю
+_geo_lock = threading.Lock()
+_geo_cache = {}  # company_id -> {"last_id": int, "countries": Counter}
+
+
+def _log_ips(log) -> set:
+    return set(IP_REGEX.findall(f"{log.ip or ''} {log.log_text or ''}"))
+
+
+def build_geo_list(db: Session, company_id: str) -> list[dict]:
+    """Полный гео-массив для старых клиентов: по сырым логам, нужны IP, которых нет в агрегатах."""
+    logs = db.query(LogAnalysis.ip, LogAnalysis.log_text).filter_by(company_id=company_id).all()
+    geodata = []
+    for log in logs:
+        for ip in _log_ips(log):
+            geo = lookup_ip(ip)
+            geodata.append({
+                "ip": ip,
+                "country": geo["country"] or "Unknown",
+                "city": geo["city"] or "—",
+                "lat": geo["lat"],
+                "lon": geo["lon"],
+                "asn": geo["asn"],
+                "organization": geo["organization"]
+            })
+    return geodata
+
+
+def build_geo_counts(db: Session, company_id: str) -> dict:
+    with _geo_lock:
+        cached = _geo_cache.get(company_id) or {"last_id": 0, "countries": Counter()}
+        last_id, countries = cached["last_id"], Counter(cached["countries"])
+    logs = (
+        db.query(LogAnalysis.id, LogAnalysis.ip, LogAnalysis.log_text)
+        .filter(LogAnalysis.company_id == company_id, LogAnalysis.id > last_id)
+        .order_by(LogAnalysis.id)
+        .all()
+    )
+    for log in logs:
+        for ip in _log_ips(log):
+            countries[lookup_ip(ip)["country"] or "Unknown"] += 1
+        last_id = log.id
+    with _geo_lock:
+        _geo_cache[company_id] = {"last_id": last_id, "countries": countries}
+    return dict(countries)
+
+
+def build_analytics_payload(db: Session, company_id: str) -> dict:
+    aggregates = get_aggregates(db, company_id)
+    return {
+        "activity": aggregates["hourly"],
+        "severity": aggregates["severity"],
+        "attack_types": aggregates["attack_types"],
+        # Пороги риска — проценты (30/70), как в /analytics/summary
+        "risk_levels": aggregates["risk_levels"],
+        "mitre_data": dict(Counter(aggregates["mitre"]).most_common(5)),
+    }
+
+
+def build_analytics_state(db: Session, company_id: str) -> dict:
+    # delta-клиенты получают гео как {страна: количество} — фронт и так сворачивает массив в эту форму
+    return {**build_analytics_payload(db, company_id), "geo": build_geo_counts(db, company_id)}
+
+
+def _build_analytics_parts(db: Session, company_id: str, with_geo_list: bool, with_geo_counts: bool):
+    payload = build_analytics_payload(db, company_id)
+    geo_list = build_geo_list(db, company_id) if with_geo_list else None
+    geo_counts = build_geo_counts(db, company_id) if with_geo_counts else None
+    return payload, geo_list, geo_counts
 
-###################################################
 
 async def notify_analytics_update(company_id: str):
-    db = SessionLocal()
+    legacy, delta = split_subscribers("analytics", company_id)
+    if not legacy and not delta:
+        return
+    payload, geo_list, geo_counts = await run_builder("analytics", _build_analytics_parts, company_id, bool(legacy), bool(delta))
+
+    print("Отправляем обновление по WS для company_id - notify_analytics_update:", company_id,
+          "клиентов:", len(legacy), "delta:", len(delta))
+
+    if legacy:
+        # Полный гео-массив бывает большим — кодируем тоже вне loop
+        message = await run_blocking("analytics_encode", encode_message, {"type": "analytics_update", **payload, "geo": geo_list})
+        send_to_sockets("analytics", company_id, legacy, message)
+    if delta:
+        await publish_delta("analytics", company_id, {**payload, "geo": geo_counts})
+
+###########################################################################################################################
+
+# 📮 Исходящие очереди: у каждого сокета своя ограниченная очередь и своя задача-отправитель,
+# поэтому рассылка компании не ждёт самого медленного клиента. Клиент, который не успевает
+# разбирать очередь (переполнение или отправка дольше WS_SEND_TIMEOUT), отключается с кодом 1013 —
+# терять сообщения молча нельзя: у delta-клиентов разъедется seq.
+WS_CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+SLOW_CONSUMER_CLOSE_CODE = 1013  # Try Again Later
+
+_outboxes = {}  # ws -> {"queue", "task", "channel", "company_id"}
+_outbox_stats = {"queued": 0, "sent": 0, "send_errors": 0, "evicted_slow": 0, "max_depth": 0}
+
+
+def encode_message(message: dict) -> str:
+    """Один раз на рассылку, а не на каждый сокет."""
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(message, default=str)
+
+
+def open_outbox(channel: str, company_id: str, ws):
+    queue = asyncio.Queue(maxsize=WS_CLIENT_QUEUE_SIZE)
+    _outboxes[ws] = {
+        "queue": queue,
+        "task": asyncio.create_task(_sender(ws, queue)),
+        "channel": channel,
+        "company_id": company_id,
+    }
+
+
+def close_outbox(ws):
+    outbox = _outboxes.pop(ws, None)
+    if outbox is not None:
+        outbox["task"].cancel()
+
+
+def enqueue_message(ws, message: str) -> bool:
+    outbox = _outboxes.get(ws)
+    if outbox is None:
+        return False
     try:
-        from collections import Counter
-        from sqlalchemy import extract, func
-        import re
-        import geoip2.database
-        from backend.models import LogAnalysis
-
-        hourly_counts = db.query(
-            extract('hour', LogAnalysis.timestamp).label("hour"),
-            func.count().label("count")
-        ).filter(
-            LogAnalysis.company_id == company_id
-        ).group_by("hour").order_by("hour").all()
-        activity = [0] * 24
-        for hour, count in hourly_counts:
-            activity[int(hour)] = count
-
-        logs = db.query(LogAnalysis).filter_by(company_id=company_id).all()
-        ip_regex = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
-        geodata = []
+        outbox["queue"].put_nowait(message)
+    except asyncio.QueueFull:
+        _outbox_stats["evicted_slow"] += 1
+        print(f"⚠️ WS клиент не успевает ({outbox['channel']}, company_id={outbox['company_id']}), отключаем")
+        _evict(ws)
+        return False
+    _outbox_stats["queued"] += 1
+    _outbox_stats["max_depth"] = max(_outbox_stats["max_depth"], outbox["queue"].qsize())
+    return True
+
+
+async def _sender(ws, queue: asyncio.Queue):
+    while True:
+        message = await queue.get()
         try:
-            city_reader = geoip2.database.Reader("backend/data/GeoLite2-City.mmdb")
-            asn_reader = geoip2.database.Reader("backend/data/GeoLite2-ASN.mmdb")
+            await asyncio.wait_for(ws.send_text(message), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print("GeoIP DB open error:", e)
-            city_reader = None
-            asn_reader = None
-
-        for log in logs:
-            text = f"{log.ip or ''} {log.log_text or ''}"
-            ips = set(ip_regex.findall(text))
-            for ip in ips:
-                try:
-                    if city_reader and asn_reader:
-                        city_info = city_reader.city(ip)
-                        asn_info = asn_reader.asn(ip)
-                        country = city_info.country.name or "Unknown"
-                        city = city_info.city.name or "—"
-                        lat = city_info.location.latitude
-                        lon = city_info.location.longitude
-                        asn = asn_info.autonomous_system_number
-                        org = asn_info.autonomous_system_organization
-                    else:
-                        country, city, lat, lon, asn, org = "Unknown", "—", None, None, None, None
-                except Exception:
-                    country, city, lat, lon, asn, org = "Unknown", "—", None, None, None, None
-
-                geodata.append({
-                    "ip": ip,
-                    "country": country,
-                    "city": city,
-                    "lat": lat,
-                    "lon": lon,
-                    "asn": asn,
-                    "organization": org
-                })
-
-        if city_reader: city_reader.close()
-        if asn_reader: asn_reader.close()
-
-        windows_counter = Counter()
-        syslog_counter = Counter()
-        for log in logs:
-            if log.severity_windows:
-                windows_counter[log.severity_windows] += 1
-            if log.severity_syslog:
-                syslog_counter[log.severity_syslog] += 1
-        severity = {
-            "windows": dict(windows_counter),
-            "syslog": dict(syslog_counter)
-        }
+            _outbox_stats["send_errors"] += 1
+            print("WS send error:", e)
+            _evict(ws, from_sender=True)
+            return
+        _outbox_stats["sent"] += 1
 
-        types = Counter([log.attack_type for log in logs])
-        risks = {"low": 0, "medium": 0, "high": 0}
-        mitre = Counter([log.mitre_id for log in logs if log.mitre_id])
-        for log in logs:
-            p = log.probability
-            if p < 0.3:
-                risks["low"] += 1
-            elif p < 0.7:
-                risks["medium"] += 1
-            else:
-                risks["high"] += 1
-        top_mitre = dict(mitre.most_common(5))
-        attack_types = dict(types)
-        risk_levels = risks
-
-        message = {
-            "type": "analytics_update",
-            "activity": activity,
-            "geo": geodata,
-            "severity": severity,
-            "attack_types": attack_types,
-            "risk_levels": risk_levels,
-            "mitre_data": top_mitre
-        }
 
-        print("Отправляем обновление по WS для company_id - notify_analytics_update:", company_id, "клиентов:",
-              len(active_analytics_connections.get(company_id, [])))
+def _evict(ws, from_sender: bool = False):
+    outbox = _outboxes.pop(ws, None)
+    if outbox is None:
+        return
+    unregister_delta_client(outbox["channel"], outbox["company_id"], ws)
+    _removers[outbox["channel"]](outbox["company_id"], ws)
+    if not from_sender:
+        outbox["task"].cancel()
+    asyncio.ensure_future(_close_quietly(ws))
 
-        for ws in active_analytics_connections.get(company_id, [])[:]:
-            try:
-                await ws.send_text(json.dumps(message, default=str))
-            except Exception as e:
-                print("WS send error (analytics):", e)
-                remove_analytics_connection(company_id, ws)
+
+async def _close_quietly(ws):
+    try:
+        await ws.close(code=SLOW_CONSUMER_CLOSE_CODE)
+    except Exception:
+        pass
+
+
+def get_outbox_stats() -> dict:
+    return {
+        **_outbox_stats,
+        "clients": len(_outboxes),
+        "pending": sum(outbox["queue"].qsize() for outbox in _outboxes.values()),
+        "encoder": "orjson" if orjson is not None else "json",
+    }
+
+
+# 🔁 Delta-протокол (?protocol=delta): при подключении клиент получает снапшот {channel}_snapshot,
+# дальше — только изменения {channel}_delta с номером seq, который растёт на 1 по каналу компании.
+# Пропуск seq (или любое сомнение) клиент лечит сообщением {"type": "resync"} — в ответ новый снапшот.
+# Формат changes: вложенные словари мержатся по ключам, null — ключ удалён, списки заменяются целиком.
+
+_delta_sockets = set()
+_delta_states = {}  # (канал, company_id) -> {"seq": int, "data": dict | None, "lock": asyncio.Lock}
+_delta_stats = {"deltas": 0, "unchanged": 0, "snapshots": 0, "resyncs": 0}
+
+_removers = {
+    "dashboard": remove_connection,
+    "threats": remove_threats_connection,
+    "analytics": remove_analytics_connection,
+}
+_connections = {
+    "dashboard": active_connections,
+    "threats": active_threats_connections,
+    "analytics": active_analytics_connections,
+}
+_state_builders = {
+    "dashboard": build_dashboard_payload,
+    "threats": lambda db, company_id: threats_state(build_threats_rows(db, company_id)),
+    "analytics": build_analytics_state,
+}
+
+
+def split_subscribers(channel: str, company_id: str) -> tuple[list, list]:
+    sockets = _connections[channel].get(company_id, [])
+    legacy = [ws for ws in sockets if ws not in _delta_sockets]
+    delta = [ws for ws in sockets if ws in _delta_sockets]
+    return legacy, delta
+
+
+def send_to_sockets(channel: str, company_id: str, sockets: list, message: str):
+    """Не ждёт сокеты: сообщение (уже закодированное один раз) кладётся в очередь каждого клиента."""
+    for ws in sockets:
+        enqueue_message(ws, message)
+
+
+def diff_state(old, new) -> dict:
+    """Рекурсивная разница словарей: изменённые ключи, удалённые — None."""
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff_state(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif old[key] != value:
+            changes[key] = value
+    for key in old:
+        if key not in new:
+            changes[key] = None
+    return changes
+
+
+def _delta_state(channel: str, company_id: str) -> dict:
+    key = (channel, company_id)
+    if key not in _delta_states:
+        _delta_states[key] = {"seq": 0, "data": None, "lock": asyncio.Lock()}
+    return _delta_states[key]
+
+
+def register_delta_client(channel: str, company_id: str, ws):
+    _delta_sockets.add(ws)
+    _delta_state(channel, company_id)
+
+
+def unregister_delta_client(channel: str, company_id: str, ws):
+    _delta_sockets.discard(ws)
+    # Пока состояние никто не читает, оно устаревает — проще выбросить и посчитать заново при подключении
+    if not split_subscribers(channel, company_id)[1]:
+        _delta_states.pop((channel, company_id), None)
+        if channel == "analytics":
+            with _geo_lock:
+                _geo_cache.pop(company_id, None)
+
+
+def _snapshot_message(channel: str, state: dict) -> str:
+    return encode_message({"type": f"{channel}_snapshot", "seq": state["seq"], "data": state["data"]})
+
+
+async def publish_delta(channel: str, company_id: str, data: dict):
+    state = _delta_state(channel, company_id)
+    async with state["lock"]:
+        if state["data"] is None:
+            # Состояния ещё нет (первый клиент ждёт снапшот) — просто запоминаем
+            state["seq"] += 1
+            state["data"] = data
+            return
+        changes = diff_state(state["data"], data)
+        if not changes:
+            _delta_stats["unchanged"] += 1
+            return
+        state["seq"] += 1
+        state["data"] = data
+        message = encode_message({"type": f"{channel}_delta", "seq": state["seq"], "changes": changes})
+        _delta_stats["deltas"] += 1
+        send_to_sockets(channel, company_id, split_subscribers(channel, company_id)[1], message)
+
+
+async def send_snapshot(channel: str, company_id: str, ws, resync: bool = False):
+    state = _delta_state(channel, company_id)
+    async with state["lock"]:
+        if state["data"] is None:
+            state["data"] = await run_builder(f"{channel}_snapshot", _state_builders[channel], company_id)
+            state["seq"] += 1
+        # В очередь под замком: дельта со следующим seq не может обогнать снапшот
+        enqueue_message(ws, _snapshot_message(channel, state))
+    _delta_stats["resyncs" if resync else "snapshots"] += 1
+
+
+def get_delta_stats() -> dict:
+    return {**_delta_stats, "clients": len(_delta_sockets), "states": len(_delta_states)}
+
+
+# ⏱ Планировщик рассылок: вызывающие только помечают компанию «грязной», а payload считается
+# не чаще раза в окно WS_BROADCAST_WINDOW на канал — пачка из 1000 логов даёт одну рассылку, а не 3000
+WS_BROADCAST_WINDOW = float(os.getenv("WS_BROADCAST_WINDOW", "0.5"))
+
+BROADCAST_CHANNELS = {
+    "dashboard": (active_connections, notify_dashboard_update),
+    "threats": (active_threats_connections, notify_threats_update),
+    "analytics": (active_analytics_connections, notify_analytics_update),
+}
+
+_broadcast_loop = None
+_scheduled = set()  # (канал, company_id), для которых уже стоит таймер; трогается только из event loop
+_running = set()    # (канал, company_id), чей payload считается прямо сейчас
+_broadcast_stats = {"requested": 0, "coalesced": 0, "skipped_no_subscribers": 0, "broadcasts": 0, "errors": 0}
+
+
+def start_broadcast_scheduler(loop: asyncio.AbstractEventLoop):
+    global _broadcast_loop
+    _broadcast_loop = loop
+    # События с других воркеров приходят через шину и попадают в тот же планировщик
+    # Дельты агрегатов едут в самом событии: соседний процесс применяет их к своим счётчикам в памяти,
+    # а не перечитывает всю историю компании из базы
+    if WS_BACKPLANE == "postgres":
+        start_delta_export()
+    start_backplane(
+        _schedule_local,
+        on_reconnect=_resync_local_subscribers,
+        on_remote=apply_delta,
+        collect=take_delta
+    )
+    loop.create_task(_monitor_loop_lag())
+
+
+def stop_broadcast_scheduler():
+    stop_backplane()
+    _build_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def schedule_company_update(company_id: str, channels=tuple(BROADCAST_CHANNELS)):
+    """Потокобезопасно: можно звать из обработчиков, BackgroundTasks и потоков воркеров.
+    Событие получат и сокеты других процессов (см. utils/ws_backplane)."""
+    if _broadcast_loop is None or _broadcast_loop.is_closed():
+        return
+    publish_company_update(company_id, channels)
+
+
+def _schedule_local(company_id: str, channels: tuple):
+    if _broadcast_loop is None or _broadcast_loop.is_closed():
+        return
+    _broadcast_loop.call_soon_threadsafe(_mark_dirty, company_id, tuple(channels))
+
+
+def _resync_local_subscribers():
+    # Пока LISTEN был отключён, события могли потеряться — обновляем всех своих подписчиков
+    _broadcast_loop.call_soon_threadsafe(_mark_all_dirty)
+
+
+def _mark_all_dirty():
+    for channel, (subscribers, _) in BROADCAST_CHANNELS.items():
+        for company_id in list(subscribers):
+            # Агрегатам в памяти тоже не доверяем: пропущенные события их не обновили
+            drop_company(company_id)
+            _mark_dirty(company_id, (channel,))
+
+
+def _mark_dirty(company_id: str, channels: tuple):
+    for channel in channels:
+        _broadcast_stats["requested"] += 1
+        subscribers, _ = BROADCAST_CHANNELS[channel]
+        if company_id not in subscribers:
+            _broadcast_stats["skipped_no_subscribers"] += 1
+            continue
+        key = (channel, company_id)
+        if key in _scheduled:
+            _broadcast_stats["coalesced"] += 1
+            continue
+        _scheduled.add(key)
+        _broadcast_loop.call_later(WS_BROADCAST_WINDOW, _flush, key)
+
+
+def _flush(key):
+    if key in _running:
+        # Предыдущий расчёт ещё идёт — переносим на следующее окно, чтобы не считать параллельно
+        _broadcast_loop.call_later(WS_BROADCAST_WINDOW, _flush, key)
+        return
+    _scheduled.discard(key)
+    channel, company_id = key
+    subscribers, _ = BROADCAST_CHANNELS[channel]
+    if company_id not in subscribers:
+        _broadcast_stats["skipped_no_subscribers"] += 1
+        return
+    _running.add(key)
+    asyncio.ensure_future(_broadcast(key))
+
+
+async def _broadcast(key):
+    channel, company_id = key
+    _, notify = BROADCAST_CHANNELS[channel]
+    try:
+        await notify(company_id)
+        _broadcast_stats["broadcasts"] += 1
+    except Exception as e:
+        _broadcast_stats["errors"] += 1
+        print(f"Ошибка рассылки {channel} для company_id={company_id}:", e)
     finally:
-        db.close()
\ No newline at end of file
+        _running.discard(key)
+
+
+def get_broadcast_stats() -> dict:
+    return {
+        **_broadcast_stats,
+        "window_seconds": WS_BROADCAST_WINDOW,
+        "scheduled": len(_scheduled),
+        "subscribers": {channel: sum(len(v) for v in subs.values()) for channel, (subs, _) in BROADCAST_CHANNELS.items()},
+        "delta": get_delta_stats(),
+        "outbound": get_outbox_stats(),
+        "backplane": get_backplane_stats(),
+        "build": get_build_stats(),
+    }
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base
+from backend.models import LogAnalysis
+from backend.utils import aggregate_utils
+from backend.utils.aggregate_utils import PENDING_ATTACK_TYPE, get_aggregates, record_logs, record_analysis
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def clean_states():
+    aggregate_utils._states.clear()
+    yield
+    aggregate_utils._states.clear()
+
+
+def _log(attack_type, probability=0, status="done"):
+    return LogAnalysis(company_id="acme", timestamp=datetime(2025, 1, 1, 12), attack_type=attack_type,
+                       probability=probability, analysis_status=status, log_text="x")
+
+
+def test_pending_logs_are_not_attacks_on_load(db):
+    db.add_all([_log("Brute Force", 90), _log("Нет атаки"), _log(PENDING_ATTACK_TYPE, status="pending")])
+    db.commit()
+
+    aggregates = get_aggregates(db, "acme")
+    assert aggregates["total"] == 3
+    assert aggregates["attacks_detected"] == 1
+
+
+def test_pending_log_counts_as_attack_only_after_analysis(db):
+    get_aggregates(db, "acme")
+    pending = _log(PENDING_ATTACK_TYPE, status="pending")
+    record_logs([pending])
+    assert get_aggregates(db, "acme")["attacks_detected"] == 0
+
+    record_analysis("acme", {"attack_type": PENDING_ATTACK_TYPE, "probability": 0},
+                    {"attack_type": "SQL Injection", "probability": 80})
+    aggregates = get_aggregates(db, "acme")
+    assert aggregates["attacks_detected"] == 1
+    assert aggregates["high_risk"] == 1
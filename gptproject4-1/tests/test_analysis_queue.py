@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base
+from backend.models import LogAnalysis, LogRollup
+from backend.utils import analysis_queue
+from backend.utils.log_utils import PENDING_ATTACK_TYPE
+from backend.utils.rollup_utils import record_rollups
+
+GPT_ANSWER = """Тип атаки: Brute Force
+MITRE: T1110
+Вероятность: 90%
+Рекомендации: Заблокировать IP."""
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr(analysis_queue, "SessionLocal", factory)
+
+    calls = []
+    monkeypatch.setattr(analysis_queue, "request_log_analysis", lambda text, *args: calls.append(text) or GPT_ANSWER)
+
+    def no_vectors(texts):
+        raise RuntimeError("модель не загружена")
+    monkeypatch.setattr(analysis_queue, "encode_texts", no_vectors)
+    monkeypatch.setattr(analysis_queue, "send_threat_alert", lambda parsed: None)
+    monkeypatch.setattr(analysis_queue, "schedule_index_update", lambda ids: None)
+
+    with factory() as db:
+        logs = [
+            LogAnalysis(company_id="acme", log_text=f"log {i}", timestamp=datetime.utcnow(),
+                        attack_type=PENDING_ATTACK_TYPE, probability=0, analysis_status="pending")
+            for i in range(3)
+        ]
+        db.add_all(logs)
+        db.flush()
+        record_rollups(db, logs)
+        db.commit()
+    factory.calls = calls
+    yield factory
+    engine.dispose()
+
+
+def minute_rollup_total(db) -> int:
+    return db.query(func.sum(LogRollup.count)).filter(LogRollup.granularity == "minute").scalar()
+
+
+def test_claim_is_exclusive(session_factory):
+    first, _ = analysis_queue.claim_logs([1, 2, 3])
+    second, _ = analysis_queue.claim_logs([1, 2, 3])
+    assert [row.id for row in first] == [1, 2, 3]
+    assert second == []
+
+
+def test_duplicate_queue_entries_are_analysed_once(session_factory):
+    # Тот же пакет в очередях двух процессов (requeue_pending_logs при старте каждого)
+    analysis_queue.process_queued_logs([1, 2, 3])
+    analysis_queue.process_queued_logs([1, 2, 3])
+
+    assert session_factory.calls == ["log 0", "log 1", "log 2"]
+    with session_factory() as db:
+        statuses = {row.analysis_status for row in db.query(LogAnalysis)}
+        assert statuses == {"done"}
+        assert db.query(LogAnalysis.analysis_claimed_at).filter(LogAnalysis.analysis_claimed_at.isnot(None)).count() == 0
+        # Вычли pending, добавили результат — итог не задвоен
+        assert minute_rollup_total(db) == 3
+        brute_force = db.query(func.sum(LogRollup.count)).filter(
+            LogRollup.granularity == "minute", LogRollup.attack_type == "Brute Force"
+        ).scalar()
+        assert brute_force == 3
+
+
+def test_result_is_dropped_when_claim_was_taken_over(session_factory, monkeypatch):
+    real_claim = analysis_queue.claim_logs
+
+    def claim_then_lose(log_ids):
+        entries, claimed_at = real_claim(log_ids)
+        # Пока ждали GPT, лог признали зависшим и его забрал другой воркер
+        with session_factory() as db:
+            db.execute(
+                update(LogAnalysis).where(LogAnalysis.id == 1)
+                .values(analysis_claimed_at=datetime(2000, 1, 1))
+            )
+            db.commit()
+        return entries, claimed_at
+    monkeypatch.setattr(analysis_queue, "claim_logs", claim_then_lose)
+
+    analysis_queue.process_queued_logs([1, 2])
+
+    with session_factory() as db:
+        assert db.get(LogAnalysis, 1).analysis_status == "processing"
+        assert db.get(LogAnalysis, 2).analysis_status == "done"
+        # Роллапы поменялись только для записанного лога
+        pending = db.query(func.sum(LogRollup.count)).filter(
+            LogRollup.granularity == "minute", LogRollup.attack_type == PENDING_ATTACK_TYPE
+        ).scalar()
+        assert pending == 2
+
+
+def test_requeue_reclaims_stale_processing(session_factory, monkeypatch):
+    with session_factory() as db:
+        db.execute(
+            update(LogAnalysis).where(LogAnalysis.id == 1)
+            .values(analysis_status="processing", analysis_claimed_at=datetime(2000, 1, 1))
+        )
+        db.execute(
+            update(LogAnalysis).where(LogAnalysis.id == 2)
+            .values(analysis_status="processing", analysis_claimed_at=datetime.utcnow())
+        )
+        db.commit()
+    queued = []
+    monkeypatch.setattr(analysis_queue, "enqueue_analysis", lambda ids, block=True: queued.extend(ids))
+
+    analysis_queue.requeue_pending_logs()
+
+    # Свежий захват (id=2) — живой воркер, его не трогаем
+    assert queued == [1, 3]
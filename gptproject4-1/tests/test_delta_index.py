@@ -0,0 +1,60 @@
+import faiss
+import numpy as np
+import pytest
+
+from backend import securitygpt
+
+DIM = 8
+
+
+@pytest.fixture
+def delta(monkeypatch, tmp_path):
+    monkeypatch.setattr(securitygpt, "load_resources", lambda: None)
+    monkeypatch.setattr(securitygpt, "delta_index", faiss.IndexIDMap2(faiss.IndexFlatL2(DIM)))
+    monkeypatch.setattr(securitygpt, "DELTA_INDEX_PATH", str(tmp_path / "delta.index"))
+    return securitygpt
+
+
+def vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((n, DIM), dtype=np.float32)
+
+
+def ids_of(index) -> list[int]:
+    return sorted(int(i) for i in faiss.vector_to_array(index.id_map))
+
+
+def test_add_publishes_new_copy(delta):
+    delta.add_to_delta_index([1, 2], vectors(2))
+    published = delta.delta_index
+
+    delta.add_to_delta_index([3], vectors(1, seed=1))
+
+    # Поиск, взявший ссылку до пополнения, видит неизменный снимок
+    assert published.ntotal == 2
+    assert delta.delta_index is not published
+    assert delta.get_delta_ids() == {1, 2, 3}
+
+
+def test_add_compacts_oldest_over_cap(delta, monkeypatch):
+    monkeypatch.setattr(securitygpt, "DELTA_INDEX_MAX", 3)
+    delta.add_to_delta_index([5, 1, 4], vectors(3))
+    delta.add_to_delta_index([2, 6], vectors(2, seed=1))
+
+    assert delta.get_delta_ids() == {4, 5, 6}
+    # id_map и хранилище после remove_ids согласованы: поиск находит сам вектор
+    vec = vectors(2, seed=1)[1:]
+    _, found = delta.delta_index.search(vec, 1)
+    assert found[0][0] == 6
+
+
+def test_snapshot_merges_workers(delta):
+    delta.add_to_delta_index([1, 2], vectors(2))
+    assert delta.snapshot_delta_index() == 2
+
+    # Другой воркер со своей дельтой: снимок докладывает его векторы к уже записанным
+    delta.delta_index = faiss.IndexIDMap2(faiss.IndexFlatL2(DIM))
+    delta.add_to_delta_index([2, 3], vectors(2, seed=1))
+    assert delta.snapshot_delta_index() == 3
+
+    on_disk = faiss.read_index(delta.DELTA_INDEX_PATH)
+    assert ids_of(on_disk) == [1, 2, 3]
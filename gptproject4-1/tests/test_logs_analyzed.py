@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base, get_db
+from backend.models import LogAnalysis, UserRole
+from backend.core.principals import Principal
+from backend.core.security import get_current_user
+from backend.api import logs
+
+
+@pytest.fixture
+def client():
+    # Отдельная SQLite в памяти вместо PostgreSQL: роутер логов не использует ничего, чего нет в SQLite
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    TestingSession = sessionmaker(bind=engine, autoflush=False)
+
+    with TestingSession() as db:
+        db.add_all([
+            LogAnalysis(
+                company_id=company_id,
+                log_text=f"Failed password for root from 10.0.0.{i}",
+                ip=f"10.0.0.{i}",
+                attack_type="Brute Force",
+                probability=80.0 + i,
+                recommendation="Заблокировать IP",
+                timestamp=datetime(2026, 10, 1, 12, i),
+                analysis_status="done"
+            )
+            for i, company_id in enumerate(["acme", "acme", "acme", "other"])
+        ])
+        db.commit()
+
+    def override_get_db():
+        with TestingSession() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(logs.router)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: Principal(
+        id=1, username="analyst", role=UserRole.ANALYST, company_id="acme"
+    )
+    with TestClient(app) as test_client:
+        yield test_client
+    engine.dispose()
+
+
+def test_analyzed_full_rows(client):
+    response = client.get("/logs/analyzed")
+    assert response.status_code == 200
+    rows = response.json()
+    assert [row["id"] for row in rows] == [3, 2, 1]
+    assert rows[0]["log_text"].startswith("Failed password")
+    assert rows[0]["recommendation"] == "Заблокировать IP"
+
+
+def test_analyzed_projection_returns_only_requested_fields(client):
+    response = client.get("/logs/analyzed", params={"fields": "attack_type,probability,timestamp"})
+    assert response.status_code == 200
+    rows = response.json()
+    assert len(rows) == 3
+    assert set(rows[0]) == {"id", "attack_type", "probability", "timestamp"}
+    assert rows[0]["probability"] == 82.0
+
+
+def test_analyzed_projection_with_cursor(client):
+    response = client.get("/logs/analyzed", params={"fields": "id,attack_type", "limit": 2})
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()] == [3, 2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/logs/analyzed", params={"fields": "id,attack_type", "limit": 2, "cursor": cursor})
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "attack_type": "Brute Force"}]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_analyzed_projection_rejects_unknown_fields(client):
+    response = client.get("/logs/analyzed", params={"fields": "id,password"})
+    assert response.status_code == 400
@@ -0,0 +1,74 @@
+import queue
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base, get_db
+from backend.models import Company, LogAnalysis, User, UserRole
+from backend.api import logs
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    TestingSession = sessionmaker(bind=engine, autoflush=False)
+    with TestingSession() as db:
+        db.add(Company(id="acme", name="Acme"))
+        db.add(User(username="agent", password_hash="x", role=UserRole.ADMIN, company_id="acme"))
+        db.commit()
+
+    def override_get_db():
+        with TestingSession() as db:
+            yield db
+
+    queued, inline = [], []
+    monkeypatch.setattr(logs, "ANALYSIS_BATCH_SIZE", 2)
+    monkeypatch.setattr(logs, "has_capacity", lambda: True)
+    monkeypatch.setattr(logs, "process_queued_logs", lambda ids: inline.append(list(ids)))
+    monkeypatch.setattr(logs, "schedule_company_update", lambda *args: None)
+
+    app = FastAPI()
+    app.include_router(logs.router)
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    client.session_factory = TestingSession
+    client.queued, client.inline = queued, inline
+    yield client
+    engine.dispose()
+
+
+def agent_logs(n: int) -> list[dict]:
+    return [{"company_id": "acme", "level": "WARN", "message": f"Failed login {i}", "ip": "10.0.0.1"} for i in range(n)]
+
+
+def test_batch_larger_than_queue_is_accepted(agent, monkeypatch):
+    def enqueue_one_batch(ids, block=True):
+        if agent.queued:
+            raise queue.Full
+        agent.queued.append(list(ids))
+    monkeypatch.setattr(logs, "enqueue_analysis", enqueue_one_batch)
+
+    response = agent.post("/logs/from-agent", json=agent_logs(5))
+
+    assert response.status_code == 200
+    ids = response.json()["ids"]
+    assert len(ids) == 5
+    # Первая пачка — в очередь, остальные разбираются после ответа, ни одна не брошена в pending
+    assert agent.queued == [ids[:2]]
+    assert agent.inline == [ids[2:4], ids[4:]]
+
+
+def test_full_queue_rejects_before_insert(agent, monkeypatch):
+    monkeypatch.setattr(logs, "has_capacity", lambda: False)
+
+    response = agent.post("/logs/from-agent", json=agent_logs(3))
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    with agent.session_factory() as db:
+        assert db.query(LogAnalysis).count() == 0
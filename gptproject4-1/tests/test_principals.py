@@ -0,0 +1,102 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.core import principals
+from backend.core.principals import Principal, PrincipalCache
+from backend.models import UserRole
+
+ANALYST = Principal(id=1, username="analyst", role=UserRole.ANALYST, company_id="acme")
+ADMIN = Principal(id=2, username="admin", role=UserRole.ADMIN, company_id="globex")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(principals.time, "monotonic", clock)
+    monkeypatch.setattr(principals, "PRINCIPAL_CACHE_TTL", 60.0)
+    monkeypatch.setattr(principals, "_caches", [])
+    return clock
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = PrincipalCache("http")
+    cache.put("t1", ANALYST)
+
+    clock.now += 59
+    assert cache.get("t1") == ANALYST
+    clock.now += 2
+    assert cache.get("t1") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "claims": 0, "invalidated": 0, "evicted": 0, "size": 0}
+
+
+def test_entry_never_outlives_token_exp(clock):
+    cache = PrincipalCache("http")
+    cache.put("expired", ANALYST, exp=time.time() - 1)
+    assert cache.stats()["size"] == 0
+
+    cache.put("short", ANALYST, exp=time.time() + 5)
+    clock.now += 10  # TTL ещё не вышел, а токен уже истёк
+    assert cache.get("short") is None
+
+
+def test_invalidate_user_and_company_hit_every_cache(clock):
+    http, ws = PrincipalCache("http"), PrincipalCache("ws")
+    for cache in (http, ws):
+        cache.put("a", ANALYST)
+        cache.put("b", ADMIN)
+
+    principals.invalidate_user("analyst")
+    assert http.get("a") is None and ws.get("a") is None
+    assert http.get("b") == ADMIN
+
+    principals.invalidate_company("globex")
+    assert http.get("b") is None and ws.get("b") is None
+    assert principals.get_principal_cache_stats()["ws"]["invalidated"] == 2
+
+
+def test_size_cap_evicts_least_recently_used(clock, monkeypatch):
+    monkeypatch.setattr(principals, "PRINCIPAL_CACHE_SIZE", 2)
+    cache = PrincipalCache("http")
+    cache.put("a", ANALYST)
+    cache.put("b", ADMIN)
+    cache.get("a")
+    cache.put("c", ANALYST)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ANALYST
+    assert cache.stats()["evicted"] == 1
+
+
+def test_resolve_loads_user_unless_claims_are_trusted(clock, monkeypatch):
+    payload = {"sub": "analyst", "uid": 1, "role": "ANALYST", "company_id": "acme", "exp": time.time() + 600}
+    loaded = []
+
+    def load_user(username):
+        loaded.append(username)
+        return SimpleNamespace(id=1, username=username, role=UserRole.ANALYST, company_id="acme")
+
+    cache = PrincipalCache("http")
+    assert cache.resolve("t1", payload, load_user) == ANALYST
+    assert loaded == ["analyst"]
+    assert cache.get("t1") == ANALYST
+
+    monkeypatch.setattr(principals, "TRUST_TOKEN_CLAIMS", True)
+    assert cache.resolve("t2", payload, load_user) == ANALYST
+    assert loaded == ["analyst"]  # claims из токена, без базы
+    assert cache.stats()["claims"] == 1
+
+    # Старый токен без uid всё равно проверяется по базе
+    legacy = {"sub": "analyst", "exp": payload["exp"]}
+    assert cache.resolve("t3", legacy, load_user) == ANALYST
+    assert loaded == ["analyst", "analyst"]
+    assert cache.resolve("t4", legacy, lambda username: None) is None
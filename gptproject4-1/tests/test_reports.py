@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base, get_db
+from backend.models import LogAnalysis, UserRole
+from backend.core.principals import Principal
+from backend.core.security import get_current_user
+from backend.utils.rollup_utils import record_rollups
+from backend.api import reports
+
+NOW = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=3)
+
+
+def make_client(monkeypatch, with_rollups: bool):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    TestingSession = sessionmaker(bind=engine, autoflush=False)
+    with TestingSession() as db:
+        logs = [
+            LogAnalysis(company_id="acme", timestamp=NOW + timedelta(minutes=i), attack_type="Brute Force",
+                        mitre_id="T1110", country="DE", probability=probability, log_text=f"log {i}")
+            for i, probability in enumerate([90, 80, 10])
+        ]
+        db.add_all(logs)
+        if with_rollups:
+            record_rollups(db, logs)
+        db.commit()
+
+    prompts = []
+    monkeypatch.setattr(reports, "generate_report_summary", lambda logs, stats: prompts.append(([log.log_text for log in logs], stats)) or "отчёт")
+
+    def override_get_db():
+        with TestingSession() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(reports.router)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: Principal(
+        id=1, username="analyst", role=UserRole.ANALYST, company_id="acme"
+    )
+    return TestClient(app), prompts
+
+
+@pytest.mark.parametrize("with_rollups", [True, False])
+def test_generate_report_with_aware_inclusive_bounds(monkeypatch, with_rollups):
+    client, prompts = make_client(monkeypatch, with_rollups)
+    body = {
+        # toISOString() с фронтенда: aware datetime; to_date включительный — лог ровно в NOW+1мин попадает
+        "from_date": NOW.replace(tzinfo=timezone.utc).isoformat(),
+        "to_date": (NOW + timedelta(minutes=1)).replace(tzinfo=timezone.utc).isoformat(),
+    }
+    response = client.post("/reports/generate", json=body)
+    assert response.status_code == 200
+    assert response.json()["stats"] == "Total logs: 2"
+
+    log_texts, stats = prompts[0]
+    assert log_texts == ["log 0", "log 1"]
+    assert stats["total"] == 2
+    assert stats["high_risk"] == 2
+    assert dict(stats["mitre"]) == {"T1110": 2}
+
+
+def test_generate_report_empty_period(monkeypatch):
+    client, _ = make_client(monkeypatch, with_rollups=True)
+    body = {"from_date": "2020-01-01T00:00:00Z", "to_date": "2020-01-02T00:00:00Z"}
+    assert client.post("/reports/generate", json=body).status_code == 404
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base
+from backend.models import LogAnalysis
+from backend.utils.rollup_utils import record_rollups, rollup_summary, get_timeseries, to_utc_naive
+
+# Свежие логи, чтобы минутные и часовые корзины были в пределах срока хранения
+NOW = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=3)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        logs = [
+            LogAnalysis(company_id="acme", timestamp=NOW + timedelta(minutes=i), attack_type="Brute Force",
+                        mitre_id="T1110", probability=probability, log_text="x")
+            for i, probability in enumerate([90, 50, 10])
+        ]
+        session.add_all(logs)
+        record_rollups(session, logs)
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def test_to_utc_naive_converts_aware_bounds():
+    aware = datetime(2026, 10, 18, 15, 0, tzinfo=timezone(timedelta(hours=3)))
+    assert to_utc_naive(aware) == datetime(2026, 10, 18, 12, 0)
+    assert to_utc_naive(datetime(2026, 10, 18, 12, 0)) == datetime(2026, 10, 18, 12, 0)
+    assert to_utc_naive(None) is None
+
+
+def test_rollup_summary_accepts_aware_bounds(db):
+    naive = rollup_summary(db, "acme", NOW - timedelta(hours=1), NOW + timedelta(hours=1))
+    aware = rollup_summary(
+        db, "acme",
+        (NOW - timedelta(hours=1)).replace(tzinfo=timezone.utc),
+        (NOW + timedelta(hours=1)).replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=5)))
+    )
+    assert naive["total"] == aware["total"] == 3
+    assert aware["high_risk"] == 1
+    assert aware["mitre"] == {"T1110": 3}
+
+
+def test_rollup_summary_half_open_bounds(db):
+    assert rollup_summary(db, "acme", NOW, NOW + timedelta(minutes=2))["total"] == 2
+
+
+def test_timeseries_accepts_aware_bounds(db):
+    points = get_timeseries(
+        db, "acme",
+        (NOW - timedelta(hours=1)).replace(tzinfo=timezone.utc),
+        (NOW + timedelta(hours=1)).replace(tzinfo=timezone.utc),
+        "minute"
+    )
+    assert [point["count"] for point in points] == [1, 1, 1]
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import Base
+from backend.models import LogAnalysis
+from backend.utils import upload_utils
+from backend.utils.upload_utils import detect_columns, ingest_csv, read_header
+
+# Заголовок как в дампах CIC-IDS: имена с ведущими пробелами и лишние колонки
+CIC_IDS_CSV = (
+    " Destination Port, Flow Duration, Total Fwd Packets, Flow Bytes/s, Label\n"
+    "80,1000,3,12.5,BENIGN\n"
+    "443,Infinity,2,1.0,DDoS\n"
+    "22,500,-Infinity,1.0,PortScan\n"
+    "21,700,4,Infinity,FTP-Patator\n"
+    "8080,,5,1.0,DDoS\n"
+    "53,abc,1,1.0,BENIGN\n"
+    "3389,2000,7,NaN,DDoS\n"
+)
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(upload_utils, "SessionLocal", factory)
+    monkeypatch.setattr(upload_utils, "UPLOAD_CHUNK_ROWS", 3)
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "Wednesday-workingHours.pcap_ISCX.csv"
+    path.write_text(CIC_IDS_CSV)
+    return str(path)
+
+
+def test_detects_cic_ids_header_with_spaces(csv_path):
+    assert detect_columns(read_header(csv_path)) == (
+        " Destination Port", " Flow Duration", " Total Fwd Packets", " Label"
+    )
+    assert detect_columns(["foo", "bar"]) is None
+
+
+def test_ingest_drops_infinity_and_garbage_rows(sessions, csv_path):
+    columns = detect_columns(read_header(csv_path))
+    progress_calls = []
+
+    rows, failed, cancelled = ingest_csv(
+        csv_path, columns, "acme", progress=lambda *args: progress_calls.append(args) and False
+    )
+
+    # Infinity в неиспользуемой колонке (Flow Bytes/s) строку не портит: её даже не читаем
+    assert (rows, failed, cancelled) == (3, 4, False)
+    assert len(progress_calls) == 3  # по вызову на кусок из UPLOAD_CHUNK_ROWS строк
+    with sessions() as db:
+        logs = db.query(LogAnalysis).order_by(LogAnalysis.id).all()
+    assert [log.log_text for log in logs] == [
+        "Порт: 80, Длительность: 1000, Пакеты: 3",
+        "Порт: 21, Длительность: 700, Пакеты: 4",
+        "Порт: 3389, Длительность: 2000, Пакеты: 7",
+    ]
+    assert [log.attack_type for log in logs] == ["BENIGN", "FTP-Patator", "DDoS"]
+    assert {log.company_id for log in logs} == {"acme"}
+
+
+def test_ingest_stops_when_progress_asks(sessions, csv_path):
+    columns = detect_columns(read_header(csv_path))
+
+    rows, failed, cancelled = ingest_csv(csv_path, columns, "acme", progress=lambda *args: True)
+
+    assert (rows, failed, cancelled) == (1, 2, True)
+    with sessions() as db:
+        assert db.query(LogAnalysis).count() == 1
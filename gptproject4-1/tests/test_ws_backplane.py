@@ -0,0 +1,126 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from backend.utils import aggregate_utils, ws_backplane
+from backend.utils.log_utils import PENDING_ATTACK_TYPE
+
+
+@pytest.fixture
+def backplane(monkeypatch):
+    # Чистое состояние модуля на каждый тест: start_backplane срабатывает один раз на процесс
+    monkeypatch.setattr(ws_backplane, "_backend", None)
+    monkeypatch.setattr(ws_backplane, "_pending", {})
+    monkeypatch.setattr(ws_backplane, "_reload", set())
+    monkeypatch.setattr(ws_backplane, "_stats", dict.fromkeys(ws_backplane._stats, 0))
+    events = []
+    yield events
+    ws_backplane.stop_backplane()
+
+
+@pytest.fixture
+def aggregates(monkeypatch):
+    monkeypatch.setattr(aggregate_utils, "_states", {})
+    monkeypatch.setattr(aggregate_utils, "_outgoing", {})
+    monkeypatch.setattr(aggregate_utils, "_export_deltas", True)
+    return aggregate_utils
+
+
+def test_local_mode_delivers_to_own_handler(backplane, monkeypatch):
+    monkeypatch.setattr(ws_backplane, "WS_BACKPLANE", "local")
+    ws_backplane.start_backplane(lambda company_id, channels: backplane.append((company_id, channels)))
+
+    ws_backplane.publish_company_update("acme", ["dashboard", "threats"])
+
+    assert backplane == [("acme", ("dashboard", "threats"))]
+    stats = ws_backplane.get_backplane_stats()
+    assert stats["backend"] == "local"
+    assert stats["pending"] == 0  # в local-режиме NOTIFY не копится
+
+
+def test_unknown_backend_is_rejected(backplane, monkeypatch):
+    monkeypatch.setattr(ws_backplane, "WS_BACKPLANE", "redis")
+    with pytest.raises(ValueError):
+        ws_backplane.start_backplane(lambda company_id, channels: None)
+
+
+def test_dispatch_skips_own_echo_and_applies_remote_data(backplane, monkeypatch):
+    monkeypatch.setattr(ws_backplane, "WS_BACKPLANE", "local")
+    ws_backplane.start_backplane(
+        lambda company_id, channels: backplane.append(("handler", company_id, channels)),
+        on_remote=lambda company_id, data: backplane.append(("remote", company_id, data))
+    )
+
+    ws_backplane._dispatch(json.dumps({"origin": ws_backplane.ORIGIN_ID, "company_id": "acme", "channels": []}))
+    ws_backplane._dispatch(json.dumps({"origin": "other", "company_id": "acme", "channels": ["dashboard"],
+                                       "data": {"total": 2}}))
+    ws_backplane._dispatch(json.dumps({"origin": "other", "company_id": "acme", "channels": ["dashboard"],
+                                       "reload": True}))
+    ws_backplane._dispatch(json.dumps({"origin": "other", "company_id": "acme", "channels": ["threats"]}))
+    ws_backplane._dispatch("не json")
+
+    assert backplane == [
+        ("remote", "acme", {"total": 2}),
+        ("handler", "acme", ("dashboard",)),
+        ("remote", "acme", None),
+        ("handler", "acme", ("dashboard",)),
+        ("handler", "acme", ("threats",)),
+    ]
+    assert ws_backplane.get_backplane_stats()["echo_skipped"] == 1
+
+
+def test_aggregate_delta_round_trip(aggregates):
+    rows = [
+        {"company_id": "acme", "attack_type": None, "mitre_id": None, "probability": 0,
+         "severity_windows": "High", "timestamp": datetime(2026, 10, 18, 14, 5), "status": "Активна"},
+        {"company_id": "acme", "attack_type": PENDING_ATTACK_TYPE, "probability": 0,
+         "timestamp": datetime(2026, 10, 18, 14, 6), "count": 3},
+    ]
+    aggregates.record_logs(rows)
+    aggregates.record_analysis("acme", {"attack_type": PENDING_ATTACK_TYPE, "probability": 0},
+                               {"attack_type": "Brute Force", "mitre_id": "T1110", "probability": 90})
+    aggregates.record_status_change("acme", "Активна", "Заблокирована")
+
+    # Через JSON, как в NOTIFY: ключ None должен пережить сериализацию
+    payload = json.loads(json.dumps(aggregates.take_delta("acme")))
+    assert aggregates.take_delta("acme") is None
+
+    # «Соседний процесс»: у него компания загружена с нуля — после дельты счётчики как у отправителя
+    aggregates._states["acme"] = aggregates._empty_state()
+    aggregates.apply_delta("acme", payload)
+    state = aggregates._states["acme"]
+    assert state["total"] == 4
+    assert state["attack_types"][None] == 1
+    assert state["attack_types"][PENDING_ATTACK_TYPE] == 2
+    assert state["attack_types"]["Brute Force"] == 1
+    assert state["mitre"]["T1110"] == 1
+    assert state["high_risk"] == 1
+    assert state["hourly"][14] == 4
+    assert state["status"] == {"Активна": 3, "Заблокирована": 1}
+
+
+def test_apply_delta_without_data_drops_company(aggregates):
+    aggregates._states["acme"] = aggregates._empty_state()
+    aggregates.apply_delta("acme", None)
+    assert "acme" not in aggregates._states
+
+
+def test_oversized_or_lost_data_becomes_reload(backplane, aggregates, monkeypatch):
+    monkeypatch.setattr(ws_backplane, "_collect", aggregates.take_delta)
+    aggregates.record_logs([{"company_id": "acme", "mitre_id": f"T{i:04d}", "probability": 0} for i in range(2000)])
+
+    event = json.loads(ws_backplane.build_payload("acme", {"dashboard"}))
+    assert event["reload"] is True and "data" not in event
+    assert ws_backplane.get_backplane_stats()["oversized"] == 1
+
+    aggregates.record_logs([{"company_id": "acme", "probability": 0}])
+    ws_backplane._reload.add("acme")  # прошлый NOTIFY с данными не дошёл
+    event = json.loads(ws_backplane.build_payload("acme", {"dashboard"}))
+    assert event["reload"] is True and "data" not in event
+    # Дельта забрана и выброшена: соседи перечитают компанию целиком
+    assert aggregates.take_delta("acme") is None
+
+    aggregates.record_logs([{"company_id": "acme", "probability": 0}])
+    event = json.loads(ws_backplane.build_payload("acme", {"dashboard"}))
+    assert event["data"] == {"total": 1, "risk_levels": [["low", 1]], "attack_types": [[None, 1]], "status": [["Активна", 1]]}
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.utils import ws_manager
+from backend.utils.ws_manager import diff_state
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+
+    async def close(self, code=1000):
+        pass
+
+
+@pytest.fixture
+def delta(monkeypatch):
+    monkeypatch.setattr(ws_manager, "_delta_sockets", set())
+    monkeypatch.setattr(ws_manager, "_delta_states", {})
+    monkeypatch.setattr(ws_manager, "_outboxes", {})
+    monkeypatch.setattr(ws_manager, "_delta_stats", dict.fromkeys(ws_manager._delta_stats, 0))
+    monkeypatch.setattr(ws_manager, "active_connections", {})
+    monkeypatch.setitem(ws_manager._connections, "dashboard", ws_manager.active_connections)
+    return ws_manager
+
+
+def test_diff_state_nested_changes_and_removals():
+    old = {"total": 5, "severity": {"windows": {"error": 2, "warning": 1}}, "hourly": [0, 1], "gone": 1}
+    new = {"total": 6, "severity": {"windows": {"error": 2}}, "hourly": [0, 2], "added": "x"}
+
+    assert diff_state(old, new) == {
+        "total": 6,
+        "severity": {"windows": {"warning": None}},
+        "hourly": [0, 2],  # списки заменяются целиком
+        "added": "x",
+        "gone": None,
+    }
+    assert diff_state(new, new) == {}
+
+
+def test_snapshot_then_deltas_with_growing_seq(delta, monkeypatch):
+    async def fake_builder(name, builder, company_id, *args):
+        return {"total": 1, "status": {"Активна": 1}}
+
+    monkeypatch.setattr(ws_manager, "run_builder", fake_builder)
+
+    async def scenario():
+        ws = FakeSocket()
+        ws_manager.add_connection("acme", ws)
+        ws_manager.open_outbox("dashboard", "acme", ws)
+        ws_manager.register_delta_client("dashboard", "acme", ws)
+
+        await ws_manager.send_snapshot("dashboard", "acme", ws)
+        await ws_manager.publish_delta("dashboard", "acme", {"total": 2, "status": {"Активна": 2}})
+        await ws_manager.publish_delta("dashboard", "acme", {"total": 2, "status": {"Активна": 2}})
+        await ws_manager.publish_delta("dashboard", "acme", {"total": 2, "status": {"Заблокирована": 2}})
+        await ws_manager.send_snapshot("dashboard", "acme", ws, resync=True)
+        await asyncio.sleep(0.01)
+        ws_manager.close_outbox(ws)
+        return ws.sent
+
+    sent = asyncio.run(scenario())
+
+    assert [(m["type"], m["seq"]) for m in sent] == [
+        ("dashboard_snapshot", 1),
+        ("dashboard_delta", 2),
+        ("dashboard_delta", 3),
+        ("dashboard_snapshot", 3),
+    ]
+    assert sent[1]["changes"] == {"total": 2, "status": {"Активна": 2}}
+    assert sent[2]["changes"] == {"status": {"Заблокирована": 2, "Активна": None}}
+    assert sent[3]["data"] == {"total": 2, "status": {"Заблокирована": 2}}
+    stats = delta.get_delta_stats()
+    assert (stats["snapshots"], stats["resyncs"], stats["deltas"], stats["unchanged"]) == (1, 1, 2, 1)
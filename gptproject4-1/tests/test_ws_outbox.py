@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.utils import ws_manager
+
+
+class FakeSocket:
+    def __init__(self, stuck=False):
+        self.sent = []
+        self.closed_with = None
+        self.stuck = stuck
+
+    async def send_text(self, message):
+        if self.stuck:
+            await asyncio.Event().wait()  # клиент не читает сокет
+        self.sent.append(json.loads(message))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    monkeypatch.setattr(ws_manager, "WS_CLIENT_QUEUE_SIZE", 2)
+    monkeypatch.setattr(ws_manager, "_outboxes", {})
+    monkeypatch.setattr(ws_manager, "_outbox_stats", dict.fromkeys(ws_manager._outbox_stats, 0))
+    monkeypatch.setattr(ws_manager, "_delta_sockets", set())
+    monkeypatch.setattr(ws_manager, "_delta_states", {})
+    monkeypatch.setattr(ws_manager, "active_threats_connections", {})
+    monkeypatch.setitem(ws_manager._connections, "threats", ws_manager.active_threats_connections)
+    return ws_manager
+
+
+def _connect(ws):
+    ws_manager.add_threats_connection("acme", ws)
+    ws_manager.open_outbox("threats", "acme", ws)
+    ws_manager.register_delta_client("threats", "acme", ws)
+
+
+def test_slow_consumer_is_evicted_without_delaying_others(outbox):
+    async def scenario():
+        fast, slow = FakeSocket(), FakeSocket(stuck=True)
+        _connect(fast)
+        _connect(slow)
+        for seq in range(1, 6):
+            message = outbox.encode_message({"type": "threats_delta", "seq": seq})
+            outbox.send_to_sockets("threats", "acme", outbox.split_subscribers("threats", "acme")[1], message)
+            await asyncio.sleep(0.005)  # быстрый клиент успевает разобрать очередь между рассылками
+        await asyncio.sleep(0.01)
+        return fast, slow
+
+    fast, slow = asyncio.run(scenario())
+
+    assert [m["seq"] for m in fast.sent] == [1, 2, 3, 4, 5]
+    assert slow.sent == []
+    assert slow.closed_with == ws_manager.SLOW_CONSUMER_CLOSE_CODE
+    # Вытесненный клиент убран отовсюду: при переподключении он получит снапшот, а не дельту с дырой в seq
+    assert slow not in outbox._outboxes
+    assert slow not in outbox._delta_sockets
+    assert outbox.active_threats_connections["acme"] == [fast]
+    assert outbox.get_outbox_stats()["evicted_slow"] == 1
+
+
+def test_send_timeout_evicts_client(outbox, monkeypatch):
+    monkeypatch.setattr(ws_manager, "WS_SEND_TIMEOUT", 0.01)
+
+    async def scenario():
+        slow = FakeSocket(stuck=True)
+        _connect(slow)
+        assert outbox.enqueue_message(slow, outbox.encode_message({"type": "threats_delta", "seq": 1}))
+        await asyncio.sleep(0.05)
+        return slow
+
+    slow = asyncio.run(scenario())
+
+    assert slow.closed_with == ws_manager.SLOW_CONSUMER_CLOSE_CODE
+    assert "acme" not in outbox.active_threats_connections
+    assert outbox.enqueue_message(slow, "{}") is False
+    assert outbox.get_outbox_stats()["send_errors"] == 1